@@ -16,7 +16,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 config = context.config
 
 # 環境変数から接続URLを取得し、alembic.iniの設定を上書き
-config.set_main_option("sqlalchemy.url", os.getenv("DATABASE_URL"))
+# (database.migration からコネクションが渡される場合は未設定でもよい)
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.getenv("DATABASE_URL"))
 
 # ログ設定
 fileConfig(config.config_file_name)
@@ -59,6 +61,12 @@ def run_migrations_offline():
 
 # オンラインマイグレーションの実行
 def run_migrations_online():
+    # database.migration から呼ばれた場合は、ロック取得済みのコネクションをそのまま使う
+    provided_connection = config.attributes.get("connection")
+    if provided_connection is not None:
+        _run_migrations_with_connection(provided_connection)
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section),
         prefix="sqlalchemy.",
@@ -66,15 +74,19 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-            compare_type=True,
-            compare_server_default=True,
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        _run_migrations_with_connection(connection)
+
+
+def _run_migrations_with_connection(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        compare_type=True,
+        compare_server_default=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
 
 
 if context.is_offline_mode():
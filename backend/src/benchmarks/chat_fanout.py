@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+チャット配信バス (UnixSocketBus) のファンアウト遅延ベンチマーク
+
+ワーカー数ごとにハブと N 個のワーカープロセスを起動し、1 つのワーカーが配信したメッセージが
+全ワーカー (送信元を含む) の deliver に届くまでの遅延を計測します。
+遅延は CLOCK_MONOTONIC (time.monotonic_ns、同一ホストのプロセス間で共通) の差で求めます。
+
+Usage:
+    python -m benchmarks.chat_fanout --workers 1 2 4 8 --messages 5000 --rate 20000
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import anyio
+
+from services.chat_bus import KIND_ROOM, UnixSocketBus, run_hub
+
+
+def _percentile(values: List[int], ratio: float) -> int:
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+async def _worker(path: str, index: int, messages: int, rate: int, barrier: multiprocessing.Barrier, results) -> None:
+    latencies: List[int] = []
+    done = anyio.Event()
+
+    def deliver(kind: int, target: str, data, seq) -> int:
+        latencies.append(time.monotonic_ns() - int(data.partition(":")[2]))
+        if len(latencies) >= messages:
+            done.set()
+        return 1
+
+    bus = UnixSocketBus(path, reconnect_min=0.01)
+    bus.bind(deliver)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(bus.run)
+        while not bus.connected:
+            await anyio.sleep(0.01)
+        # 全ワーカーの接続完了を待ってから配信を始める
+        await anyio.to_thread.run_sync(barrier.wait)
+        await anyio.sleep(0.1)
+
+        started = time.monotonic()
+        if index == 0:
+            burst = max(1, rate // 100)
+            for seq in range(messages):
+                bus.publish(KIND_ROOM, "bench", f"{seq}:{time.monotonic_ns()}")
+                if seq % burst == burst - 1:
+                    await anyio.sleep(0.01)
+        with anyio.move_on_after(30):
+            await done.wait()
+        elapsed = time.monotonic() - started
+        tg.cancel_scope.cancel()
+
+    latencies.sort()
+    results.put(
+        {
+            "received": len(latencies),
+            "p50": _percentile(latencies, 0.5) if latencies else 0,
+            "p99": _percentile(latencies, 0.99) if latencies else 0,
+            "max": latencies[-1] if latencies else 0,
+            "elapsed": elapsed,
+        }
+    )
+
+
+def _run_worker(path: str, index: int, messages: int, rate: int, barrier, results) -> None:
+    anyio.run(_worker, path, index, messages, rate, barrier, results)
+
+
+def run(workers: int, messages: int, rate: int) -> Dict[str, float]:
+    """
+    ワーカー数 workers で 1 回計測し、全ワーカーを合わせた遅延 (マイクロ秒) を返します。
+    """
+    with tempfile.TemporaryDirectory(dir="/tmp") as directory:
+        path = os.path.join(directory, "bus.sock")
+        hub = multiprocessing.Process(target=run_hub, args=(path,), daemon=True)
+        hub.start()
+        barrier = multiprocessing.Barrier(workers)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_run_worker, args=(path, index, messages, rate, barrier, results))
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        reports = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+        hub.terminate()
+        hub.join()
+
+    received = sum(report["received"] for report in reports)
+    return {
+        "workers": workers,
+        "received": received / (workers * messages),
+        "p50_us": max(report["p50"] for report in reports) / 1000,
+        "p99_us": max(report["p99"] for report in reports) / 1000,
+        "max_us": max(report["max"] for report in reports) / 1000,
+        "deliveries_per_sec": received / max(report["elapsed"] for report in reports),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="チャット配信バスのファンアウト遅延を計測します。")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=int, default=20000, help="配信レート (メッセージ/秒の目安)")
+    args = parser.parse_args(argv)
+
+    print(f"{'workers':>7} {'received':>9} {'p50 us':>9} {'p99 us':>9} {'max us':>9} {'deliveries/s':>13}")
+    for workers in args.workers:
+        result = run(workers, args.messages, args.rate)
+        print(
+            f"{result['workers']:>7} {result['received']:>9.1%} {result['p50_us']:>9.0f} {result['p99_us']:>9.0f} "
+            f"{result['max_us']:>9.0f} {result['deliveries_per_sec']:>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
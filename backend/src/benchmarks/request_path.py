@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+リクエスト経路 (ミドルウェア → ルーター → サービス → リポジトリ → DB) の遅延ベンチマーク
+
+インメモリ SQLite (StaticPool) にスキーマとシードデータを投入し、create_app で生成した本番と同じアプリに
+TestClient (lifespan あり) からリクエストを送って、エンドポイントごとの遅延とスループットを計測します。
+Postgres を用意しなくても、クエリを含むリクエスト経路全体を任意の Linux 環境で計測できます。
+
+Usage:
+    python -m benchmarks.request_path --requests 2000
+"""
+
+import argparse
+import datetime
+import os
+import time
+from typing import Dict, List, Optional
+
+# アプリ・DB モジュールのインポート前にインメモリ SQLite を指定する
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+
+# 上記の設定後にインポートする (E402)
+from fastapi.testclient import TestClient  # noqa: E402
+
+from commons.environment_master_key import EnvironmentMasterKey  # noqa: E402
+from database.connection import engine, seed_database  # noqa: E402
+from main import create_app  # noqa: E402
+from models.environment_info import EnvironmentInfo  # noqa: E402
+
+# 計測対象 (メソッド, パス)
+# /reload は環境情報マスタを DB から読み直すため、クエリを含む経路になる
+ENDPOINTS = [("GET", "/v0_1/healthcheck"), ("POST", "/v0_1/reload"), ("GET", "/v0_1/readiness")]
+
+
+def _seed_rows() -> List[Dict]:
+    """
+    環境情報マスタの全キーにダミー値を入れたシードデータを返します。
+    """
+    now = datetime.datetime(2025, 4, 20, 0, 0, 0)
+    return [
+        {
+            "key_code": key.value,
+            "values": f"bench-{key.name.lower()}",
+            "created_by": "benchmark",
+            "updated_by": "benchmark",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for key in EnvironmentMasterKey
+    ]
+
+
+def _percentile(values: List[int], ratio: float) -> int:
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run(client: TestClient, method: str, path: str, requests: int, warmup: int) -> Dict[str, float]:
+    """
+    1 つのエンドポイントに requests 回リクエストを送り、遅延 (マイクロ秒) とスループットを返します。
+    """
+    for _ in range(warmup):
+        client.request(method, path)
+
+    latencies: List[int] = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        sent = time.perf_counter_ns()
+        response = client.request(method, path)
+        latencies.append(time.perf_counter_ns() - sent)
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {path} が {response.status_code} を返しました: {response.text}")
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "endpoint": f"{method} {path}",
+        "p50_us": _percentile(latencies, 0.5) / 1000,
+        "p99_us": _percentile(latencies, 0.99) / 1000,
+        "max_us": latencies[-1] / 1000,
+        "requests_per_sec": requests / elapsed,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="インメモリ SQLite 上でリクエスト経路全体の遅延を計測します。")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    # SQL のログ出力 (echo) は計測を歪めるため止める
+    engine.echo = False
+    seed_database(engine, {EnvironmentInfo: _seed_rows()})
+    with TestClient(create_app()) as client:
+        print(f"{'endpoint':<24} {'p50 us':>9} {'p99 us':>9} {'max us':>9} {'requests/s':>11}")
+        for method, path in ENDPOINTS:
+            result = run(client, method, path, args.requests, args.warmup)
+            print(
+                f"{result['endpoint']:<24} {result['p50_us']:>9.0f} {result['p99_us']:>9.0f} "
+                f"{result['max_us']:>9.0f} {result['requests_per_sec']:>11.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
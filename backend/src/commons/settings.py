@@ -21,6 +21,173 @@ class Settings(BaseSettings):
     cors_allow_headers: Optional[str] = "*"
     cors_allow_credentials: bool = True
 
+    # 読み取りレプリカ設定
+    # カンマ区切りで受け取る (未設定ならすべてプライマリ DATABASE_URL を使用)
+    database_replica_urls: Optional[str] = None
+    # レプリカ選択方式: "round_robin" または "least_connections"
+    database_replica_strategy: str = "round_robin"
+    # 書き込み後、この秒数は同じクライアントの読み取りもプライマリへ送る (read-after-write 対策)
+    # 期限は cookie で持ち回る (レプリカ設定時のみ、別のワーカーに振り分けられても有効)
+    database_read_after_write_seconds: float = 2.0
+    database_read_after_write_cookie: str = "db_primary_until"
+
+    # マイグレーション設定
+    # 複数レプリカ同時起動時に 1 台だけが alembic upgrade を実行するためのアドバイザリロック ID
+    migration_advisory_lock_id: int = 20240101
+
+    # ブロッキング処理用スレッドプール設定 (リソース種別ごとの同時実行数)
+    executor_db_threads: int = 20
+    executor_auth_threads: int = 10
+    executor_cpu_threads: int = 4
+    # このサイズ (バイト) 以上のレスポンスの署名計算は CPU 用スレッドプールで行う
+    executor_cpu_offload_bytes: int = 64 * 1024
+    # プロセス内のメトリクス (エグゼキュータの待ち・実行時間、トークンキャッシュなど) を /stats で返す (内部情報のため既定は無効)
+    stats_endpoint_enabled: bool = False
+
+    # OpenAPI ドキュメントキャッシュ設定
+    # 各バージョンの openapi.json を 1 度だけ生成し、圧縮済みバイト列と ETag で返す
+    openapi_cache_enabled: bool = True
+    # このサイズ (バイト) 未満のドキュメントは圧縮しない
+    openapi_cache_min_compress_bytes: int = 1024
+
+    # 起動プロファイル設定
+    # 設定すると create_app 完了時にフェーズごとの所要時間レポート (JSON) をこのパスへ書き出す
+    startup_profile_output: Optional[str] = None
+
+    # 起動タスク設定 (lifespan で並行実行する初期化処理)
+    # タスクごとのタイムアウト秒数
+    startup_task_timeout_seconds: float = 30.0
+    # 起動時にプライマリ／レプリカごとに確立しておくコネクション数 (0 で無効)
+    startup_pool_warmup_connections: int = 2
+    # 起動時に Firebase Admin SDK を初期化する (サービスアカウント未配置ならスキップ)
+    startup_firebase_init: bool = True
+
+    # ルートウォームアップ設定 (起動タスク完了後、ready にする前に合成リクエストを発行)
+    warmup_enabled: bool = False
+    # 追加で発行するリクエスト (POST など) を記述した JSON ファイルのパス
+    warmup_fixtures_path: Optional[str] = None
+    warmup_timeout_seconds: float = 30.0
+
+    # ヘルスチェックプローブ設定 (ProbeMiddleware がアプリ本体を通さずに応答)
+    probe_liveness_path: str = "/livez"
+    probe_readiness_path: str = "/readyz"
+
+    # ランチャー設定 (launcher.py: プリロード + プリフォーク型の本番起動)
+    launcher_host: str = "0.0.0.0"
+    launcher_port: int = 8000
+    # ワーカー数 (0 ならコンテナの CPU 制限 (cgroup の quota) を考慮した CPU 数)
+    # WebSocket の接続はワーカーごとに保持されるため、複数ワーカーではチャットをハブ経由で配信する (WS_BUS_BACKEND 参照)
+    launcher_workers: int = 0
+    # ワーカーごとに SO_REUSEPORT で bind する (既定はマスターで bind したソケットを共有)
+    launcher_reuse_port: bool = False
+    # このリクエスト数を処理したワーカーを入れ替える (0 で無効、ワーカーごとに 0〜jitter を加算)
+    # 入れ替え時はそのワーカーのチャットの WebSocket も切断されるため、既定は無効 (メモリの増加は RSS 上限で対処)
+    launcher_max_requests: int = 0
+    launcher_max_requests_jitter: int = 1000
+    # RSS がこのサイズ (MB) を超えたワーカーを入れ替える (0 で無効)
+    launcher_max_worker_rss_mb: int = 0
+    launcher_check_interval_seconds: float = 5.0
+    # ワーカー停止時に処理中のリクエストを待つ秒数
+    launcher_graceful_timeout_seconds: float = 30.0
+    # ローリング再起動時に新ワーカーの起動完了を待つ秒数
+    launcher_startup_timeout_seconds: float = 60.0
+    # X-Forwarded-* を信頼するプロキシ (未設定なら uvicorn の既定値)
+    launcher_forwarded_allow_ips: Optional[str] = None
+    launcher_log_config: Optional[str] = None
+
+    # グレースフルシャットダウン設定
+    # 処理中リクエストの完了と WebSocket のクローズを待つ最大秒数
+    shutdown_drain_timeout_seconds: float = 20.0
+    # WebSocket クローズ時に通知する再接続までの待機時間 (ミリ秒、接続ごとに範囲内でランダム)
+    ws_reconnect_hint_min_ms: int = 1000
+    ws_reconnect_hint_max_ms: int = 10000
+
+    # WebSocket 送信キュー設定 (接続ごとの上限付きキューと writer タスク)
+    # 接続ごとの未送信メッセージの上限
+    ws_send_queue_size: int = 256
+    # 上限到達時の方針: "drop_oldest" (最も古いメッセージを破棄) または "disconnect" (切断)
+    ws_overflow_policy: str = "drop_oldest"
+    # "disconnect" 方針で切断する際のクローズコード (1013: Try Again Later)
+    ws_overflow_close_code: int = 1013
+    # 接続時に自動で購読するルーム (生のテキストメッセージの配信先、空文字で無効)
+    ws_default_room: str = "lobby"
+    # 1 接続が購読できるルーム数の上限
+    ws_max_rooms_per_connection: int = 50
+
+    # ルームのメッセージ履歴設定 (publish されたメッセージに連番を付けて保持し、再接続時に last_seq より後を再送)
+    # ルームごとに保持する件数 (0 で無効)
+    ws_room_history_size: int = 100
+    # ルームごとに保持する合計バイト数の上限 (0 で無制限)
+    ws_room_history_max_bytes: int = 256 * 1024
+    # 履歴を保持するルーム数の上限 (超えたら最も長く使われていないルームの履歴から破棄)
+    ws_room_history_max_rooms: int = 1000
+
+    # WebSocket ハートビート設定 (全接続のタイマーを 1 つのタイマーホイールで管理)
+    # 受信がこの秒数途絶えた接続に ping を送る (0 で無効、有効な場合 launcher は uvicorn の接続ごとの ping を止める)
+    ws_heartbeat_interval_seconds: float = 20.0
+    # 受信 (pong を含む) がこの秒数途絶えた接続を切断する (nginx の proxy_read_timeout より短くする)
+    ws_idle_timeout_seconds: float = 60.0
+    # タイマーホイールの刻み (秒) とスロット数 (刻み × スロット数をアイドル期限より長くする)
+    ws_timer_tick_seconds: float = 1.0
+    ws_timer_slots: int = 512
+
+    # msgpack サブプロトコル (chat.v1.msgpack) 設定: 溜まったメッセージを 1 つのバイナリフレームにまとめて送る
+    # まとめるために待つ時間 (ミリ秒、0 なら待たずにその時点で溜まっている分だけまとめる)
+    ws_batch_window_ms: float = 5.0
+    # 1 フレームにまとめるメッセージ数の上限
+    ws_batch_max_messages: int = 100
+
+    # permessage-deflate 設定 (launcher で起動した uvicorn の websockets 実装に適用)
+    # 有効にするか (無効にすると圧縮の CPU コストがなくなり、全メッセージで生成済みフレームを直接書き込める)
+    ws_per_message_deflate: bool = True
+    # このサイズ (バイト) 未満のメッセージは圧縮しない (0 ならすべて圧縮)
+    ws_deflate_min_bytes: int = 256
+    # zlib の圧縮レベル (1〜9、-1 で既定値) と memLevel (1〜9、接続ごとの圧縮用メモリ)
+    ws_deflate_level: int = -1
+    ws_deflate_mem_level: int = 5
+
+    # ワーカー間のチャット配信バス設定 (services.chat_bus)
+    # "local" (単一ワーカー)、"unix" (Unix ドメインソケットのハブ経由)、または外部ブローカー用クラス ("module:ClassName")
+    # (launcher で複数ワーカーを起動する場合、"local" は "unix" に切り替わる)
+    ws_bus_backend: str = "local"
+    # "unix" のハブのソケットパス (launcher がハブプロセスを起動する)
+    ws_bus_socket_path: str = "/tmp/fastapi-chat-bus.sock"
+    # ハブへの未送信メッセージ、およびハブからワーカーごとの未送信メッセージの上限
+    ws_bus_queue_size: int = 10000
+
+    # 検証済みトークンキャッシュ設定 (トークンの exp まで検証結果を再利用)
+    # 保持する最大件数 (0 でキャッシュ無効)
+    token_cache_max_entries: int = 10000
+    # 失効チェック付きで再検証する間隔 (秒、0 なら失効チェックを行わない)
+    token_cache_revocation_check_seconds: float = 0.0
+
+    # Firebase ID トークン検証設定
+    # 検証方式: "sdk" (Admin SDK) または "local" (メモリ上の公開鍵で検証、鍵はバックグラウンド更新)
+    firebase_verifier: str = "sdk"
+    # aud / iss の検証に使うプロジェクト ID (未設定ならサービスアカウントファイルの project_id)
+    firebase_project_id: Optional[str] = None
+    # 公開鍵 (x509 証明書) の取得先 (テストではローカルの鍵サーバーを指定)
+    firebase_certs_url: str = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+    # Cache-Control の max-age による期限のこの秒数前に公開鍵を更新する
+    firebase_certs_refresh_margin_seconds: float = 300.0
+    # 未知の kid による再取得や失敗後の再試行の最小間隔 (秒)
+    firebase_certs_min_refresh_seconds: float = 60.0
+    # exp / iat の検証で許容する時刻のずれ (秒)
+    firebase_clock_skew_seconds: int = 0
+
+    # セッションチケット設定 (Firebase ID トークンと交換する HMAC 署名付きの短命チケット)
+    # 署名用シークレット (未設定なら環境情報の SECRET から導出)
+    session_ticket_secret: Optional[str] = None
+    # 有効期間 (秒、ID トークンの exp は超えない)
+    session_ticket_ttl_seconds: int = 900
+    # 付与できるスコープ (カンマ区切り、"api": HTTP, "ws": WebSocket)
+    session_ticket_scopes: str = "api,ws"
+
+    # 遅延インポート設定
+    # 起動時に事前インポートするモジュール (カンマ区切り、"*" で登録済みの全遅延モジュール)
+    # 例: "firebase_admin,firebase_admin.auth,firebase_admin.credentials"
+    lazy_import_warmup: Optional[str] = None
+
     class Config:
         env_file = ".env"
 
@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import importlib
 import logging
 import os
+import pkgutil
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Type
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, delete, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.exc import ArgumentError
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+
+from commons.settings import settings
 
 # Uvicorn など上位ロガーを継承
 logger = logging.getLogger("uvicorn.database")  # 'uvicorn' 下にデータベース用ロガー
@@ -34,12 +43,47 @@ def get_database_url() -> str:
     return url
 
 
-def create_db_engine(echo: bool = False) -> Engine:
+def get_replica_urls() -> List[str]:
+    """
+    Settings.database_replica_urls (カンマ区切り) から読み取りレプリカの URL 一覧を取得します。
+
+    Returns:
+        List[str]: レプリカ URL のリスト (未設定時は空リスト)
+    """
+    raw = settings.database_replica_urls or ""
+    return [url.strip() for url in raw.split(",") if url.strip()]
+
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    """
+    URL のダイアレクトに応じた create_engine の追加オプションを返します。
+
+    SQLite の場合はスレッドプールからの利用を許可し、インメモリ DB
+    (`sqlite://` / `sqlite:///:memory:`) では全コネクションで同じ DB を共有するため
+    StaticPool を使います。
+
+    Args:
+        url (str): 接続 URL
+
+    Returns:
+        Dict[str, Any]: create_engine へ渡す追加キーワード引数
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return {}
+    options: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+    if parsed.database in (None, "", ":memory:"):
+        options["poolclass"] = StaticPool
+    return options
+
+
+def create_db_engine(echo: bool = False, url: Optional[str] = None) -> Engine:
     """
     SQLAlchemy エンジンを生成します。
 
     Args:
         echo (bool): SQL の発行ログを標準出力に出すかどうか
+        url (Optional[str]): 接続 URL (省略時は DATABASE_URL)
 
     Returns:
         Engine: 作成された DB エンジン
@@ -47,9 +91,9 @@ def create_db_engine(echo: bool = False) -> Engine:
     Raises:
         RuntimeError: エンジン生成時に引数エラーが発生した場合
     """
-    url = get_database_url()
+    url = url or get_database_url()
     try:
-        engine = create_engine(url, echo=echo, future=True)
+        engine = create_engine(url, echo=echo, future=True, **_engine_options(url))
         logger.info("データベースエンジンを正常に作成しました。")
         return engine
     except ArgumentError as e:
@@ -57,5 +101,73 @@ def create_db_engine(echo: bool = False) -> Engine:
         raise RuntimeError(f"データベースエンジンの作成に失敗しました: {e}") from e
 
 
+def create_replica_engines(echo: bool = False) -> List[Engine]:
+    """
+    設定された読み取りレプリカごとにエンジンを生成します。
+
+    Args:
+        echo (bool): SQL の発行ログを標準出力に出すかどうか
+
+    Returns:
+        List[Engine]: レプリカエンジンのリスト (未設定時は空リスト)
+    """
+    return [create_db_engine(echo=echo, url=url) for url in get_replica_urls()]
+
+
+def create_schema(target: Engine) -> None:
+    """
+    models パッケージ配下の全モデルを読み込み、SQLModel.metadata からテーブルを作成します。
+    マイグレーションを使わないインメモリ SQLite (テスト・ベンチマーク用) 向けです。
+
+    Args:
+        target (Engine): テーブルを作成するエンジン
+    """
+    models_dir = Path(__file__).resolve().parent.parent / "models"
+    for _, module_name, _ in pkgutil.iter_modules([str(models_dir)]):
+        importlib.import_module(f"models.{module_name}")
+    SQLModel.metadata.create_all(target)
+    logger.info("SQLModel.metadata からスキーマを作成しました。")
+
+
+def seed_database(target: Engine, rows: Mapping[Type[SQLModel], Iterable[Dict[str, Any]]]) -> None:
+    """
+    スキーマを作成し、モデルごとのテーブルの内容を指定した行で置き換えます。
+    インメモリ SQLite (テスト・ベンチマーク用) にシードデータを投入するために使います。
+
+    Args:
+        target (Engine): 投入先のエンジン
+        rows (Mapping[Type[SQLModel], Iterable[Dict[str, Any]]]): モデル → 投入する行 (カラム名 → 値) の一覧
+    """
+    create_schema(target)
+    with Session(target) as session:
+        for model, model_rows in rows.items():
+            session.execute(delete(model))
+            session.add_all(model(**row) for row in model_rows)
+        session.commit()
+    logger.info(f"シードデータを投入しました: {[model.__tablename__ for model in rows]}")
+
+
+def warm_pool(target: Engine, connections: int) -> int:
+    """
+    コネクションプールに指定数のコネクションを事前に確立します (初回リクエストの接続コストを回避)。
+    全コネクションを同時にチェックアウトして SELECT 1 を実行し、プールへ返却します。
+
+    Args:
+        target (Engine): 対象エンジン
+        connections (int): 確立するコネクション数
+
+    Returns:
+        int: 確立したコネクション数
+    """
+    with ExitStack() as stack:
+        for _ in range(connections):
+            connection = stack.enter_context(target.connect())
+            connection.execute(text("SELECT 1"))
+    logger.info(f"コネクションプールをウォームアップしました: {target.url.render_as_string()} x {connections}")
+    return connections
+
+
 # モジュール読み込み時にエンジンを作成
 engine = create_db_engine(echo=True)
+# 読み取りレプリカ (未設定時は空リストで、すべてプライマリを使用)
+replica_engines = create_replica_engines(echo=True)
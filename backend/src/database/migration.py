@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+マイグレーション起動チェックモジュール
+
+コンテナ起動時の `alembic upgrade head` を高速化するためのエントリポイント。
+
+・alembic_version テーブルの現在リビジョンを 1 クエリで取得
+・スクリプトディレクトリの head と比較し、差分がなければ即終了
+・差分がある場合のみ Postgres のアドバイザリロックを取得し、
+  1 レプリカだけがマイグレーションを実行する
+
+Usage:
+    python -m database.migration
+"""
+
+import logging
+import sys
+from pathlib import Path
+from typing import Set
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from commons.settings import settings
+
+# Uvicorn 配下のデータベース用ロガー
+LOGGER = logging.getLogger("uvicorn.database.migration")
+
+# backend/src ディレクトリ (alembic.ini の配置場所)
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def get_alembic_config() -> Config:
+    """
+    alembic.ini を読み込み、スクリプトディレクトリを絶対パスに補正した Config を返します。
+
+    Returns:
+        Config: Alembic 設定
+    """
+    config = Config(str(BASE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BASE_DIR / "alembic"))
+    return config
+
+
+def get_head_revisions(config: Config) -> Set[str]:
+    """
+    スクリプトディレクトリ上の head リビジョンを取得します。
+    env.py (モデルの一括インポート) は読み込みません。
+
+    Args:
+        config (Config): Alembic 設定
+
+    Returns:
+        Set[str]: head リビジョン ID の集合
+    """
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def get_current_revisions(connection: Connection) -> Set[str]:
+    """
+    alembic_version テーブルから現在のリビジョンを 1 クエリで取得します。
+    テーブルが存在しない場合は空集合を返します。
+
+    Args:
+        connection (Connection): DB コネクション
+
+    Returns:
+        Set[str]: 適用済みリビジョン ID の集合
+    """
+    try:
+        rows = connection.execute(text("SELECT version_num FROM alembic_version")).scalars().all()
+    except DBAPIError:
+        # 失敗したトランザクションを破棄しておく (Postgres はエラー後のクエリを受け付けない)
+        connection.rollback()
+        LOGGER.info("[Migration] alembic_version テーブルが存在しません")
+        return set()
+    connection.commit()
+    return set(rows)
+
+
+def is_up_to_date(connection: Connection, config: Config) -> bool:
+    """
+    DB のリビジョンがスクリプトの head と一致しているかを判定します。
+
+    Args:
+        connection (Connection): DB コネクション
+        config (Config): Alembic 設定
+
+    Returns:
+        bool: 未適用のマイグレーションがなければ True
+    """
+    current = get_current_revisions(connection)
+    heads = get_head_revisions(config)
+    LOGGER.debug(f"[Migration] current={sorted(current)}, heads={sorted(heads)}")
+    return current == heads
+
+
+def upgrade_if_needed(engine: Engine, config: Config | None = None) -> bool:
+    """
+    未適用のマイグレーションがある場合のみ `alembic upgrade head` を実行します。
+
+    Postgres ではアドバイザリロックを取得してから再判定するため、
+    複数レプリカが同時に起動しても実行されるのは 1 回だけです。
+
+    Args:
+        engine (Engine): DB エンジン
+        config (Config | None): Alembic 設定 (省略時は alembic.ini を読み込み)
+
+    Returns:
+        bool: マイグレーションを実行した場合は True
+    """
+    config = config or get_alembic_config()
+
+    with engine.connect() as connection:
+        if is_up_to_date(connection, config):
+            LOGGER.info("[Migration] スキーマは最新です。マイグレーションをスキップします")
+            return False
+
+        use_lock = connection.dialect.name == "postgresql"
+        lock_id = settings.migration_advisory_lock_id
+        if use_lock:
+            LOGGER.info(f"[Migration] アドバイザリロック取得待ち: {lock_id}")
+            connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": lock_id})
+            connection.commit()
+
+        try:
+            # ロック待ちの間に別レプリカが適用済みの可能性があるため再判定
+            if is_up_to_date(connection, config):
+                LOGGER.info("[Migration] 他のレプリカが適用済みのためスキップします")
+                return False
+
+            LOGGER.info("[Migration] alembic upgrade head を実行します")
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+            connection.commit()
+            LOGGER.info("[Migration] マイグレーション完了")
+            return True
+        finally:
+            if use_lock:
+                connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+                connection.commit()
+
+
+def main() -> None:
+    """
+    コンテナ起動時のエントリポイント。失敗時は終了コード 1 で終了します。
+    """
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    from database.connection import engine  # 遅延インポート (engine 生成はここで初めて行う)
+
+    try:
+        upgrade_if_needed(engine)
+    except Exception:
+        LOGGER.error("[Migration] マイグレーションに失敗しました", exc_info=True)
+        sys.exit(1)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+読み取りレプリカ ルーティングモジュール
+- SELECT 文をレプリカへ、書き込みとロック付き読み取りをプライマリへ振り分け
+- レプリカ選択方式 (ラウンドロビン / 最小接続数)
+- 書き込み直後の読み取りを一定時間プライマリへ固定 (read-after-write)
+    - 固定はセッション内と、書き込みを行ったクライアント (リクエストごとのスコープ) に限る
+    - 書き込みとして扱うのは flush と DML (INSERT / UPDATE / DELETE) のみ
+      (テキスト SQL や session.connection() は振り分けずにプライマリを使うが、書き込みとはみなさない)
+"""
+
+import itertools
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+# Uvicornロガーを使用
+LOGGER = logging.getLogger("uvicorn.database")
+
+
+class ReplicaSelector:
+    """
+    レプリカエンジンの選択器。
+
+    Args:
+        engines (List[Engine]): レプリカエンジンのリスト
+        strategy (str): "round_robin" または "least_connections"
+    """
+
+    STRATEGIES = ("round_robin", "least_connections")
+
+    def __init__(self, engines: List[Engine], strategy: str = "round_robin"):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未対応のレプリカ選択方式です: {strategy}")
+        self.engines = list(engines)
+        self.strategy = strategy
+        self._counter = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def choose(self) -> Engine:
+        """
+        次に使うレプリカエンジンを返します。
+
+        Returns:
+            Engine: 選択されたレプリカ
+        """
+        if self.strategy == "least_connections":
+            return min(self.engines, key=lambda engine: engine.pool.checkedout())
+        # itertools.count の next() は GIL 下でアトミック
+        return self.engines[next(self._counter) % len(self.engines)]
+
+
+# テキスト SQL のうち書き込みとして扱う文 (先頭のキーワードで判定)
+_TEXT_DML = re.compile(r"\s*(INSERT|UPDATE|DELETE|MERGE|REPLACE|UPSERT)\b", re.IGNORECASE)
+
+
+class ReadAfterWriteScope:
+    """
+    1 クライアント (リクエスト) 分の read-after-write の状態。
+
+    Attributes:
+        sticky_until (float): この時刻 (UNIX 時間) まで読み取りをプライマリへ固定する
+        wrote (bool): このスコープで書き込みを行ったか
+    """
+
+    def __init__(self, sticky_until: float = 0.0):
+        self.sticky_until = sticky_until
+        self.wrote = False
+
+
+_current_scope: ContextVar[Optional[ReadAfterWriteScope]] = ContextVar("read_after_write_scope", default=None)
+
+
+class ReadAfterWriteTracker:
+    """
+    書き込みを行ったクライアントの読み取りを、その後 window 秒間プライマリへ固定するための判定を行います。
+
+    状態は scope で開始したスコープ (contextvar、リクエストごと) に記録されるため、
+    他のクライアントの読み取りには影響しません。スコープ外 (バッチ処理など) ではセッション内の固定のみ行います。
+    リクエストをまたぐ固定は ReadAfterWriteMiddleware が cookie で持ち回ります (ワーカーをまたいでも有効)。
+
+    Args:
+        window (float): 書き込み後にプライマリへ固定する秒数
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+
+    @contextmanager
+    def scope(self, sticky_until: float = 0.0) -> Iterator[ReadAfterWriteScope]:
+        """
+        クライアント (リクエスト) のスコープを開始します。
+
+        Args:
+            sticky_until (float): 前回のリクエストから持ち回った固定の期限 (UNIX 時間)
+        """
+        state = ReadAfterWriteScope(sticky_until)
+        token = _current_scope.set(state)
+        try:
+            yield state
+        finally:
+            _current_scope.reset(token)
+
+    def mark_write(self) -> None:
+        """
+        現在のスコープに書き込み発生を記録します。
+        """
+        state = _current_scope.get()
+        if state is not None:
+            state.wrote = True
+            state.sticky_until = time.time() + self.window
+
+    def in_window(self) -> bool:
+        """
+        現在のスコープの直近の書き込みから window 秒以内かどうか。
+        """
+        state = _current_scope.get()
+        return state is not None and time.time() < state.sticky_until
+
+
+class RoutingSession(Session):
+    """
+    文の種類に応じてプライマリ／レプリカを振り分けるセッション。
+
+    レプリカが設定されていない場合は常にプライマリ (bind) を使うため、
+    通常の Session と同じ挙動になります。
+
+    Args:
+        replica_selector (Optional[ReplicaSelector]): レプリカ選択器
+        write_tracker (Optional[ReadAfterWriteTracker]): 書き込み時刻トラッカー
+        **kwargs: Session へそのまま渡す引数
+    """
+
+    def __init__(
+        self,
+        replica_selector: Optional[ReplicaSelector] = None,
+        write_tracker: Optional[ReadAfterWriteTracker] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.replica_selector = replica_selector
+        self.write_tracker = write_tracker
+        # このセッションで一度でも書き込みを行ったか (以降の読み取りはプライマリ)
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kw) -> Engine:
+        primary = super().get_bind(mapper=mapper, clause=clause, **kw)
+        if not self.replica_selector:
+            return primary
+
+        if self._flushing or self._is_write(clause):
+            self._wrote = True
+            if self.write_tracker is not None:
+                self.write_tracker.mark_write()
+            return primary
+
+        # ロック付き読み取り・判別できない文 (テキスト SQL、session.connection()) はプライマリで実行する
+        if not self._is_plain_read(clause):
+            return primary
+
+        if self._wrote or (self.write_tracker is not None and self.write_tracker.in_window()):
+            LOGGER.debug("[DB] read-after-write のためプライマリから読み取ります")
+            return primary
+
+        return self.replica_selector.choose()
+
+    @staticmethod
+    def _is_write(clause: Any) -> bool:
+        """
+        DML (INSERT / UPDATE / DELETE、テキスト SQL では先頭のキーワード) かどうかを判定します。
+        """
+        if isinstance(clause, UpdateBase):
+            return True
+        return isinstance(clause, TextClause) and _TEXT_DML.match(clause.text) is not None
+
+    @staticmethod
+    def _is_plain_read(clause: Any) -> bool:
+        """
+        ロックを伴わない SELECT 文かどうかを判定します。
+        """
+        return isinstance(clause, Select) and clause._for_update_arg is None
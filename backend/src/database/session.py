@@ -2,36 +2,80 @@
 データベースセッション管理モジュール
 - SQLAlchemy エンジンからセッションを生成
 - 依存注入可能なジェネレータ関数を提供
+- コネクションは最初のクエリまで取得せず、後始末はコネクション保持時のみ DB 用スレッドプールで実行
+- 読み取りレプリカ設定時は RoutingSession で SELECT をレプリカへ振り分け
 """
 
 import logging
-from typing import Generator
+from typing import Any, AsyncGenerator, Callable, TypeVar
 
 from sqlalchemy.orm import Session, sessionmaker
 
-from .connection import engine
+from commons.settings import settings
+from database.connection import engine, replica_engines
+from database.routing import ReadAfterWriteTracker, ReplicaSelector, RoutingSession
+from utils.executor import run_db
 
 # Uvicornロガーを使用
 LOGGER = logging.getLogger("uvicorn.database")
 
-# セッションファクトリの生成
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)  # SQLAlchemy 2.0 スタイル
+T = TypeVar("T")
 
+# 書き込み直後の読み取りをプライマリへ固定するためのトラッカー (状態はリクエストごとのスコープに記録)
+write_tracker = ReadAfterWriteTracker(window=settings.database_read_after_write_seconds)
 
-def get_session() -> Generator[Session, None, None]:
+# セッションファクトリの生成 (レプリカ未設定時は常にプライマリ)
+SessionLocal = sessionmaker(
+    class_=RoutingSession,
+    replica_selector=ReplicaSelector(replica_engines, strategy=settings.database_replica_strategy),
+    write_tracker=write_tracker,
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
+    future=True,  # SQLAlchemy 2.0 スタイル
+)
+
+
+def release_after(session: Session, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
     """
-    データベースセッションを生成し、リクエスト終了後にクローズします。
+    func を実行し、終了後ただちにセッションをクローズしてコネクションを返却します。
+    run_db と組み合わせ、DB 処理の完了時点でコネクションを手放すために使います。
+    (クローズ後もセッションは再利用でき、次のクエリで改めてコネクションを取得します)
+
+    Args:
+        session (Session): 返却対象のセッション
+        func (Callable[..., T]): DB 処理
+
+    Returns:
+        T: func の戻り値
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        session.close()
+
+
+async def get_session() -> AsyncGenerator[Session, None]:
+    """
+    セッションを生成し、リクエスト終了後にクローズします。
+
+    Session は最初のクエリまでコネクションをプールから取得しない (autobegin) ため、生成自体は軽く、
+    依存注入のためのスレッド切り替えは発生しません。
+    後始末もトランザクションが開始されている (コネクションを保持している) 場合のみ DB 用スレッドプールで実行します。
 
     Yields:
-        Session: SQLAlchemy セッションインスタンス
+        Session: SQLAlchemy セッション
     """
-    session: Session = SessionLocal()
+    session = SessionLocal()
     try:
         yield session
     except Exception as exc:
         LOGGER.error(f"[DB] セッション使用中にエラーが発生しました: {exc}", exc_info=True)
-        session.rollback()
+        if session.in_transaction():
+            await run_db(session.rollback)
         raise
     finally:
-        session.close()
-        LOGGER.debug("[DB] セッションをクローズしました")
+        if session.in_transaction():
+            await run_db(session.close)
+        else:
+            session.close()
@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本番用マルチプロセスランチャー
+
+・マスタープロセスで main (create_app) をプリロードしてから N 個のワーカーを fork
+  (インポートとアプリ生成のコストを 1 回に抑え、コピーオンライトでメモリを共有)
+・待ち受けソケットはマスターで bind して全ワーカーで共有 (--reuse-port 指定時はワーカーごとに
+  SO_REUSEPORT で bind し、カーネルに振り分けさせる)
+・uvloop / httptools が利用可能なら自動的に使用
+・ワーカーのリサイクル: リクエスト数上限 (ジッター付き) と RSS 上限
+  (RSS 超過時は代替ワーカーの起動完了を待ってから旧ワーカーを停止)
+・SIGHUP でローリング再起動 (1 台ずつ「新ワーカー起動完了 → 旧ワーカーを graceful 停止」)
+・SIGTERM / SIGINT で全ワーカーを graceful 停止し、期限を過ぎたら SIGKILL
+  (ワーカーは停止前に utils.shutdown.drain で処理中リクエストと WebSocket をドレイン)
+・ワーカーとハブのログはマスターへ中継し、ファイルへの出力はマスターだけが行う (LogRelay)
+  (各プロセスが同じログファイルをそれぞれローテーションすると、互いのファイルを上書き・削除するため)
+・WS_BUS_BACKEND=unix の場合、ワーカー間のチャット配信ハブ (services.chat_bus) を専用プロセスで起動
+  (異常終了時は再起動、ワーカーは自動で再接続)
+  WS_BUS_BACKEND=local (プロセス内配信) のままワーカーを複数起動すると、別のワーカーに接続したクライアント同士に
+  メッセージが届かないため、その場合は unix に切り替えてハブを起動する
+
+ローリング再起動はプリロード済みのアプリを fork し直すため、コードの変更を反映するには
+マスターごと再起動してください (開発時は `uvicorn main:app --reload` を使用)。
+
+Usage:
+    python launcher.py --workers 4 --log-config logging_config.yaml
+    kill -HUP <master pid>   # ローリング再起動
+"""
+
+import argparse
+import logging
+import logging.handlers
+import math
+import os
+import pickle
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Dict, List, Optional
+
+import uvicorn
+from uvicorn.config import LOGGING_CONFIG
+
+from commons.settings import settings
+from utils.shutdown import drain
+from utils.ws_deflate import websocket_protocol
+
+# Uvicorn ロガー取得
+LOGGER = logging.getLogger("uvicorn.launcher")
+
+
+@dataclass
+class Worker:
+    """
+    fork したワーカープロセス。
+
+    Attributes:
+        pid (int): プロセス ID
+        ready_fd (int): 起動完了通知を受け取るパイプ (読み取り側)
+        started_at (float): 起動時刻 (monotonic)
+        retiring (bool): 停止を指示済みかどうか
+    """
+
+    pid: int
+    ready_fd: int
+    started_at: float
+    retiring: bool = False
+
+
+class _RelayHandler(logging.handlers.DatagramHandler):
+    """
+    ログレコードを pickle してマスターへ送るハンドラー (子プロセスのルートロガーに設定)。
+    """
+
+    def __init__(self, sock: socket.socket):
+        super().__init__("", None)
+        self.sock = sock
+
+    def send(self, s: bytes) -> None:
+        self.sock.send(s)
+
+
+class LogRelay:
+    """
+    ワーカー・ハブのログをマスターへ中継します。
+
+    fork 前にマスターで生成し、子プロセスでは attach でハンドラーを中継用に置き換えます。
+    Unix データグラムソケットで 1 レコードを 1 データグラムとして送るため、プロセス間でレコードが混ざらず、
+    ロックも不要です (ロガーのレベル・フィルターは子プロセスで、ハンドラーはマスターで適用)。
+    """
+
+    # 1 レコードの最大サイズ (トレースバックを含む)
+    MAX_RECORD_BYTES = 256 * 1024
+
+    def __init__(self):
+        self._receiver, self._sender = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        マスターで中継されたレコードの処理を始めます。
+        """
+        self._thread = threading.Thread(target=self._serve, name="log-relay", daemon=True)
+        self._thread.start()
+
+    def _serve(self) -> None:
+        while True:
+            data = self._receiver.recv(self.MAX_RECORD_BYTES)
+            if not data:
+                break
+            try:
+                # DatagramHandler の形式 (先頭 4 バイトは長さ)
+                record = logging.makeLogRecord(pickle.loads(data[4:]))
+            except Exception:
+                # 壊れたレコードは捨てる
+                continue
+            logging.getLogger(record.name).handle(record)
+
+    def attach(self) -> None:  # pragma: no cover (子プロセス)
+        """
+        子プロセスのロガーのハンドラーを外し、すべてのレコードをルートロガーから中継します。
+        """
+        self._receiver.close()
+        for logger in list(logging.root.manager.loggerDict.values()):
+            if isinstance(logger, logging.Logger) and logger.handlers:
+                logger.handlers = []
+                logger.propagate = True
+        logging.root.handlers = [_RelayHandler(self._sender)]
+
+    def stop(self) -> None:
+        """
+        送信済みのレコードを処理し終えてから停止します (全子プロセスの終了後に呼ぶ)。
+        """
+        if self._thread is not None:
+            # 空のデータグラムが終了の合図
+            self._sender.send(b"")
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self._receiver.close()
+        self._sender.close()
+
+
+class _NotifyingServer(uvicorn.Server):
+    """
+    起動 (lifespan startup と listen) の完了をパイプでマスターへ通知する uvicorn サーバー。
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self._ready_fd = ready_fd
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            os.write(self._ready_fd, b"1")
+        os.close(self._ready_fd)
+
+    async def shutdown(self, sockets=None) -> None:
+        # uvicorn は既存接続のシャットダウンで WebSocket を即座に切断するため、
+        # その前に新規受け付けを止めてアプリのドレイン (クローズフレーム送信、処理中リクエストの完了待ち) を行う
+        for server in self.servers:
+            server.close()
+        await drain(settings.shutdown_drain_timeout_seconds)
+        await super().shutdown(sockets=sockets)
+
+
+def select_loop() -> str:
+    """
+    uvloop がインストールされていれば "uvloop"、なければ "asyncio" を返します。
+    """
+    return "uvloop" if find_spec("uvloop") is not None else "asyncio"
+
+
+def select_http() -> str:
+    """
+    httptools がインストールされていれば "httptools"、なければ "h11" を返します。
+    """
+    return "httptools" if find_spec("httptools") is not None else "h11"
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """
+    /proc から指定プロセスの RSS (バイト) を取得します。取得できない環境では None を返します。
+    """
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def available_cpus(cgroup_root: str = "/sys/fs/cgroup") -> int:
+    """
+    このプロセスが使える CPU 数を返します (既定のワーカー数)。
+
+    os.cpu_count() はホストの CPU 数を返すため、コンテナの CPU 制限 (cgroup の quota) と
+    CPU アフィニティを考慮し、小さい方を使います (quota は切り上げ、最小 1)。
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    # cgroup v2: cpu.max = "<quota> <period>" (無制限なら "max <period>")
+    # cgroup v1: cpu/cpu.cfs_quota_us (無制限なら -1) と cpu/cpu.cfs_period_us
+    for quota_file, period_file in (
+        ("cpu.max", None),
+        (os.path.join("cpu", "cpu.cfs_quota_us"), os.path.join("cpu", "cpu.cfs_period_us")),
+    ):
+        try:
+            with open(os.path.join(cgroup_root, quota_file)) as f:
+                values = f.read().split()
+            if period_file is not None:
+                with open(os.path.join(cgroup_root, period_file)) as f:
+                    values.append(f.read().strip())
+            quota, period = values[0], int(values[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if quota not in ("max", "-1") and period > 0:
+            cpus = min(cpus, math.ceil(int(quota) / period))
+        break
+    return max(cpus, 1)
+
+
+def select_bus_backend(workers: int, backend: str) -> str:
+    """
+    ワーカー数に応じて使うチャット配信バスを返します。
+
+    "local" は同じプロセスの接続にしか配信しないため、複数ワーカーでは "unix" (ハブ経由) に切り替えます。
+    """
+    if workers > 1 and backend == "local":
+        return "unix"
+    return backend
+
+
+def create_socket(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    """
+    待ち受けソケットを生成して bind / listen します。
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Launcher:
+    """
+    プリフォーク型のワーカー管理。
+
+    Args:
+        args (argparse.Namespace): コマンドライン引数 (既定値は Settings の launcher_*)
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workers: Dict[int, Worker] = {}
+        self.socket: Optional[socket.socket] = None
+        self.app = None
+        self._stopping = False
+        self._restart_requested = False
+        # チャット配信ハブのプロセス ID (WS_BUS_BACKEND=unix の場合のみ)
+        self.hub_pid: Optional[int] = None
+        self.log_relay: Optional[LogRelay] = None
+        # 起動直後に異常終了したワーカーの連続回数 (再起動ループを指数バックオフで抑制)
+        self._failures = 0
+
+    # ── マスター ──────────────────────────────────────────────────────────
+
+    def run(self) -> None:
+        """
+        アプリをプリロードし、ワーカーを起動して監視ループに入ります。
+        """
+        args = self.args
+        # uvicorn.Config の生成時にロギング設定が適用される (プリロード前に適用し、マスターも同じ設定で出力)
+        self.config_template()
+
+        LOGGER.info(f"[Launcher] master pid={os.getpid()} loop={select_loop()} http={select_http()}")
+        # チャット配信バス (services.chat_bus.CHAT_BUS) はインポート時に生成されるため、プリロード前に決める
+        backend = select_bus_backend(args.workers, settings.ws_bus_backend)
+        if backend != settings.ws_bus_backend:
+            LOGGER.warning(
+                f"[Launcher] WS_BUS_BACKEND={settings.ws_bus_backend} delivers only within a worker, "
+                f"using {backend} for {args.workers} workers"
+            )
+            settings.ws_bus_backend = backend
+        import main
+
+        self.app = main.app
+        # fork 前にマスターが保持しているコネクションを閉じる (子には持ち越さない)
+        self._dispose_engines(close=True)
+
+        if not args.reuse_port:
+            self.socket = create_socket(args.host, args.port)
+        LOGGER.info(f"[Launcher] listening on {args.host}:{args.port} workers={args.workers}")
+        self.log_relay = LogRelay()
+        self.log_relay.start()
+
+        signal.signal(signal.SIGHUP, self._on_sighup)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        if settings.ws_bus_backend == "unix":
+            self.spawn_hub()
+        for _ in range(args.workers):
+            self.spawn()
+
+        try:
+            self.supervise()
+        finally:
+            self.shutdown()
+
+    def supervise(self) -> None:
+        """
+        ワーカーの終了・RSS 超過・SIGHUP を監視します。
+        """
+        last_rss_check = time.monotonic()
+        while not self._stopping:
+            self.reap()
+            if self._stopping:
+                break
+            if settings.ws_bus_backend == "unix" and self.hub_pid is None:
+                self.spawn_hub()
+            if self._restart_requested:
+                self._restart_requested = False
+                self.rolling_restart()
+            # 不足分を補充 (リクエスト数上限で終了したワーカーなど)
+            if len(self._active()) < self.args.workers and self._failures:
+                time.sleep(min(0.5 * 2**self._failures, 30.0))
+            while len(self._active()) < self.args.workers and not self._stopping:
+                self.spawn()
+            if self.args.max_worker_rss_mb and time.monotonic() - last_rss_check >= self.args.check_interval:
+                last_rss_check = time.monotonic()
+                self.check_memory()
+            time.sleep(0.5)
+
+    def spawn(self) -> Worker:
+        """
+        ワーカーを 1 つ fork します。
+        """
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover (子プロセス)
+            os.close(ready_r)
+            self._attach_log_relay()
+            code = 0
+            try:
+                self._run_worker(ready_w)
+            except BaseException:
+                LOGGER.error("[Launcher] worker crashed", exc_info=True)
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+
+        os.close(ready_w)
+        worker = Worker(pid=pid, ready_fd=ready_r, started_at=time.monotonic())
+        self.workers[pid] = worker
+        LOGGER.info(f"[Launcher] spawned worker pid={pid}")
+        return worker
+
+    def spawn_hub(self) -> None:
+        """
+        チャット配信ハブのプロセスを fork します。
+        """
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover (子プロセス)
+            self._attach_log_relay()
+            code = 0
+            try:
+                self._run_hub()
+            except BaseException:
+                LOGGER.error("[Launcher] chat bus hub crashed", exc_info=True)
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+
+        self.hub_pid = pid
+        LOGGER.info(f"[Launcher] spawned chat bus hub pid={pid}")
+
+    def wait_ready(self, worker: Worker, timeout: float) -> bool:
+        """
+        ワーカーの起動完了通知を待ちます。
+        """
+        readable, _, _ = select.select([worker.ready_fd], [], [], timeout)
+        return bool(readable) and os.read(worker.ready_fd, 1) == b"1"
+
+    def stop_worker(self, worker: Worker, wait: bool = True) -> None:
+        """
+        ワーカーに SIGTERM を送って graceful に停止させます (wait=True なら終了まで待つ)。
+        """
+        worker.retiring = True
+        self._kill(worker.pid, signal.SIGTERM)
+        if not wait:
+            return
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while worker.pid in self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        if worker.pid in self.workers:
+            LOGGER.warning(f"[Launcher] worker pid={worker.pid} did not exit in time, killing")
+            self._kill(worker.pid, signal.SIGKILL)
+
+    def rolling_restart(self) -> None:
+        """
+        ワーカーを 1 台ずつ入れ替えます (新ワーカーの起動完了後に旧ワーカーを停止)。
+        """
+        LOGGER.info("[Launcher] rolling restart started")
+        for old in list(self._active()):
+            if self._stopping:
+                return
+            self.replace(old)
+        LOGGER.info("[Launcher] rolling restart finished")
+
+    def replace(self, old: Worker) -> None:
+        """
+        代替ワーカーを起動し、起動完了を待ってから旧ワーカーを停止します。
+        """
+        new = self.spawn()
+        if not self.wait_ready(new, self.args.startup_timeout):
+            LOGGER.error(f"[Launcher] worker pid={new.pid} failed to become ready, keeping pid={old.pid}")
+            self.stop_worker(new)
+            return
+        self.stop_worker(old)
+
+    def check_memory(self) -> None:
+        """
+        RSS 上限を超えたワーカーを入れ替えます。
+        """
+        limit = self.args.max_worker_rss_mb * 1024 * 1024
+        for worker in list(self._active()):
+            rss = rss_bytes(worker.pid)
+            if rss is not None and rss > limit:
+                LOGGER.warning(
+                    f"[Launcher] worker pid={worker.pid} rss={rss // (1024 * 1024)}MB exceeds limit, recycling"
+                )
+                self.replace(worker)
+
+    def reap(self) -> None:
+        """
+        終了したワーカーを回収します。
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid == self.hub_pid:
+                self.hub_pid = None
+                if not self._stopping:
+                    LOGGER.warning(f"[Launcher] chat bus hub pid={pid} exited, restarting")
+                continue
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.ready_fd)
+            if worker.retiring or self._stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            LOGGER.info(f"[Launcher] worker pid={pid} exited (status={code})")
+            if code != 0 and time.monotonic() - worker.started_at < self.args.startup_timeout:
+                self._failures += 1
+            else:
+                self._failures = 0
+
+    def shutdown(self) -> None:
+        """
+        全ワーカーを graceful に停止し、期限を過ぎたら強制終了します。
+        """
+        self._stopping = True
+        LOGGER.info("[Launcher] shutting down workers")
+        for worker in list(self.workers.values()):
+            self.stop_worker(worker, wait=False)
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            LOGGER.warning(f"[Launcher] worker pid={pid} did not exit in time, killing")
+            self._kill(pid, signal.SIGKILL)
+        self.reap()
+        # ハブはワーカーの停止 (ドレイン) が終わってから止める
+        if self.hub_pid is not None:
+            self._kill(self.hub_pid, signal.SIGTERM)
+            try:
+                os.waitpid(self.hub_pid, 0)
+            except ChildProcessError:
+                pass
+            self.hub_pid = None
+        if self.socket is not None:
+            self.socket.close()
+        LOGGER.info("[Launcher] master exit")
+        if self.log_relay is not None:
+            self.log_relay.stop()
+            self.log_relay = None
+
+    def config_template(self, **overrides) -> uvicorn.Config:
+        """
+        ワーカー用の uvicorn.Config を生成します。
+        """
+        args = self.args
+        limit_max_requests = None
+        if args.max_requests:
+            # 全ワーカーが同時にリサイクルされないようジッターを加える
+            limit_max_requests = args.max_requests + random.randint(0, args.max_requests_jitter)
+        options = dict(
+            app=self.app,
+            loop=select_loop(),
+            http=select_http(),
+            lifespan="on",
+            proxy_headers=True,
+            forwarded_allow_ips=args.forwarded_allow_ips,
+            log_config=args.log_config or LOGGING_CONFIG,
+            limit_max_requests=limit_max_requests,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            # しきい値未満の小さなメッセージは圧縮しない permessage-deflate (utils.ws_deflate)
+            ws=websocket_protocol(),
+            ws_per_message_deflate=settings.ws_per_message_deflate,
+            # ハートビートはアプリのタイマーホイールで行う (接続ごとの keepalive タスクを作らない)
+            ws_ping_interval=None if settings.ws_heartbeat_interval_seconds > 0 else 20.0,
+        )
+        options.update(overrides)
+        return uvicorn.Config(**options)
+
+    def _active(self) -> List[Worker]:
+        return [worker for worker in self.workers.values() if not worker.retiring]
+
+    def _on_sighup(self, signum, frame) -> None:
+        self._restart_requested = True
+
+    def _on_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    @staticmethod
+    def _kill(pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    @staticmethod
+    def _dispose_engines(close: bool) -> None:
+        from database.connection import engine, replica_engines
+
+        for target in (engine, *replica_engines):
+            target.dispose(close=close)
+
+    # ── ワーカー ──────────────────────────────────────────────────────────
+
+    def _attach_log_relay(self) -> None:  # pragma: no cover (子プロセス)
+        if self.log_relay is not None:
+            self.log_relay.attach()
+
+    def _run_worker(self, ready_fd: int) -> None:  # pragma: no cover (子プロセス)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        random.seed()
+        # マスターから引き継いだプールは使わず、子プロセスで新しいコネクションを張る
+        self._dispose_engines(close=False)
+
+        if self.args.reuse_port:
+            sock = create_socket(self.args.host, self.args.port, reuse_port=True)
+        else:
+            sock = self.socket
+        # ロギング設定はマスターで適用済み (ログはマスターへ中継)
+        config = self.config_template(log_config=None)
+        _NotifyingServer(config, ready_fd).run(sockets=[sock])
+
+    def _run_hub(self) -> None:  # pragma: no cover (子プロセス)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        # 待ち受けソケットはハブでは使わない
+        if self.socket is not None:
+            self.socket.close()
+        from services.chat_bus import run_hub
+
+        run_hub()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    コマンドライン引数を解析します (既定値は Settings の launcher_*)。
+    """
+    parser = argparse.ArgumentParser(description="FastAPI アプリをプリフォーク型で起動します。")
+    parser.add_argument("--host", default=settings.launcher_host)
+    parser.add_argument("--port", type=int, default=settings.launcher_port)
+    parser.add_argument("--workers", type=int, default=settings.launcher_workers or available_cpus())
+    parser.add_argument("--reuse-port", action="store_true", default=settings.launcher_reuse_port)
+    parser.add_argument("--max-requests", type=int, default=settings.launcher_max_requests)
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.launcher_max_requests_jitter)
+    parser.add_argument("--max-worker-rss-mb", type=int, default=settings.launcher_max_worker_rss_mb)
+    parser.add_argument("--check-interval", type=float, default=settings.launcher_check_interval_seconds)
+    parser.add_argument("--graceful-timeout", type=float, default=settings.launcher_graceful_timeout_seconds)
+    parser.add_argument("--startup-timeout", type=float, default=settings.launcher_startup_timeout_seconds)
+    parser.add_argument("--forwarded-allow-ips", default=settings.launcher_forwarded_allow_ips)
+    parser.add_argument("--log-config", default=settings.launcher_log_config)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    ランチャーのエントリポイント。
+    """
+    Launcher(parse_args(argv)).run()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
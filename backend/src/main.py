@@ -6,33 +6,62 @@
 
 ・FastAPI インスタンスの生成と各種設定
 ・CORS ミドルウェア（環境変数ベース）
-・汎用ミドルウェア一括登録
+・汎用ミドルウェア一括登録（ルートマニフェスト経由）
 ・HeaderMiddleware（HMAC シグネチャ／不要ヘッダー削除）
-・ルーター自動登録（DDD 構成対応）
+・ルーター自動登録（DDD 構成対応、ルートマニフェスト経由）
 ・ページネーション／API バージョニング
+・OpenAPI ドキュメントの事前圧縮キャッシュ (ETag / 304 対応)
+・liveness / readiness プローブ (/livez, /readyz)
+・グレースフルシャットダウン (リクエスト／WebSocket のドレイン、プール破棄)
 ・静的ファイル配信
 ・WebSocket チャットエンドポイント
+・バックグラウンドタスク (Firebase 公開鍵の更新、ワーカー間のチャット配信バス、WebSocket のハートビートなど)
 """
 
+import json
 import logging
 from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List
 
 import anyio
+from anyio.abc import TaskGroup
 from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi_pagination import add_pagination
-from fastapi_versioning import VersionedFastAPI
+from sqlalchemy.pool import StaticPool
 from sqlmodel import Session
+from starlette.middleware import Middleware
 
 from app_state import environment_info_static
 from commons.settings import settings
-from database.connection import engine
+from database.connection import engine, replica_engines, warm_pool
+from database.session import write_tracker
 from middlewares.cors_config import CORSConfig
+from middlewares.drain_middleware import DrainMiddleware
 from middlewares.header_middleware import HeaderMiddleware
+from middlewares.openapi_cache_middleware import OpenAPICacheMiddleware
+from middlewares.probe_middleware import ProbeMiddleware
+from middlewares.read_after_write_middleware import ReadAfterWriteMiddleware
+from middlewares.ws_transport_middleware import WebSocketTransportMiddleware
 from repositories.environment_repository import EnvironmentRepository
+from routers.ws.chat import manager as chat_manager
+from services.chat_bus import CHAT_BUS
 from services.environment_service import EnvironmentService
+from utils.executor import run_auth, run_cpu, run_db
+from utils.firebase_auth import initialize_firebase_app, is_firebase_configured
+from utils.firebase_jwks import FIREBASE_KEYS
+from utils.lazy_import import warm_up
 from utils.middlewares_manager import include_all_middlewares
+from utils.readiness import StartupTask, StartupTaskSkipped, run_startup_stages
+from utils.route_manifest import load_route_manifest
 from utils.routers_manager import include_all_routers
+from utils.runtime_stats import collect_runtime_stats
+from utils.shutdown import DRAIN, cleanup, drain, flush_log_handlers, on_cleanup
+from utils.startup_profiler import STARTUP_PROFILER
+from utils.versioning import build_versioned_app, prefixed_openapi
+from utils.warmup import load_fixtures, warm_up_routes
 
 # Uvicorn ロガー取得
 LOGGER = logging.getLogger("uvicorn")
@@ -42,81 +71,268 @@ LOGGER = logging.getLogger("uvicorn")
 async def lifespan(app: FastAPI):
     """
     アプリケーションの起動とシャットダウンの処理。
+
+    独立した初期化タスクをタスクグループで並行実行し、ルートのウォームアップを経て
+    必須タスクがすべて完了した時点でレディネスを ready にします。
     """
     LOGGER.info("[LIFECYCLE] アプリ起動開始")
+    DRAIN.reset()
     try:
-        # ブロッキング処理を別スレッドで実行
-        await anyio.to_thread.run_sync(initialize_database)
-        LOGGER.info("[LIFECYCLE] 初期化完了")
-        yield
+        async with anyio.create_task_group() as background:
+            # 初期化タスクの完了後にウォームアップを行い、その後 ready にする
+            await run_startup_stages([build_startup_tasks(), build_warmup_tasks(app)])
+            start_background_tasks(background)
+            LOGGER.info("[LIFECYCLE] 初期化完了")
+            try:
+                yield
+            finally:
+                background.cancel_scope.cancel()
     except Exception:
         LOGGER.error("[LIFECYCLE] 起動中に例外発生", exc_info=True)
         raise
     finally:
         LOGGER.info("[LIFECYCLE] シャットダウン処理開始")
-        # TODO: リソース解放など
+        # launcher のワーカーでは接続のシャットダウン前に実行済み (その場合は何もしない)
+        await drain(settings.shutdown_drain_timeout_seconds)
+        # ログのフラッシュ、エンジンの dispose など
+        await cleanup()
         LOGGER.info("[LIFECYCLE] シャットダウン処理完了")
 
 
+async def _flush_logs() -> None:
+    flushed = flush_log_handlers()
+    LOGGER.info(f"[LIFECYCLE] ログハンドラをフラッシュしました: {flushed} 件")
+
+
+async def _log_runtime_stats() -> None:
+    # 稼働中のエグゼキュータの待ち・実行時間などを停止時に 1 行で残す
+    LOGGER.info(f"[LIFECYCLE] 実行メトリクス: {json.dumps(collect_runtime_stats(), ensure_ascii=False)}")
+
+
+async def _dispose_engines() -> None:
+    # チェックイン済みのコネクションを閉じる (プールを破棄)
+    for target in (engine, *replica_engines):
+        # インメモリ SQLite (StaticPool) は唯一のコネクションが DB 本体のため破棄しない
+        if isinstance(target.pool, StaticPool):
+            continue
+        await run_db(target.dispose)
+
+
+on_cleanup("runtime_stats", _log_runtime_stats)
+on_cleanup("dispose_engines", _dispose_engines)
+# ログは最後にフラッシュする
+on_cleanup("flush_logs", _flush_logs)
+
+
+def start_background_tasks(background: TaskGroup) -> None:
+    """
+    アプリの稼働中に実行し続けるタスクを起動します (シャットダウン開始時にキャンセル)。
+
+    Args:
+        background (TaskGroup): lifespan のタスクグループ
+    """
+    if settings.firebase_verifier == "local":
+        # Firebase の公開鍵を期限前に更新し、リクエスト中に取得を待たない
+        background.start_soon(FIREBASE_KEYS.run_refresher, name="firebase_keys_refresher")
+    if settings.ws_bus_backend != "local":
+        # ワーカー間のチャット配信バスへの接続を維持する (切断時は再接続)
+        background.start_soon(CHAT_BUS.run, name="chat_bus")
+    if settings.ws_heartbeat_interval_seconds > 0:
+        # WebSocket のハートビートとアイドル接続の切断
+        background.start_soon(chat_manager.run_heartbeat, name="ws_heartbeat")
+
+
+def build_startup_tasks() -> List[StartupTask]:
+    """
+    lifespan で並行実行する初期化タスクを組み立てます。
+
+    Returns:
+        List[StartupTask]: 起動タスク
+    """
+    timeout = settings.startup_task_timeout_seconds
+
+    async def database_cache() -> None:
+        # ブロッキング処理を DB 用スレッドプールで実行
+        await run_db(initialize_database)
+
+    async def database_pool() -> None:
+        connections = settings.startup_pool_warmup_connections
+        if connections <= 0:
+            raise StartupTaskSkipped("STARTUP_POOL_WARMUP_CONNECTIONS=0")
+        async with anyio.create_task_group() as tg:
+            for target in (engine, *replica_engines):
+                tg.start_soon(run_db, warm_pool, target, connections)
+
+    async def firebase_sdk() -> None:
+        # 初回の認証リクエストに SDK 初期化コストを負わせない
+        if not settings.startup_firebase_init:
+            raise StartupTaskSkipped("STARTUP_FIREBASE_INIT=false")
+        if not is_firebase_configured():
+            raise StartupTaskSkipped("service account file not found")
+        await run_auth(initialize_firebase_app)
+
+    async def firebase_keys() -> None:
+        # ローカル検証用の公開鍵を ready 前に取得しておく
+        if settings.firebase_verifier != "local":
+            raise StartupTaskSkipped("FIREBASE_VERIFIER is not local")
+        await FIREBASE_KEYS.refresh_async()
+
+    async def lazy_imports() -> None:
+        # 遅延インポート対象のうち、指定されたモジュールを事前に読み込む
+        if not settings.lazy_import_warmup:
+            raise StartupTaskSkipped("LAZY_IMPORT_WARMUP is not set")
+        names = [name.strip() for name in settings.lazy_import_warmup.split(",") if name.strip()]
+        loaded = await run_cpu(warm_up, names)
+        LOGGER.info(f"[LIFECYCLE] 遅延インポートのウォームアップ完了: {loaded}")
+
+    # 設定で有効にした初期化 (プールのウォームアップ、Firebase SDK) は失敗したら起動を中止する
+    # (未設定・無効の場合は StartupTaskSkipped でスキップされ、起動は妨げない)
+    return [
+        StartupTask("database_cache", database_cache, timeout=timeout),
+        StartupTask("database_pool", database_pool, timeout=timeout),
+        StartupTask("firebase_sdk", firebase_sdk, timeout=timeout),
+        StartupTask("firebase_keys", firebase_keys, timeout=timeout, required=False),
+        StartupTask("lazy_imports", lazy_imports, timeout=timeout, required=False),
+    ]
+
+
+def build_warmup_tasks(app: FastAPI) -> List[StartupTask]:
+    """
+    初期化タスクの完了後に実行するウォームアップタスクを組み立てます (WARMUP_ENABLED で有効化)。
+
+    Args:
+        app (FastAPI): lifespan に渡された親アプリ
+
+    Returns:
+        List[StartupTask]: ウォームアップタスク
+    """
+
+    async def route_warmup() -> None:
+        if not settings.warmup_enabled:
+            raise StartupTaskSkipped("WARMUP_ENABLED=false")
+        fixtures = load_fixtures(Path(settings.warmup_fixtures_path)) if settings.warmup_fixtures_path else []
+        await warm_up_routes(app, fixtures)
+
+    return [StartupTask("route_warmup", route_warmup, timeout=settings.warmup_timeout_seconds, required=False)]
+
+
 def create_app() -> FastAPI:
     """
     FastAPI アプリケーションインスタンスの生成と設定適用。
+
+    各フェーズの所要時間は STARTUP_PROFILER に記録されます
+    (STARTUP_PROFILE_OUTPUT 設定時はレポートを書き出し)。
     """
-    app = FastAPI(
-        title=settings.title,
-        version=settings.version,
-        description=settings.description,
-        docs_url=settings.docs_url,
-        redoc_url=settings.redoc_url,
-        openapi_url=settings.openapi_url,
-        lifespan=lifespan,
-        redirect_slashes=settings.redirect_slashes,
-    )
-    LOGGER.info("[INIT] FastAPI インスタンス生成完了")
-
-    # CORS ミドルウェア設定
-    LOGGER.info("[INIT] CORS 設定開始")
-    CORSConfig(app)
-    LOGGER.info("[INIT] CORS 設定完了")
-
-    # 共通ミドルウェア登録
-    LOGGER.info("[INIT] 共通ミドルウェア登録開始")
-    include_all_middlewares(app)
-    # HMAC シグネチャ＆不要ヘッダー管理
-    app.add_middleware(HeaderMiddleware)
-    LOGGER.info("[INIT] ミドルウェア登録完了")
-
-    # ページネーション
-    LOGGER.info("[INIT] ページネーション設定開始")
-    add_pagination(app)
-    LOGGER.info("[INIT] ページネーション設定完了")
-
-    # ルーター自動登録 (routers パッケージ)
-    LOGGER.info("[INIT] ルーター登録開始")
-    ws_routes = include_all_routers(app, root_pkg="routers")
-    LOGGER.info("[INIT] ルーター登録完了")
-
-    # API バージョニング
-    LOGGER.info("[INIT] バージョニング設定開始")
-    versioned_app = VersionedFastAPI(
-        app,
-        version_format="{major}_{minor}",
-        prefix_format="/v{major}_{minor}",
-        middleware=app.user_middleware,
-        lifespan=app.router.lifespan_context,
-        enable_latest=True,
-    )
-    LOGGER.info("[INIT] バージョニング設定完了")
-
-    # 静的ファイル配信
-    LOGGER.info("[INIT] 静的ファイル配信設定開始")
-    versioned_app.mount("/static", StaticFiles(directory="./static"), name="static")
-    LOGGER.info("[INIT] 静的ファイル配信設定完了")
-
-    # 7) バージョニング後に WebSocketRoute を追加
-    for ws in ws_routes:
-        versioned_app.router.routes.append(ws)
-        LOGGER.info(f"WebSocket ルーター登録（バージョニング後）: {ws.path}")
+    profiler = STARTUP_PROFILER
+    with profiler.phase("create_app"):
+        with profiler.phase("fastapi_instance"):
+            app = FastAPI(
+                title=settings.title,
+                version=settings.version,
+                description=settings.description,
+                docs_url=settings.docs_url,
+                redoc_url=settings.redoc_url,
+                openapi_url=settings.openapi_url,
+                lifespan=lifespan,
+                redirect_slashes=settings.redirect_slashes,
+            )
+        LOGGER.info("[INIT] FastAPI インスタンス生成完了")
+
+        # CORS ミドルウェア設定
+        LOGGER.info("[INIT] CORS 設定開始")
+        with profiler.phase("cors"):
+            CORSConfig(app)
+        LOGGER.info("[INIT] CORS 設定完了")
+
+        # ルートマニフェスト読み込み (最新でなければ routers / middlewares を走査して再生成)
+        with profiler.phase("route_manifest"):
+            manifest = load_route_manifest()
+
+        # 共通ミドルウェア登録 (マニフェストに記録された順序で登録)
+        LOGGER.info("[INIT] 共通ミドルウェア登録開始")
+        with profiler.phase("middlewares"):
+            include_all_middlewares(app, class_paths=manifest["middlewares"])
+            # HMAC シグネチャ＆不要ヘッダー管理
+            app.add_middleware(HeaderMiddleware)
+            # 書き込みを行ったクライアントの読み取りを一定時間プライマリへ固定 (レプリカ設定時のみ)
+            if replica_engines:
+                app.add_middleware(ReadAfterWriteMiddleware, tracker=write_tracker)
+        LOGGER.info("[INIT] ミドルウェア登録完了")
+
+        # ページネーション
+        LOGGER.info("[INIT] ページネーション設定開始")
+        with profiler.phase("pagination"):
+            add_pagination(app)
+        LOGGER.info("[INIT] ページネーション設定完了")
+
+        # ルーター自動登録 (routers パッケージ)
+        LOGGER.info("[INIT] ルーター登録開始")
+        with profiler.phase("routers"):
+            ws_routes = include_all_routers(app, root_pkg="routers", module_names=manifest["routers"])
+        LOGGER.info("[INIT] ルーター登録完了")
+
+        # API バージョニング
+        LOGGER.info("[INIT] バージョニング設定開始")
+        # (全バージョンで 1 つのミドルウェアスタックを共有し、プレフィックスは dict で解決)
+        with profiler.phase("versioning"):
+            versioned_app = build_versioned_app(
+                app,
+                version_format="{major}_{minor}",
+                prefix_format="/v{major}_{minor}",
+                middleware=app.user_middleware,
+                lifespan=app.router.lifespan_context,
+                enable_latest=True,
+            )
+        LOGGER.info("[INIT] バージョニング設定完了")
+
+        # OpenAPI ドキュメントのキャッシュ (共通スタックの CORS のすぐ内側で生成済みバイト列を返す)
+        # (キャッシュした応答にも CORS ヘッダーを付けるため、CORS より外側には置かない)
+        if settings.openapi_cache_enabled:
+            with profiler.phase("openapi_cache"):
+                openapi_documents = {
+                    f"{prefix}{sub_app.openapi_url}": prefixed_openapi(sub_app, prefix)
+                    for prefix, sub_app in versioned_app.state.version_apps.items()
+                }
+                openapi_documents[versioned_app.openapi_url] = prefixed_openapi(versioned_app, "")
+                stack = versioned_app.user_middleware
+                cors_index = next((i for i, entry in enumerate(stack) if entry.cls is CORSMiddleware), len(stack) - 1)
+                stack.insert(
+                    cors_index + 1,
+                    Middleware(
+                        OpenAPICacheMiddleware,
+                        documents=openapi_documents,
+                        min_compress_bytes=settings.openapi_cache_min_compress_bytes,
+                    ),
+                )
+            LOGGER.info("[INIT] OpenAPI キャッシュ設定完了")
+
+        # liveness / readiness プローブ (最も外側でメモリ上の状態から即応答)
+        # その内側で処理中リクエスト数を記録し、ドレイン中の新規リクエストを拒否する
+        with profiler.phase("probes"):
+            versioned_app.add_middleware(DrainMiddleware)
+            versioned_app.add_middleware(
+                ProbeMiddleware,
+                liveness_path=settings.probe_liveness_path,
+                readiness_path=settings.probe_readiness_path,
+            )
+        LOGGER.info("[INIT] プローブ設定完了")
+
+        # 静的ファイル配信
+        LOGGER.info("[INIT] 静的ファイル配信設定開始")
+        with profiler.phase("static"):
+            versioned_app.mount("/static", StaticFiles(directory="./static"), name="static")
+        LOGGER.info("[INIT] 静的ファイル配信設定完了")
+
+        # 7) バージョニング後に WebSocketRoute を追加
+        with profiler.phase("websockets"):
+            for ws in ws_routes:
+                versioned_app.router.routes.append(ws)
+                LOGGER.info(f"WebSocket ルーター登録（バージョニング後）: {ws.path}")
+            # 配信時に生成済みフレームを直接書き込めるよう、サーバーの send を scope に記録する
+            versioned_app.add_middleware(WebSocketTransportMiddleware)
+
+    if settings.startup_profile_output:
+        profiler.write_report(Path(settings.startup_profile_output))
     return versioned_app
 
 
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+DrainMiddleware モジュール
+
+処理中の HTTP リクエスト数を utils.shutdown.DRAIN に記録し、ドレイン開始後は
+新規リクエストを受け付けない純粋な ASGI ミドルウェアです。
+
+・HTTP: ドレイン中は 503 (Retry-After, Connection: close) を返す
+・WebSocket: ドレイン中のハンドシェイクは 1012 (Service Restart) で拒否する
+・処理中リクエスト数はグレースフルシャットダウンの待機判定に使う
+
+BaseHTTPMiddleware のサブクラスではないため自動登録の対象にはならず、
+main.create_app で ProbeMiddleware のすぐ内側に登録します。
+"""
+
+import logging
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.shutdown import DRAIN, DrainState
+
+# Uvicorn 用ロガーを取得
+LOGGER = logging.getLogger("uvicorn.middleware.drain")
+
+_DRAINING_BODY = b'{"detail":"Server is shutting down"}'
+_DRAINING_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(_DRAINING_BODY)).encode("latin-1")),
+    (b"retry-after", b"1"),
+    (b"connection", b"close"),
+]
+
+
+class DrainMiddleware:
+    """
+    DrainMiddleware クラス
+
+    Args:
+        app (ASGIApp): 内側の ASGI アプリケーション
+        state (DrainState, optional): 参照するドレイン状態
+    """
+
+    def __init__(self, app: ASGIApp, state: DrainState = DRAIN):
+        self.app = app
+        self.state = state
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        scope_type = scope["type"]
+        if scope_type == "websocket" and self.state.draining:
+            await send({"type": "websocket.close", "code": 1012, "reason": "server restarting"})
+            return
+        if scope_type != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.state.draining:
+            await send({"type": "http.response.start", "status": 503, "headers": _DRAINING_HEADERS})
+            await send({"type": "http.response.body", "body": _DRAINING_BODY})
+            return
+
+        self.state.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.state.in_flight -= 1
@@ -22,6 +22,7 @@ Usage:
     get_environment_info_static から取得する環境変数は、
     commons.environment_master_key に定義されたキーコードを使用します。
 """
+
 import inspect
 import ipaddress
 import logging
@@ -31,18 +32,23 @@ import time
 from collections.abc import AsyncIterable, Iterable
 from typing import Awaitable, Callable, List
 
-import netifaces
-import requests
 from fastapi import FastAPI, HTTPException, Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from commons.environment_master_key import EnvironmentMasterKey
+from commons.settings import settings
+from utils.executor import run_cpu
+from utils.lazy_import import lazy_import
 from utils.protocol import get_environment_info_static, handle_exception
 from utils.util import create_signature, encode_to_base64
 
 # Uvicorn 用ロガーを取得
 LOGGER = logging.getLogger("uvicorn.middleware.header")
 
+# 信頼プロキシリスト生成 (_build_trusted_proxies) でのみ使う外部パッケージは遅延インポート
+netifaces = lazy_import("netifaces")
+requests = lazy_import("requests")
+
 
 class HeaderMiddleware(BaseHTTPMiddleware):
     """
@@ -126,8 +132,11 @@ class HeaderMiddleware(BaseHTTPMiddleware):
         body_bytes = b"".join(chunks)
         body_text = body_bytes.decode("utf-8", errors="ignore")
 
-        # (7) HMAC シグネチャ生成
-        signature = create_signature(secret, project_id, version, timestamp, body_text)
+        # (7) HMAC シグネチャ生成 (大きなボディは CPU 用スレッドプールで計算)
+        if len(body_bytes) >= settings.executor_cpu_offload_bytes:
+            signature = await run_cpu(create_signature, secret, project_id, version, timestamp, body_text)
+        else:
+            signature = create_signature(secret, project_id, version, timestamp, body_text)
 
         # (8) カスタムヘッダー追加
         response.headers.update(
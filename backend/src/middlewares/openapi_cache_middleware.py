@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OpenAPICacheMiddleware モジュール
+
+各バージョンの OpenAPI ドキュメント (/v{major}_{minor}/openapi.json, /latest/openapi.json, /openapi.json) を
+初回アクセス時に 1 度だけ生成・シリアライズし、以降はバイト列をそのまま返す純粋な ASGI ミドルウェアです。
+
+・gzip (および brotli がインストールされていれば brotli) で事前圧縮した表現を保持
+・表現ごとに SHA-256 ベースの強い ETag を付与し、If-None-Match に一致すれば 304 Not Modified を返す
+・servers はリクエストの root_path (プロキシのパス) から作るため、キャッシュは (パス, root_path) ごとに保持
+・ボディのバッファリングや HMAC 署名を行う内側のミドルウェアスタックを通さない
+  (ドキュメントは不変のため、整合性確認は ETag で行う)
+
+BaseHTTPMiddleware のサブクラスではないため middlewares_manager の自動登録対象にはならず、
+main.create_app でバージョニング後に共通ミドルウェアスタックの CORSMiddleware のすぐ内側に登録します
+(キャッシュした応答にも CORS ヘッダーが付きます)。
+
+Usage:
+    app.add_middleware(OpenAPICacheMiddleware, documents={"/v0_1/openapi.json": prefixed_openapi(sub_app, "/v0_1")})
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette._utils import get_route_path
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli は任意依存
+    brotli = None
+
+# Uvicorn 用ロガーを取得
+LOGGER = logging.getLogger("uvicorn.middleware.openapi_cache")
+
+
+class _CachedDocument:
+    """
+    シリアライズ・圧縮済みの OpenAPI ドキュメント。
+
+    Attributes:
+        representations (Dict[str, Tuple[bytes, str]]): Content-Encoding → (ボディ, ETag)
+            ("identity" は非圧縮)
+    """
+
+    def __init__(self, schema: Dict[str, Any], min_compress_bytes: int):
+        body = json.dumps(schema, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.representations: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{digest}"')}
+        if len(body) < min_compress_bytes:
+            return
+        # mtime=0 で出力を決定的にする (ETag はボディではなく元 JSON のハッシュから作る)
+        self.representations["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+        if brotli is not None:
+            self.representations["br"] = (brotli.compress(body), f'"{digest}-br"')
+
+    def select(self, accept_encoding: str) -> str:
+        """
+        Accept-Encoding に応じて返す表現 (Content-Encoding) を選びます。
+        """
+        accepted = _parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.representations and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return "identity"
+
+
+def _parse_accept_encoding(value: str) -> Dict[str, float]:
+    """
+    Accept-Encoding ヘッダーをエンコーディング名 → q 値の dict に変換します。
+    """
+    accepted: Dict[str, float] = {}
+    for item in value.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match と ETag を弱い比較で照合します (RFC 9110 13.1.2)。
+    """
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class OpenAPICacheMiddleware:
+    """
+    OpenAPICacheMiddleware クラス
+
+    Args:
+        app (ASGIApp): 内側の ASGI アプリケーション
+        documents (Dict[str, Callable[[str], Dict[str, Any]]]): パス → OpenAPI スキーマ生成関数 (引数は root_path)
+        min_compress_bytes (int, optional): このサイズ未満のドキュメントは圧縮しない
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        documents: Dict[str, Callable[[str], Dict[str, Any]]],
+        min_compress_bytes: int = 1024,
+    ):
+        self.app = app
+        self.documents = documents
+        self.min_compress_bytes = min_compress_bytes
+        self._cache: Dict[Tuple[str, str], _CachedDocument] = {}
+        LOGGER.info(f"OpenAPICacheMiddleware initialized: paths={list(documents)}, brotli={brotli is not None}")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        path = get_route_path(scope)
+        if path not in self.documents:
+            await self.app(scope, receive, send)
+            return
+
+        document = self._get_document(path, scope.get("root_path", ""))
+        request_headers = Headers(scope=scope)
+        encoding = document.select(request_headers.get("accept-encoding", ""))
+        body, etag = document.representations[encoding]
+
+        headers: List[Tuple[bytes, bytes]] = [
+            (b"etag", etag.encode("latin-1")),
+            (b"cache-control", b"no-cache"),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if_none_match: Optional[str] = request_headers.get("if-none-match")
+        if if_none_match is not None and _etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers += [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ]
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    def _get_document(self, path: str, root_path: str) -> _CachedDocument:
+        """
+        キャッシュ済みドキュメントを返します。未生成であればここで 1 度だけ生成します。
+        (イベントループ上で同期的に生成するため、同時アクセスでも二重生成されません)
+        root_path はサーバー設定 (--root-path) やプロキシで決まるため、キーの種類は限られます。
+        """
+        key = (path, root_path)
+        document = self._cache.get(key)
+        if document is None:
+            document = _CachedDocument(self.documents[path](root_path), self.min_compress_bytes)
+            self._cache[key] = document
+            sizes = {encoding: len(body) for encoding, (body, _) in document.representations.items()}
+            LOGGER.info(f"[OpenAPICache] {path} (root_path={root_path!r}) を生成しました: {sizes}")
+        return document
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ProbeMiddleware モジュール
+
+コンテナの liveness / readiness プローブ (既定: /livez, /readyz) に、
+CORS・HeaderMiddleware の署名・リクエストロガー・バージョンルーティングを通さず
+メモリ上の状態 (utils.readiness.READINESS) だけで応答する純粋な ASGI ミドルウェアです。
+
+・/livez  : プロセスがリクエストを処理できれば常に 200
+・/readyz : 起動タスクが完了していれば 200、起動中・ドレイン中は 503
+・レスポンスボディとヘッダーは事前に生成したものを返す
+・プローブはリクエストロガーを通らない (uvicorn のアクセスログは ProbeAccessLogFilter で除外)
+
+既存のバージョン付き /healthcheck はクライアント向けにそのまま残します。
+BaseHTTPMiddleware のサブクラスではないため自動登録の対象にはならず、
+main.create_app で最も外側のミドルウェアとして登録します。
+
+Usage:
+    app.add_middleware(ProbeMiddleware, liveness_path="/livez", readiness_path="/readyz")
+"""
+
+import logging
+from typing import List, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.readiness import READINESS, ReadinessState
+
+# Uvicorn 用ロガーを取得
+LOGGER = logging.getLogger("uvicorn.middleware.probe")
+
+
+def _response(body: bytes) -> Tuple[List[Tuple[bytes, bytes]], bytes]:
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+        (b"cache-control", b"no-store"),
+    ]
+    return headers, body
+
+
+# 事前生成したレスポンス (ヘッダー, ボディ)
+_ALIVE = _response(b'{"status":"alive"}')
+_READY = _response(b'{"status":"ready"}')
+_NOT_READY = _response(b'{"status":"not_ready"}')
+
+
+class ProbeMiddleware:
+    """
+    ProbeMiddleware クラス
+
+    Args:
+        app (ASGIApp): 内側の ASGI アプリケーション
+        liveness_path (str, optional): liveness プローブのパス
+        readiness_path (str, optional): readiness プローブのパス
+        state (ReadinessState, optional): 参照するレディネス状態
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        liveness_path: str = "/livez",
+        readiness_path: str = "/readyz",
+        state: ReadinessState = READINESS,
+    ):
+        self.app = app
+        self.liveness_path = liveness_path
+        self.readiness_path = readiness_path
+        self.state = state
+        LOGGER.info(f"ProbeMiddleware initialized: liveness={liveness_path}, readiness={readiness_path}")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path == self.liveness_path:
+            status, (headers, body) = 200, _ALIVE
+        elif path == self.readiness_path:
+            if self.state.is_ready:
+                status, (headers, body) = 200, _READY
+            else:
+                status, (headers, body) = 503, _NOT_READY
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
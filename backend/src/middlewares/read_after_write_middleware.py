@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ReadAfterWriteMiddleware モジュール
+
+読み取りレプリカ使用時に、書き込みを行ったクライアントの後続の読み取りを一定時間プライマリへ固定する
+純粋な ASGI ミドルウェアです。
+
+・リクエストごとに read-after-write のスコープ (database.routing.ReadAfterWriteTracker.scope) を開始する
+・書き込みがあったリクエストの応答に、固定の期限 (UNIX 時間) を cookie で付ける
+・cookie の期限内のリクエストは、書き込みがなくても読み取りをプライマリで行う
+  (他のクライアントの読み取りはレプリカのまま、ワーカーをまたいでも有効)
+
+BaseHTTPMiddleware のサブクラスではないため自動登録の対象にはならず、
+main.create_app でレプリカが設定されている場合のみ登録します。
+"""
+
+import logging
+import math
+import time
+
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from commons.settings import settings
+from database.routing import ReadAfterWriteTracker
+
+# Uvicorn 用ロガーを取得
+LOGGER = logging.getLogger("uvicorn.middleware.read_after_write")
+
+
+class ReadAfterWriteMiddleware:
+    """
+    ReadAfterWriteMiddleware クラス
+
+    Args:
+        app (ASGIApp): 内側の ASGI アプリケーション
+        tracker (ReadAfterWriteTracker): セッションが書き込みを記録するトラッカー
+        cookie_name (str, optional): 固定の期限を持ち回る cookie 名
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        tracker: ReadAfterWriteTracker,
+        cookie_name: str = settings.database_read_after_write_cookie,
+    ):
+        self.app = app
+        self.tracker = tracker
+        self.cookie_name = cookie_name
+
+    def _sticky_until(self, scope: Scope) -> float:
+        for name, value in scope["headers"]:
+            if name != b"cookie":
+                continue
+            try:
+                return float(cookie_parser(value.decode("latin-1")).get(self.cookie_name, 0.0))
+            except ValueError:
+                return 0.0
+        return 0.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with self.tracker.scope(self._sticky_until(scope)) as state:
+
+            async def send_with_cookie(message: Message) -> None:
+                if message["type"] == "http.response.start" and state.wrote:
+                    max_age = math.ceil(state.sticky_until - time.time())
+                    cookie = f"{self.cookie_name}={state.sticky_until:.3f}; Max-Age={max_age}; Path=/; HttpOnly"
+                    message["headers"] = [*message.get("headers", ()), (b"set-cookie", cookie.encode("latin-1"))]
+                await send(message)
+
+            await self.app(scope, receive, send_with_cookie)
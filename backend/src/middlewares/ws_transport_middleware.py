@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+WebSocketTransportMiddleware モジュール
+
+WebSocket 接続について、サーバーから渡された (どのミドルウェアにも包まれていない) ASGI の send を
+scope に記録する純粋な ASGI ミドルウェアです。
+utils.ws_frames.RawFrameWriter はここからサーバー実装の接続を特定し、
+生成済みの WebSocket フレームを直接書き込みます。
+
+・HTTP リクエストには何もしない
+・Starlette の例外処理などが send を包んでも、元の send を参照できる
+
+BaseHTTPMiddleware のサブクラスではないため自動登録の対象にはならず、
+main.create_app でプローブより外側に登録します。
+"""
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.ws_frames import RAW_SEND_SCOPE_KEY
+
+
+class WebSocketTransportMiddleware:
+    """
+    WebSocketTransportMiddleware クラス
+
+    Args:
+        app (ASGIApp): 内側の ASGI アプリケーション
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "websocket":
+            scope[RAW_SEND_SCOPE_KEY] = send
+        await self.app(scope, receive, send)
@@ -2,13 +2,17 @@
 # APIRouterを生成する共通ユーティリティを使用し、環境情報リロードとヘルスチェックを提供するエンドポイント定義
 import logging
 
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 
 from commons.environment_master_key import EnvironmentMasterKey
-from database.session import get_session
+from commons.settings import settings
+from database.session import get_session, release_after
 from repositories.environment_repository import EnvironmentRepository
 from services.environment_service import EnvironmentService
-from utils.protocol import Depends, Session, create_router, get_environment_info_static, version
+from utils.executor import run_db
+from utils.protocol import Depends, HTTPException, Session, create_router, get_environment_info_static, version
+from utils.readiness import READINESS
+from utils.runtime_stats import collect_runtime_stats
 
 # Uvicornロガーを使用
 LOGGER = logging.getLogger("uvicorn.routers.http")
@@ -29,10 +33,11 @@ async def memory_reload(db: Session = Depends(get_session)):
     Returns:
         dict: 実行結果メッセージ
     """
-    # リポジトリとサービスを生成し、キャッシュを更新
+    # リポジトリとサービスを生成し、キャッシュを更新 (同期クエリは DB 用スレッドプールで実行)
     repo = EnvironmentRepository(db=db)
     service = EnvironmentService(repository=repo)
-    service.refresh_cache()
+    # キャッシュ更新が終わった時点でコネクションを返却する (レスポンス送信完了まで保持しない)
+    await run_db(release_after, db, service.refresh_cache)
 
     LOGGER.info("[Router] Environment cache reloaded")
     return {"message": "Environment cache reloaded successfully"}
@@ -51,3 +56,32 @@ async def healthcheck():
     version_value = get_environment_info_static(EnvironmentMasterKey.VERSION)
     LOGGER.info(f"[Router] Healthcheck version: {version_value}")
     return {"version": version_value}
+
+
+@router.get("/readiness")
+@version(0, 1)
+async def readiness():
+    """
+    起動タスク (環境情報キャッシュ、コネクションプール、SDK 初期化など) の完了状態を返します。
+    すべての必須タスクが完了するまでは 503 を返します。
+
+    Returns:
+        JSONResponse: キー 'ready' とタスクごとの状態 'tasks' を含む
+    """
+    snapshot = READINESS.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+
+@router.get("/stats")
+@version(0, 1)
+async def runtime_stats():
+    """
+    このプロセスの実行メトリクス (エグゼキュータごとのキュー待ち・実行時間、トークンキャッシュのヒット率など) を返します。
+    内部情報のため STATS_ENDPOINT_ENABLED=true の場合のみ応答し、それ以外は 404 を返します。
+
+    Returns:
+        dict: キー 'pid'、'executors'、'token_cache' を含む
+    """
+    if not settings.stats_endpoint_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return collect_runtime_stats()
@@ -1,12 +1,18 @@
 # ローカルモジュール（例: プロジェクト内のモジュール）
 import logging
+from typing import Optional
 
-from utils.firebase_auth import verify_firebase_token
+from fastapi import Body
+
+from schemas.session_ticket import SessionTicketRequest, SessionTicketResponse
+from utils.firebase_auth import verify_firebase_id_token, verify_firebase_token
 from utils.protocol import (
     Depends,
+    HTTPException,
     create_router,
     version,
 )
+from utils.session_ticket import InvalidTicketError, default_scopes, issue_ticket
 
 # ルーター設定（共通関数を利用）
 router = create_router(prefix="/users", tags=["users"])
@@ -33,3 +39,34 @@ async def user(user_data: dict = Depends(verify_firebase_token)):
         "user_id": user_data["uid"],
         "email": user_data.get("email"),
     }
+
+
+@router.post("/session-ticket", response_model=SessionTicketResponse)
+@version(0, 1)
+async def session_ticket(
+    request: Optional[SessionTicketRequest] = Body(None),
+    user_data: dict = Depends(verify_firebase_id_token),
+):
+    """
+    Firebase ID トークンを検証し、短命のセッションチケットを発行します。
+    以降の API 呼び出しや WebSocket 接続では、ID トークンの代わりにチケットを使えます。
+
+    Args:
+        request (Optional[SessionTicketRequest]): 要求するスコープ (省略時は発行可能なすべてのスコープ)
+        user_data (dict): Firebase 認証済みユーザーデータ (セッションチケットは不可)
+
+    Returns:
+        SessionTicketResponse: チケット、有効期限、付与されたスコープ
+    """
+    allowed = default_scopes()
+    scopes = request.scopes if request and request.scopes else allowed
+    denied = sorted(set(scopes) - set(allowed))
+    if denied:
+        raise HTTPException(status_code=403, detail=f"Scopes not allowed: {', '.join(denied)}")
+
+    try:
+        ticket, expires_at = issue_ticket(user_data["uid"], scopes, expires_at=user_data.get("exp"))
+    except InvalidTicketError as e:
+        LOGGER.error(f"Session ticket is not available: {e}")
+        raise HTTPException(status_code=503, detail="Session ticket is not available.")
+    return SessionTicketResponse(ticket=ticket, expires_at=expires_at, scopes=scopes)
@@ -1,76 +1,221 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
 import logging
+import random
+from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket
 
+from commons.settings import settings
+from services.chat_bus import CHAT_BUS
+from services.connection_manager import ClientConnection, ConnectionManager
 from utils.firebase_auth import verify_firebase_token_ws
+from utils.shutdown import DRAIN, on_drain
 
 router = APIRouter()
 LOGGER = logging.getLogger("uvicorn.routers.ws")
 
+# ルーム名・宛先 uid の最大長
+MAX_NAME_LENGTH = 128
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
 
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.active_connections.append(ws)
-        LOGGER.debug(f"New connection accepted: {ws.client}")
+def _reconnect_hint() -> str:
+    """
+    クローズ理由に載せる再接続までの待機時間 (接続ごとにジッター付き)。
+    再起動直後に再接続が集中しないようにします。
+    """
+    delay_ms = random.randint(settings.ws_reconnect_hint_min_ms, settings.ws_reconnect_hint_max_ms)
+    return json.dumps({"reconnect_after_ms": delay_ms}, separators=(",", ":"))
+
+
+async def close_all_for_restart() -> None:
+    """
+    ── 全クライアントへ 1012 (Service Restart) と再接続ヒントを送って切断 ──
+    """
+    await manager.close_all(code=1012, reason=_reconnect_hint)
+
+
+manager = ConnectionManager(
+    max_queue=settings.ws_send_queue_size,
+    overflow_policy=settings.ws_overflow_policy,
+    overflow_close_code=settings.ws_overflow_close_code,
+    max_rooms=settings.ws_max_rooms_per_connection,
+    bus=CHAT_BUS,
+    batch_window=settings.ws_batch_window_ms / 1000,
+    batch_max_messages=settings.ws_batch_max_messages,
+    heartbeat_interval=settings.ws_heartbeat_interval_seconds,
+    idle_timeout=settings.ws_idle_timeout_seconds,
+    timer_tick=settings.ws_timer_tick_seconds,
+    timer_slots=settings.ws_timer_slots,
+    history_size=settings.ws_room_history_size,
+    history_max_bytes=settings.ws_room_history_max_bytes,
+    history_max_rooms=settings.ws_room_history_max_rooms,
+)
+# シャットダウン時 (ドレイン) に全接続へクローズフレームを送る
+on_drain("websockets", close_all_for_restart)
+
+
+def _encode(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def _encode_client_data(connection: ClientConnection, payload: Any) -> Optional[str]:
+    """
+    クライアントから受け取った値を含むペイロードをエンコードします。
+
+    msgpack サブプロトコルの値 (bin / ext、文字列以外のキーなど) は JSON で表せないことがあるため、
+    その場合はエラーを返信して None を返します。
+    """
+    try:
+        return _encode(payload)
+    except (TypeError, ValueError):
+        connection.enqueue(_encode({"type": "error", "detail": "unsupported payload"}))
+        return None
+
 
-    def disconnect(self, ws: WebSocket):
-        if ws in self.active_connections:
-            self.active_connections.remove(ws)
-            LOGGER.debug(f"Connection removed: {ws.client}")
+def _is_valid_name(value: Any) -> bool:
+    return isinstance(value, str) and 0 < len(value) <= MAX_NAME_LENGTH
 
-    async def broadcast(self, msg: str):
-        """
-        ── 全クライアントに msg をそのまま送信 ──
-        """
-        for conn in self.active_connections:
-            try:
-                await conn.send_text(msg)
-                LOGGER.debug(f"Sent to {conn.client}: {msg}")
-            except Exception as e:
-                LOGGER.error(f"Failed to send to {conn.client}: {e}")
 
+def _is_valid_seq(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
 
-manager = ConnectionManager()
+
+def _subscribed(room: str) -> Dict[str, Any]:
+    reply: Dict[str, Any] = {"type": "subscribed", "room": room}
+    history = manager.room_history(room)
+    if history is not None:
+        # 再接続時に last_seq と一緒に送り返してもらう
+        reply.update(epoch=history.epoch, seq=history.last_seq)
+    return reply
+
+
+def _history_message(room: str, last_seq: int, epoch: Optional[str]) -> str:
+    """
+    last_seq より後の履歴を 1 メッセージにまとめます。
+
+    {"type": "history", "room", "epoch", "seq": 最新の連番, "complete": 欠落がないか, "messages": [...]}
+    """
+    epoch, seq, messages, complete = manager.replay(room, last_seq, epoch)
+    head = _encode({"type": "history", "room": room, "epoch": epoch, "seq": seq, "complete": complete})
+    # 記録済みのメッセージは JSON のまま連結する (再エンコードしない)
+    return f'{head[:-1]},"messages":[{",".join(messages)}]}}'
+
+
+async def handle_message(connection: ClientConnection, data: Any) -> None:
+    """
+    クライアントからのメッセージを処理します。
+
+    JSON プロトコル (type で分岐):
+        {"type": "subscribe", "room": "r"}           → {"type": "subscribed", "room": "r", "epoch", "seq"}
+        {"type": "subscribe", "room": "r", "last_seq": n, "epoch": e}
+                                                      → subscribed に続けて n より後の履歴を
+                                                        {"type": "history", ...} 1 つにまとめて返す
+        {"type": "unsubscribe", "room": "r"}         → {"type": "unsubscribed", "room": "r"}
+        {"type": "publish", "room": "r", "data": x}  → 購読者へ {"type": "message", "seq", "room", "from", "data"}
+                                                        (seq はルームごとの連番、履歴に記録)
+        {"type": "direct", "to": "uid", "data": x}   → 宛先ユーザーへ {"type": "direct", "from", "data"}
+        {"type": "pong"}                              → 応答なし (サーバーの {"type": "ping"} への応答)
+        不正なメッセージ                              → {"type": "error", "detail": "..."}
+        JSON で表せない data (msgpack の bin など)     → {"type": "error", "detail": "unsupported payload"}
+
+    JSON オブジェクトでないメッセージは、従来どおり生データのまま既定ルームへ配信します。
+    msgpack サブプロトコルの接続では、デコード済みの値 (マップ) を JSON オブジェクトと同様に扱います。
+    """
+    message = data
+    if isinstance(data, str):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            message = None
+    if not isinstance(message, dict) or "type" not in message:
+        if settings.ws_default_room:
+            text = data if isinstance(data, (str, bytes)) else _encode_client_data(connection, data)
+            if text is not None:
+                manager.publish(settings.ws_default_room, text)
+        return
+
+    def reply(payload: Dict[str, Any]) -> None:
+        connection.enqueue(_encode(payload))
+
+    kind = message["type"]
+    room = message.get("room")
+    if kind in ("subscribe", "unsubscribe", "publish") and not _is_valid_name(room):
+        reply({"type": "error", "detail": "invalid room"})
+    elif kind == "subscribe":
+        if manager.subscribe(connection, room):
+            reply(_subscribed(room))
+            last_seq = message.get("last_seq")
+            if _is_valid_seq(last_seq) and settings.ws_room_history_size > 0:
+                epoch = message.get("epoch")
+                connection.enqueue(_history_message(room, last_seq, epoch if isinstance(epoch, str) else None))
+        else:
+            reply({"type": "error", "detail": "too many rooms", "room": room})
+    elif kind == "unsubscribe":
+        manager.unsubscribe(connection, room)
+        reply({"type": "unsubscribed", "room": room})
+    elif kind == "publish":
+        if room not in connection.rooms:
+            reply({"type": "error", "detail": "not subscribed", "room": room})
+            return
+        text = _encode_client_data(
+            connection, {"type": "message", "room": room, "from": connection.uid, "data": message.get("data")}
+        )
+        if text is not None:
+            manager.publish(room, text, record=True)
+    elif kind == "pong":
+        # 受信時刻は ClientConnection が記録済み (アイドル期限の延長のみ)
+        return
+    elif kind == "direct":
+        target = message.get("to")
+        if not _is_valid_name(target):
+            reply({"type": "error", "detail": "invalid recipient"})
+            return
+        text = _encode_client_data(connection, {"type": "direct", "from": connection.uid, "data": message.get("data")})
+        if text is None:
+            return
+        delivered = manager.send_to_user(target, text)
+        # 他ワーカーへ中継した場合 (None) は宛先の有無が分からないためエラーにしない
+        if delivered == 0:
+            reply({"type": "error", "detail": "recipient is not connected", "to": target})
+    else:
+        reply({"type": "error", "detail": f"unknown type: {kind}"})
 
 
 @router.websocket("/ws/chat/{client_id}")
-async def chat_endpoint(websocket: WebSocket, client_id: int):
+async def chat_endpoint(
+    websocket: WebSocket, client_id: int, last_seq: Optional[int] = None, epoch: Optional[str] = None
+):
     """
-    - トークン検証後 accept
-    - 生のメッセージを全員に broadcast
+    - トークン検証後 accept し、既定ルームを購読
+      (クエリに last_seq (と epoch) があれば、既定ルームの last_seq より後の履歴を最初に送る)
+    - JSON プロトコルで購読・配信・ダイレクトメッセージ (handle_message)
+    - 生のメッセージは既定ルームの全員に配信
     """
-    # 1) トークン検証 (内部で ws.accept()/close() してくれます)
+    # 1) トークン検証 (失敗時は内部で close してくれます)
     user_data = await verify_firebase_token_ws(websocket)
 
-    # 2) 正式にコネクション登録
-    await manager.connect(websocket)
-    LOGGER.info(f"Client #{client_id} (uid={user_data['uid']}) connected")
+    # 2) 正式にコネクション登録 (client_id はログ用、接続 ID はサーバーで割り当て)
+    connection = await manager.connect(websocket, user_data["uid"])
+    if settings.ws_default_room:
+        manager.subscribe(connection, settings.ws_default_room)
+        if last_seq is not None and last_seq >= 0 and settings.ws_room_history_size > 0:
+            connection.enqueue(_history_message(settings.ws_default_room, last_seq, epoch))
+    LOGGER.info(f"Client #{client_id} (uid={user_data['uid']}, id={connection.connection_id}) connected")
+
+    async def on_message(data: str) -> None:
+        LOGGER.debug(f"[{user_data['uid']}] recv: {data!r}")
+        await handle_message(connection, data)
 
     try:
-        while True:
-            # 3) クライアントから生メッセージを受け取る
-            data = await websocket.receive_text()
-            LOGGER.debug(f"[{user_data['uid']}] recv: {data!r}")
-
-            # 4) 受け取った「生データ」をそのまま全員に配信
-            await manager.broadcast(data)
-
-            # （必要ならエコーを追加）
-            # await websocket.send_text(f"You said: {data}")
-
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
-        LOGGER.info(f"Client #{client_id} disconnected")
-        # 切断通知も生データとして流したい場合
-        await manager.broadcast(f"Client #{client_id} left chat")
-
-    except Exception as e:
-        LOGGER.error(f"Unexpected error with Client #{client_id}: {e}")
-        manager.disconnect(websocket)
+        # 3) 受信ループと送信用 writer を切断まで実行
+        await connection.serve(on_message)
+    finally:
+        manager.disconnect(connection)
+    LOGGER.info(f"Client #{client_id} disconnected")
+
+    # 切断通知も生データとして既定ルームへ流す (シャットダウン中は送らない)
+    if settings.ws_default_room and not DRAIN.draining:
+        manager.publish(settings.ws_default_room, f"Client #{client_id} left chat")
@@ -0,0 +1,24 @@
+from typing import List, Optional
+
+from fastapi_camelcase import CamelModel
+from pydantic import Field
+
+
+class SessionTicketRequest(CamelModel):
+    """
+    セッションチケット発行リクエストのスキーマ。
+    """
+
+    scopes: Optional[List[str]] = Field(
+        None, example=["ws"], description="要求するスコープ (省略時は発行可能なすべてのスコープ)"
+    )
+
+
+class SessionTicketResponse(CamelModel):
+    """
+    セッションチケット発行レスポンスのスキーマ。
+    """
+
+    ticket: str = Field(..., example="st1.eyJ1aWQiOi...", description="セッションチケット")
+    expires_at: int = Field(..., example=1735689600, description="有効期限 (UNIX 秒)")
+    scopes: List[str] = Field(..., example=["api", "ws"], description="付与されたスコープ")
@@ -0,0 +1,473 @@
+"""
+ChatBus: ワーカー (プロセス) 間でチャットの配信を中継するバス。
+
+ConnectionManager は自プロセスの接続しか知らないため、複数ワーカーで動かすと別ワーカーに接続した
+クライアントへメッセージが届きません。ルーム・ユーザー・全員宛ての配信をバスに流し、
+各ワーカーはバスから受け取ったメッセージを自プロセスの接続へ配信します。
+
+・LocalBus: 単一プロセス用 (バスを介さずその場で配信、既定)
+・UnixSocketBus: 同一ホストのワーカー間で Unix ドメインソケットのハブ (ChatBusHub) を介して中継
+    - 自ワーカーが送ったメッセージもハブから戻ってきた時点で配信するため、
+      全ワーカーで同じ順序 (ハブが受け取った順序) になり、ルームごとの順序が保たれる
+    - ハブは launcher が専用プロセスとして起動する (uvicorn --workers で動かす場合は
+      `python -m services.chat_bus` で別途起動)
+    - ハブに接続できない間は自ワーカーの接続にだけ配信し、バックグラウンドで再接続する
+・履歴に記録するルーム宛ての配信 (KIND_ROOM_RECORDED) には、順序を決める 1 か所 (ハブ、LocalBus) が
+  ルームごとの連番 (seq) を付けて運ぶ (RoomSequencer)
+    - 全ワーカーで同じメッセージが同じ連番になり、ワーカーが再起動しても連番は続く
+    - 連番の系列を表す epoch はハブ (LocalBus) ごとで、ハブは接続したワーカーへ最初に通知する (KIND_HELLO)
+    - ハブに接続できない間のローカル配信には連番を付けない (履歴にも記録しない)
+・外部ブローカー (Redis Pub/Sub、NATS など) は ChatBus を継承したクラスを実装し、
+  WS_BUS_BACKEND に "module:ClassName" を指定して使う
+    - publish: 配信をブローカーへ送る (待機しない)。自プロセスへの配信もブローカーから戻った時点で行う
+    - run: ブローカーとの接続を維持し、受け取ったメッセージを deliver へ渡す (lifespan のバックグラウンドタスク)
+
+メッセージの形式 (ハブとの間):
+    !I (以降の長さ) B (種別) B (フラグ: 1 = テキスト、2 = 連番付き) H (宛先の長さ) + 宛先 (UTF-8)
+    + [!Q (連番、フラグ 2 の場合のみ)] + データ
+"""
+
+import importlib
+import logging
+import os
+import secrets
+import struct
+import sys
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple, Union
+
+import anyio
+from anyio.abc import ByteStream, ObjectReceiveStream, ObjectSendStream, TaskStatus
+
+from commons.settings import settings
+from utils.ws_frames import PreparedMessage
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.routers.ws")
+
+# 配信の種別
+# ハブから接続したワーカーへの epoch 通知 (宛先 = epoch)
+KIND_HELLO = 0
+KIND_ROOM = 1
+KIND_USER = 2
+KIND_ALL = 3
+# ルーム宛て (ハブ・LocalBus が付けた連番とともに各プロセスで履歴に記録する JSON オブジェクト)
+KIND_ROOM_RECORDED = 4
+
+Message = Union[str, bytes, PreparedMessage]
+# (種別, 宛先, メッセージ, 連番) を受け取り、配信できた接続数を返す
+Deliver = Callable[[int, str, Message, Optional[int]], int]
+
+_HEADER = struct.Struct("!IBBH")
+_LENGTH = struct.Struct("!I")
+_SEQ = struct.Struct("!Q")
+_FLAG_TEXT = 1
+_FLAG_SEQ = 2
+# 1 メッセージの上限 (不正なデータで巨大なバッファを確保しない)
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+# まとめて書き込む際の上限
+_BATCH_BYTES = 64 * 1024
+
+_STREAM_ERRORS = (
+    OSError,
+    anyio.EndOfStream,
+    anyio.IncompleteRead,
+    anyio.BrokenResourceError,
+    anyio.ClosedResourceError,
+)
+
+
+def encode_envelope(kind: int, target: str, data: Message, seq: Optional[int] = None) -> bytes:
+    """
+    配信をハブとの間でやり取りする形式にエンコードします。
+
+    Args:
+        kind (int): 種別 (KIND_ROOM / KIND_ROOM_RECORDED / KIND_USER / KIND_ALL / KIND_HELLO)
+        target (str): 宛先 (ルーム名・uid、全員宛てなら空文字)
+        data (Message): 配信するメッセージ
+        seq (Optional[int]): ルームの連番 (KIND_ROOM_RECORDED でハブが付ける)
+
+    Returns:
+        bytes: 長さ付きのメッセージ
+    """
+    if isinstance(data, PreparedMessage):
+        payload, text = data.payload, data.is_text
+    elif isinstance(data, str):
+        payload, text = data.encode("utf-8"), True
+    else:
+        payload, text = bytes(data), False
+    name = target.encode("utf-8")
+    flags = _FLAG_TEXT if text else 0
+    stamp = b""
+    if seq is not None:
+        flags |= _FLAG_SEQ
+        stamp = _SEQ.pack(seq)
+    length = _HEADER.size - 4 + len(name) + len(stamp) + len(payload)
+    return _HEADER.pack(length, kind, flags, len(name)) + name + stamp + payload
+
+
+def decode_envelope(frame: bytes) -> Tuple[int, str, Union[str, bytes], Optional[int]]:
+    """
+    encode_envelope の逆変換。
+
+    Returns:
+        Tuple[int, str, Union[str, bytes], Optional[int]]: 種別、宛先、メッセージ (テキストなら str)、連番
+    """
+    _, kind, flags, name_length = _HEADER.unpack_from(frame)
+    target_start = _HEADER.size
+    target_end = target_start + name_length
+    target = frame[target_start:target_end].decode("utf-8")
+    seq = None
+    if flags & _FLAG_SEQ:
+        (seq,) = _SEQ.unpack_from(frame, target_end)
+        target_end += _SEQ.size
+    payload = frame[target_end:]
+    return kind, target, payload.decode("utf-8") if flags & _FLAG_TEXT else payload, seq
+
+
+def stamp_envelope(frame: bytes, sequencer: "RoomSequencer") -> bytes:
+    """
+    連番のない KIND_ROOM_RECORDED のメッセージに、ルームの次の連番を付けます (それ以外はそのまま返す)。
+    """
+    _, kind, flags, name_length = _HEADER.unpack_from(frame)
+    if kind != KIND_ROOM_RECORDED or flags & _FLAG_SEQ:
+        return frame
+    start = _HEADER.size
+    end = start + name_length
+    name = frame[start:end]
+    seq = _SEQ.pack(sequencer.next(name.decode("utf-8")))
+    return _HEADER.pack(len(frame) - 4 + _SEQ.size, kind, flags | _FLAG_SEQ, name_length) + name + seq + frame[end:]
+
+
+class RoomSequencer:
+    """
+    ルームごとの連番を割り当てます (ハブ、または単一プロセスの LocalBus の 1 か所で使う)。
+
+    Args:
+        max_rooms (int): 連番を保持するルーム数の上限 (超えたら最も長く使われていないルームから破棄し、
+            そのルームは 1 から振り直す。受け取った側は連番の不連続として扱う)
+
+    Attributes:
+        epoch (str): 連番の系列の識別子 (起動ごとに変わる)
+    """
+
+    def __init__(self, max_rooms: int = 100_000):
+        self.max_rooms = max_rooms
+        self.epoch = secrets.token_urlsafe(6)
+        self._last: "OrderedDict[str, int]" = OrderedDict()
+
+    def next(self, room: str) -> int:
+        seq = self._last.pop(room, 0) + 1
+        self._last[room] = seq
+        if len(self._last) > self.max_rooms:
+            self._last.popitem(last=False)
+        return seq
+
+
+class FrameReader:
+    """
+    ストリームから長さ付きのメッセージを読み取ります。
+
+    1 回の受信 (最大 64 KiB) に含まれる完全なメッセージをまとめて切り出すため、
+    メッセージごとにヘッダーと本体を別々に受信しません。
+
+    Args:
+        stream (ByteStream): ハブとの接続
+    """
+
+    def __init__(self, stream: ByteStream):
+        self.stream = stream
+        self._buffer = bytearray()
+
+    def _split(self) -> List[bytes]:
+        frames = []
+        offset = 0
+        while len(self._buffer) - offset >= 4:
+            (length,) = _LENGTH.unpack_from(self._buffer, offset)
+            if length > MAX_FRAME_BYTES:
+                raise ValueError(f"chat bus frame too large: {length} bytes")
+            end = offset + 4 + length
+            if end > len(self._buffer):
+                break
+            frames.append(bytes(self._buffer[offset:end]))
+            offset = end
+        del self._buffer[:offset]
+        return frames
+
+    async def receive(self) -> List[bytes]:
+        """
+        1 つ以上のメッセージ (長さのヘッダーを含むバイト列) を返します。
+
+        Raises:
+            ValueError: 長さが上限を超える場合
+            EndOfStream: 接続が閉じられた場合
+        """
+        while True:
+            frames = self._split()
+            if frames:
+                return frames
+            self._buffer.extend(await self.stream.receive(_BATCH_BYTES))
+
+
+async def _write_batched(receive: ObjectReceiveStream[bytes], stream: ByteStream) -> None:
+    # 溜まっているメッセージはまとめて 1 回で書き込む (システムコールを減らす)
+    async for frame in receive:
+        batch = [frame]
+        size = len(frame)
+        while size < _BATCH_BYTES:
+            try:
+                frame = receive.receive_nowait()
+            except anyio.WouldBlock:
+                break
+            batch.append(frame)
+            size += len(frame)
+        await stream.send(b"".join(batch))
+
+
+async def _pump(scope: anyio.CancelScope, func: Callable[..., Awaitable[None]], *args: Any) -> None:
+    # 送信・受信どちらかが終了 (切断・不正なデータ) したら、もう一方も止めて接続を閉じる
+    try:
+        await func(*args)
+    except _STREAM_ERRORS + (ValueError,) as e:
+        LOGGER.debug(f"Chat bus stream closed: {e!r}")
+    finally:
+        scope.cancel()
+
+
+class ChatBus:
+    """
+    ワーカー間の配信バスのインターフェース。
+
+    ConnectionManager が bind で自プロセスへの配信関数 (deliver) を登録し、
+    配信は publish を通して行います。
+    記録付きの配信 (KIND_ROOM_RECORDED) は、1 か所で割り当てた連番を付けて deliver へ渡し、
+    その系列の識別子を epoch に設定します (連番のない配信は履歴に記録されません)。
+    """
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+        # 受け取る連番の系列 (連番を付けないバスでは空文字)
+        self.epoch = ""
+
+    def bind(self, deliver: Deliver) -> None:
+        """
+        バスから受け取った配信を自プロセスの接続へ配信する関数を登録します。
+
+        Args:
+            deliver (Deliver): (種別, 宛先, メッセージ, 連番) を受け取り、配信できた接続数を返す関数
+        """
+        self._deliver = deliver
+
+    def deliver(self, kind: int, target: str, data: Message, seq: Optional[int] = None) -> int:
+        """
+        自プロセスの接続へ配信します。
+        """
+        if self._deliver is None:
+            return 0
+        return self._deliver(kind, target, data, seq)
+
+    def publish(self, kind: int, target: str, data: Message) -> Optional[int]:
+        """
+        配信をバスへ送ります (待機しません)。
+
+        Returns:
+            Optional[int]: 配信できた接続数 (他ワーカーへ中継した場合は不明のため None)
+        """
+        raise NotImplementedError
+
+    async def run(self) -> None:
+        """
+        バスとの接続を維持するバックグラウンドタスク (lifespan の終了時にキャンセル)。
+        """
+
+
+class LocalBus(ChatBus):
+    """
+    単一プロセス用のバス (その場で自プロセスの接続へ配信、記録付きの配信には自身で連番を付ける)。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sequencer = RoomSequencer()
+        self.epoch = self.sequencer.epoch
+
+    def publish(self, kind: int, target: str, data: Message) -> Optional[int]:
+        seq = self.sequencer.next(target) if kind == KIND_ROOM_RECORDED else None
+        return self.deliver(kind, target, data, seq)
+
+
+class UnixSocketBus(ChatBus):
+    """
+    Unix ドメインソケットのハブ (ChatBusHub) を介してワーカー間で中継するバス。
+
+    Args:
+        path (str): ハブのソケットパス
+        queue_size (int): ハブへの未送信メッセージの上限 (超えた分は破棄)
+        reconnect_min (float): 再接続の初回待機秒数 (失敗ごとに倍、reconnect_max まで)
+        reconnect_max (float): 再接続の最大待機秒数
+    """
+
+    def __init__(self, path: str, queue_size: int = 10000, reconnect_min: float = 0.1, reconnect_max: float = 5.0):
+        super().__init__()
+        self.path = path
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.connected = False
+        self.dropped = 0
+        self._send, self._receive = anyio.create_memory_object_stream[bytes](queue_size)
+
+    def publish(self, kind: int, target: str, data: Message) -> Optional[int]:
+        if not self.connected:
+            # ハブに接続できない間は自ワーカーの接続にだけ配信する
+            return self.deliver(kind, target, data)
+        try:
+            self._send.send_nowait(encode_envelope(kind, target, data))
+        except anyio.WouldBlock:
+            self.dropped += 1
+            LOGGER.warning(f"Chat bus queue is full, dropped a message for {target!r}")
+            return 0
+        return None
+
+    async def _read_loop(self, stream: ByteStream) -> None:
+        reader = FrameReader(stream)
+        while True:
+            for frame in await reader.receive():
+                kind, target, data, seq = decode_envelope(frame)
+                if kind == KIND_HELLO:
+                    self.epoch = target
+                    continue
+                self.deliver(kind, target, data, seq)
+
+    async def run(self) -> None:
+        delay = self.reconnect_min
+        while True:
+            try:
+                stream = await anyio.connect_unix(self.path)
+            except OSError as e:
+                LOGGER.warning(f"Chat bus hub is not available at {self.path}: {e}, retrying in {delay:.1f}s")
+                await anyio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max)
+                continue
+            delay = self.reconnect_min
+            LOGGER.info(f"Chat bus connected to {self.path}")
+            try:
+                async with stream, anyio.create_task_group() as tg:
+                    self.connected = True
+                    tg.start_soon(_pump, tg.cancel_scope, _write_batched, self._receive, stream)
+                    tg.start_soon(_pump, tg.cancel_scope, self._read_loop, stream)
+            finally:
+                self.connected = False
+            LOGGER.warning(f"Chat bus disconnected from {self.path}, reconnecting")
+
+
+class _Peer:
+    def __init__(self, send: ObjectSendStream[bytes]):
+        self.send = send
+        self.scope: Optional[anyio.CancelScope] = None
+
+
+class ChatBusHub:
+    """
+    UnixSocketBus のハブ。各ワーカーから受け取ったメッセージを、受け取った順に全ワーカー (送信元を含む) へ送ります。
+    記録付きのルーム宛てメッセージには、送る前にルームの連番を付けます。
+
+    Args:
+        path (str): 待ち受けるソケットパス (既存のソケットは置き換える)
+        peer_queue_size (int): ワーカーごとの未送信メッセージの上限 (超えたワーカーは切断し、再接続させる)
+    """
+
+    def __init__(self, path: str, peer_queue_size: int = 10000):
+        self.path = path
+        self.peer_queue_size = peer_queue_size
+        self.peers: Set[_Peer] = set()
+        self.forwarded = 0
+        self.sequencer = RoomSequencer()
+
+    def _forward(self, frame: bytes) -> None:
+        self.forwarded += 1
+        frame = stamp_envelope(frame, self.sequencer)
+        for peer in list(self.peers):
+            try:
+                peer.send.send_nowait(frame)
+            except anyio.WouldBlock:
+                LOGGER.warning("Chat bus peer is too slow, disconnecting")
+                self.peers.discard(peer)
+                peer.scope.cancel()
+
+    async def _read_loop(self, stream: ByteStream) -> None:
+        reader = FrameReader(stream)
+        while True:
+            for frame in await reader.receive():
+                self._forward(frame)
+
+    async def _handle(self, stream: ByteStream) -> None:
+        send, receive = anyio.create_memory_object_stream[bytes](self.peer_queue_size)
+        peer = _Peer(send)
+        try:
+            async with stream, send, receive, anyio.create_task_group() as tg:
+                peer.scope = tg.cancel_scope
+                # 連番の系列を最初に通知する (以降の配信より先に届く)
+                send.send_nowait(encode_envelope(KIND_HELLO, self.sequencer.epoch, b""))
+                self.peers.add(peer)
+                tg.start_soon(_pump, tg.cancel_scope, _write_batched, receive, stream)
+                tg.start_soon(_pump, tg.cancel_scope, self._read_loop, stream)
+        finally:
+            self.peers.discard(peer)
+
+    async def serve(self, *, task_status: TaskStatus[None] = anyio.TASK_STATUS_IGNORED) -> None:
+        """
+        ハブを起動し、キャンセルされるまで待ち受けます (task_group.start で起動完了を待てます)。
+        """
+        listener = await anyio.create_unix_listener(self.path)
+        LOGGER.info(f"Chat bus hub listening on {self.path}")
+        task_status.started()
+        try:
+            async with listener:
+                await listener.serve(self._handle)
+        finally:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def run_hub(path: Optional[str] = None) -> None:
+    """
+    ハブを起動し、プロセスが終了するまで待ち受けます (launcher のハブプロセス用)。
+    """
+    anyio.run(ChatBusHub(path or settings.ws_bus_socket_path, settings.ws_bus_queue_size).serve)
+
+
+def create_bus(backend: str) -> ChatBus:
+    """
+    設定名からバスを生成します。
+
+    Args:
+        backend (str): "local"、"unix"、または外部ブローカー用のクラス ("module:ClassName")
+
+    Returns:
+        ChatBus: バス
+
+    Raises:
+        ValueError: 不明なバックエンドの場合
+    """
+    if backend == "local":
+        return LocalBus()
+    if backend == "unix":
+        return UnixSocketBus(settings.ws_bus_socket_path, settings.ws_bus_queue_size)
+    module_name, _, class_name = backend.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown chat bus backend: {backend}")
+    bus = getattr(importlib.import_module(module_name), class_name)()
+    if not isinstance(bus, ChatBus):
+        raise ValueError(f"{backend} is not a ChatBus")
+    return bus
+
+
+# グローバルに使えるバス (WS_BUS_BACKEND)
+CHAT_BUS = create_bus(settings.ws_bus_backend)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_hub(sys.argv[1] if len(sys.argv) > 1 else None)
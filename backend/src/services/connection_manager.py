@@ -0,0 +1,617 @@
+"""
+ConnectionManager: WebSocket 接続の管理と配信を担当。
+
+接続ごとに上限付きの送信キューと writer タスクを持たせ、配信 (broadcast) はキューへの追加だけを行います。
+遅いクライアントがいても他の接続への配信は待たされず、配信コストはネットワーク遅延に依存しない O(n) になります。
+
+・送信はすべて接続ごとの writer タスクが行う (送信とクローズが同じ接続で並行しない)
+・接続 ID／ユーザー uid／ルーム (トピック) ごとの索引を持ち、ルームへの配信は購読者のみ、
+  ユーザー宛ての配信は O(1) で宛先を引く
+・ルーム・ユーザー・全員宛ての配信はバス (services.chat_bus) を通し、複数ワーカーでも全ワーカーの接続へ届ける
+・複数の接続へ送るメッセージは PreparedMessage として 1 回だけエンコードし、
+  可能な接続では生成済みのフレームをそのまま書き込む (utils.ws_frames)
+・msgpack サブプロトコル (utils.ws_codec) をネゴシエートした接続には、待機時間内に溜まったメッセージを
+  まとめて 1 つのバイナリフレームで送る
+・ルームごとの履歴: 記録付きで配信した JSON メッセージに連番 (seq) を付けてリングバッファ (utils.ring_buffer) に保持し、
+  再接続したクライアントへ last_seq 以降だけを返す (メモリは件数・バイト数・ルーム数で上限を設ける)
+    - 連番と epoch はバス (ハブ、単一プロセスでは LocalBus) が 1 か所で割り当て、メッセージとともに届く
+      (全ワーカーで同じ連番になるため、別ワーカーや再起動したワーカーに再接続しても続きから再送できる)
+    - epoch が変わった (ハブの再起動) り連番が飛んだ (途中から受信した) 場合は、それ以前の履歴を破棄する
+・ハートビート: 受信が途絶えた接続へ ping を送り、アイドル期限を過ぎた接続 (ハーフオープンなど) を切断する
+    - 全接続の期限を 1 つのタイマーホイール (utils.timer_wheel) で管理し、接続ごとのタイマーやタスクを持たない
+    - uvicorn の websockets 実装ではプロトコルレベルの ping (pong は自動応答)、
+      それ以外ではアプリレベルの {"type": "ping"} を送る (クライアントは任意のメッセージで応答すればよい)
+・キューが上限に達した場合の方針 (overflow policy)
+    - drop_oldest: 最も古い未送信メッセージを捨てて追加する
+    - disconnect: 未送信メッセージを破棄し、指定のクローズコードで切断する
+"""
+
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import anyio
+from fastapi import WebSocket, WebSocketDisconnect
+
+from services.chat_bus import KIND_ALL, KIND_ROOM, KIND_ROOM_RECORDED, KIND_USER, ChatBus, LocalBus
+from utils.ring_buffer import SequencedRingBuffer, utf8_len
+from utils.timer_wheel import TimerWheel
+from utils.ws_codec import SUBPROTOCOL_MSGPACK, pack_batch, pack_message, select_subprotocol, unpack_message
+from utils.ws_frames import PreparedMessage, RawFrameWriter, build_frame
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.routers.ws")
+
+# キュー溢れ時の方針
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+# アイドル期限切れで切断する際のクローズコード (1001: Going Away)
+IDLE_CLOSE_CODE = 1001
+# アプリレベルのハートビート
+PING_MESSAGE = '{"type":"ping"}'
+
+Message = Union[str, bytes, PreparedMessage]
+# 受信メッセージ (テキスト、または msgpack サブプロトコルでデコードした値) の処理
+MessageHandler = Callable[[Any], Awaitable[None]]
+
+
+class ClientConnection:
+    """
+    1 接続分の送信キューと writer タスク。
+
+    Args:
+        ws (WebSocket): accept 済みの WebSocket
+        connection_id (str): サーバーが割り当てた接続 ID
+        uid (str): 認証済みユーザーの uid
+        max_queue (int): 未送信メッセージの上限
+        overflow_policy (str): 上限到達時の方針 (drop_oldest / disconnect)
+        overflow_close_code (int): disconnect 方針で切断する際のクローズコード
+        close_timeout (float): クローズフレーム送信の最大待機秒数
+        subprotocol (Optional[str]): ネゴシエートしたサブプロトコル (None なら 1 メッセージ 1 テキストフレーム)
+        batch_window (float): msgpack サブプロトコルでメッセージをまとめる待機秒数
+        batch_max_messages (int): 1 フレームにまとめるメッセージ数の上限
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        connection_id: str,
+        uid: str,
+        max_queue: int,
+        overflow_policy: str = DROP_OLDEST,
+        overflow_close_code: int = 1013,
+        close_timeout: float = 1.0,
+        subprotocol: Optional[str] = None,
+        batch_window: float = 0.0,
+        batch_max_messages: int = 100,
+    ):
+        self.ws = ws
+        self.connection_id = connection_id
+        self.uid = uid
+        self.rooms: Set[str] = set()
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.overflow_close_code = overflow_close_code
+        self.close_timeout = close_timeout
+        self.subprotocol = subprotocol
+        self.batch_window = batch_window
+        self.batch_max_messages = batch_max_messages
+        self.sent = 0
+        self.frames = 0
+        self.dropped = 0
+        self.closed = anyio.Event()
+        # 最後に受信 (pong を含む) した時刻 (monotonic)
+        self.last_activity = time.monotonic()
+        self._ping_requested = False
+        self._queue: Deque[Message] = deque()
+        self._wakeup: Optional[anyio.Event] = None
+        self._close: Optional[Tuple[int, str]] = None
+        self._peer_disconnected = False
+        self._cancel_scope: Optional[anyio.CancelScope] = None
+        self._frames = RawFrameWriter.detect(ws)
+
+    @property
+    def client(self) -> Any:
+        return self.ws.client
+
+    @property
+    def pending(self) -> int:
+        """
+        未送信メッセージ数。
+        """
+        return len(self._queue)
+
+    def enqueue(self, message: Message) -> bool:
+        """
+        メッセージを送信キューへ追加します (ネットワーク I/O は行わず、待機もしません)。
+
+        Args:
+            message (Message): 送信するテキスト、バイナリ、またはエンコード済みメッセージ
+
+        Returns:
+            bool: キューに追加できた場合は True (クローズ中・切断時は False)
+        """
+        if self._close is not None:
+            return False
+        if len(self._queue) >= self.max_queue:
+            if self.overflow_policy == DISCONNECT:
+                self.dropped += len(self._queue) + 1
+                self._queue.clear()
+                LOGGER.warning(f"Send queue overflow, disconnecting {self.client}")
+                self.close(self.overflow_close_code, "send queue overflow")
+                return False
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(message)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def touch(self) -> None:
+        """
+        受信があったことを記録します (アイドル期限の延長)。
+        """
+        self.last_activity = time.monotonic()
+
+    def ping(self) -> bool:
+        """
+        ハートビートの ping を送ります (writer タスクが送信し、ここでは待機しません)。
+
+        Returns:
+            bool: 送信を予約できた場合は True (クローズ中は False)
+        """
+        if self._frames is None:
+            return self.enqueue(PING_MESSAGE)
+        if self._close is not None:
+            return False
+        self._ping_requested = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def close(self, code: int, reason: str = "") -> None:
+        """
+        接続のクローズを要求します (実際のクローズフレームは serve() の終了処理で送信)。
+        未送信メッセージは破棄されます。
+        """
+        if self._close is not None:
+            return
+        self._close = (code, reason)
+        if self._cancel_scope is not None:
+            self._cancel_scope.cancel()
+
+    async def _send(self, message: Message) -> None:
+        if isinstance(message, PreparedMessage):
+            if self._frames is not None and await self._frames.ready() and self._frames.accepts(len(message.payload)):
+                await self._frames.write(message.frame)
+            elif message.is_text:
+                await self.ws.send_text(message.data)
+            else:
+                await self.ws.send_bytes(message.data)
+        elif isinstance(message, bytes):
+            await self.ws.send_bytes(message)
+        else:
+            await self.ws.send_text(message)
+        self.sent += 1
+        self.frames += 1
+
+    async def _send_batch(self) -> None:
+        # 待機時間内に届いたメッセージも含め、まとめて 1 フレームで送る
+        if self.batch_window > 0:
+            await anyio.sleep(self.batch_window)
+        packed = []
+        while self._queue and len(packed) < self.batch_max_messages:
+            message = self._queue.popleft()
+            packed.append(message.packed if isinstance(message, PreparedMessage) else pack_message(message))
+        if not packed:
+            return
+        payload = pack_batch(packed)
+        if self._frames is not None and await self._frames.ready() and self._frames.accepts(len(payload)):
+            await self._frames.write(build_frame(payload, text=False))
+        else:
+            await self.ws.send_bytes(payload)
+        self.sent += len(packed)
+        self.frames += 1
+
+    async def _send_ping(self) -> None:
+        self._ping_requested = False
+        await self._frames.ping(self.touch)
+
+    async def _write_loop(self) -> None:
+        while True:
+            if self._ping_requested:
+                await self._send_ping()
+            while self._queue:
+                if self.subprotocol == SUBPROTOCOL_MSGPACK:
+                    await self._send_batch()
+                else:
+                    await self._send(self._queue.popleft())
+            self._wakeup = anyio.Event()
+            if not self._queue and not self._ping_requested:
+                await self._wakeup.wait()
+
+    async def _receive(self) -> Any:
+        if self.subprotocol != SUBPROTOCOL_MSGPACK:
+            return await self.ws.receive_text()
+        message = await self.ws.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        if message.get("bytes") is None:
+            return message.get("text")
+        return unpack_message(message["bytes"])
+
+    async def _read_loop(self, on_message: MessageHandler) -> None:
+        try:
+            while True:
+                try:
+                    data = await self._receive()
+                except (ValueError, TypeError):
+                    # 1007: Invalid frame payload data
+                    self.close(1007, "invalid msgpack payload")
+                    return
+                self.touch()
+                await on_message(data)
+        except WebSocketDisconnect:
+            self._peer_disconnected = True
+
+    async def _run(self, func: Callable[..., Awaitable[None]], *args: Any) -> None:
+        # 受信・送信どちらかが終了 (切断・エラー) したら、もう一方も止める
+        try:
+            await func(*args)
+        except Exception as e:
+            if self._close is None:
+                LOGGER.error(f"Connection error with {self.client}: {e}")
+                self._close = (1011, "internal error")
+        finally:
+            if self._cancel_scope is not None:
+                self._cancel_scope.cancel()
+
+    async def serve(self, on_message: MessageHandler) -> None:
+        """
+        受信ループと writer タスクを実行し、接続が終了するまで待ちます。
+
+        Args:
+            on_message (MessageHandler): 受信したテキストメッセージの処理
+        """
+        try:
+            if self._close is None:
+                async with anyio.create_task_group() as tg:
+                    self._cancel_scope = tg.cancel_scope
+                    tg.start_soon(self._run, self._write_loop)
+                    tg.start_soon(self._run, self._read_loop, on_message)
+        finally:
+            self._queue.clear()
+            if self._close is not None and not self._peer_disconnected:
+                code, reason = self._close
+                with anyio.move_on_after(self.close_timeout, shield=True):
+                    try:
+                        await self.ws.close(code=code, reason=reason)
+                    except Exception as e:
+                        LOGGER.debug(f"Failed to close {self.client}: {e}")
+            self.closed.set()
+
+
+class ConnectionManager:
+    """
+    WebSocket 接続の登録 (接続 ID／uid／ルームの索引) と配信。
+
+    Args:
+        max_queue (int): 接続ごとの未送信メッセージの上限
+        overflow_policy (str): 上限到達時の方針 (drop_oldest / disconnect)
+        overflow_close_code (int): disconnect 方針で切断する際のクローズコード
+        max_rooms (int): 1 接続が購読できるルーム数の上限
+        bus (Optional[ChatBus]): ワーカー間の配信バス (省略時は LocalBus)
+        batch_window (float): msgpack サブプロトコルでメッセージをまとめる待機秒数
+        batch_max_messages (int): 1 フレームにまとめるメッセージ数の上限
+        heartbeat_interval (float): 受信がこの秒数途絶えた接続に ping を送る (0 でハートビート無効)
+        idle_timeout (float): 受信がこの秒数途絶えた接続を切断する
+        timer_tick (float): タイマーホイールの刻み (秒)
+        timer_slots (int): タイマーホイールのスロット数
+        history_size (int): ルームごとに保持する履歴の件数 (0 で履歴無効)
+        history_max_bytes (int): ルームごとに保持する履歴の合計バイト数の上限 (0 で無制限)
+        history_max_rooms (int): 履歴を保持するルーム数の上限 (超えたら最も長く使われていないルームから破棄)
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 256,
+        overflow_policy: str = DROP_OLDEST,
+        overflow_close_code: int = 1013,
+        max_rooms: int = 50,
+        bus: Optional[ChatBus] = None,
+        batch_window: float = 0.0,
+        batch_max_messages: int = 100,
+        heartbeat_interval: float = 0.0,
+        idle_timeout: float = 0.0,
+        timer_tick: float = 1.0,
+        timer_slots: int = 512,
+        history_size: int = 0,
+        history_max_bytes: int = 0,
+        history_max_rooms: int = 1000,
+    ):
+        if overflow_policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.overflow_close_code = overflow_close_code
+        self.max_rooms = max_rooms
+        self.batch_window = batch_window
+        self.batch_max_messages = batch_max_messages
+        self.connections: Dict[str, ClientConnection] = {}
+        self._by_uid: Dict[str, Set[str]] = {}
+        self._rooms: Dict[str, Set[str]] = {}
+        self._ids = itertools.count(1)
+        self.bus = bus or LocalBus()
+        self.bus.bind(self.deliver)
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = max(idle_timeout, heartbeat_interval)
+        self.evicted = 0
+        self._timers: TimerWheel[str] = TimerWheel(timer_tick, timer_slots)
+        self.history_size = history_size
+        self.history_max_bytes = history_max_bytes
+        self.history_max_rooms = history_max_rooms
+        self._history: "OrderedDict[str, SequencedRingBuffer[str]]" = OrderedDict()
+
+    async def connect(self, ws: WebSocket, uid: str) -> ClientConnection:
+        """
+        WebSocket を accept して登録します (クライアントが提示したサブプロトコルから対応するものを選ぶ)。
+
+        Args:
+            ws (WebSocket): トークン検証済みの WebSocket
+            uid (str): 認証済みユーザーの uid
+
+        Returns:
+            ClientConnection: 送信キュー付きの接続 (serve() で受信ループと writer を実行する)
+        """
+        subprotocol = select_subprotocol(ws.scope.get("subprotocols", []))
+        await ws.accept(subprotocol=subprotocol)
+        connection = ClientConnection(
+            ws,
+            str(next(self._ids)),
+            uid,
+            self.max_queue,
+            self.overflow_policy,
+            self.overflow_close_code,
+            subprotocol=subprotocol,
+            batch_window=self.batch_window,
+            batch_max_messages=self.batch_max_messages,
+        )
+        self.connections[connection.connection_id] = connection
+        self._by_uid.setdefault(uid, set()).add(connection.connection_id)
+        if self.heartbeat_interval > 0:
+            self._timers.schedule(connection.connection_id, self.heartbeat_interval)
+        LOGGER.debug(f"New connection accepted: {ws.client} id={connection.connection_id}")
+        return connection
+
+    def disconnect(self, connection: ClientConnection) -> None:
+        """
+        接続をすべての索引から取り除きます (購読ルーム数に比例、全接続数には依存しない)。
+        """
+        if self.connections.pop(connection.connection_id, None) is None:
+            return
+        self._timers.cancel(connection.connection_id)
+        for room in list(connection.rooms):
+            self.unsubscribe(connection, room)
+        ids = self._by_uid.get(connection.uid)
+        if ids is not None:
+            ids.discard(connection.connection_id)
+            if not ids:
+                del self._by_uid[connection.uid]
+        LOGGER.debug(f"Connection removed: {connection.client} id={connection.connection_id}")
+
+    def subscribe(self, connection: ClientConnection, room: str) -> bool:
+        """
+        接続をルームの購読者に加えます。
+
+        Returns:
+            bool: 購読できた場合は True (購読数の上限に達している場合は False)
+        """
+        if room in connection.rooms:
+            return True
+        if len(connection.rooms) >= self.max_rooms:
+            return False
+        connection.rooms.add(room)
+        self._rooms.setdefault(room, set()).add(connection.connection_id)
+        return True
+
+    def unsubscribe(self, connection: ClientConnection, room: str) -> None:
+        """
+        接続をルームの購読者から外します (購読者がいなくなったルームは削除)。
+        """
+        connection.rooms.discard(room)
+        members = self._rooms.get(room)
+        if members is not None:
+            members.discard(connection.connection_id)
+            if not members:
+                del self._rooms[room]
+
+    def _enqueue(self, connection_ids: Iterable[str], msg: Message) -> int:
+        connections = [self.connections[cid] for cid in connection_ids if cid in self.connections]
+        if len(connections) > 1 and not isinstance(msg, PreparedMessage):
+            # 宛先が複数ならエンコードとフレーム生成を 1 回にまとめる
+            msg = PreparedMessage(msg)
+        delivered = 0
+        for connection in connections:
+            delivered += connection.enqueue(msg)
+        return delivered
+
+    def deliver(self, kind: int, target: str, msg: Message, seq: Optional[int] = None) -> int:
+        """
+        ── バスから受け取った配信を、このプロセスの該当する接続の送信キューに追加 ──
+
+        Args:
+            kind (int): 種別 (KIND_ROOM / KIND_ROOM_RECORDED / KIND_USER / KIND_ALL)
+            target (str): ルーム名または uid (全員宛てなら無視)
+            msg (Message): 配信するメッセージ
+            seq (Optional[int]): バスが割り当てたルームの連番 (ない場合は履歴に記録しない)
+
+        Returns:
+            int: キューに追加できた接続数
+        """
+        if kind == KIND_ROOM_RECORDED:
+            if seq is not None:
+                msg = self._record(target, msg, seq)
+            kind = KIND_ROOM
+        if kind == KIND_ROOM:
+            return self._enqueue(list(self._rooms.get(target, ())), msg)
+        if kind == KIND_USER:
+            return self._enqueue(list(self._by_uid.get(target, ())), msg)
+        return self._enqueue(list(self.connections), msg)
+
+    def publish(self, room: str, msg: Message, record: bool = False) -> Optional[int]:
+        """
+        ── ルームの購読者の送信キューにだけ msg を追加 ──
+
+        Args:
+            room (str): ルーム名
+            msg (Message): 配信するメッセージ
+            record (bool): 連番を付けて履歴に記録する (msg は JSON オブジェクトのテキストであること)
+
+        Returns:
+            Optional[int]: キューに追加できた接続数 (バスで他ワーカーへ中継した場合は None)
+        """
+        return self.bus.publish(KIND_ROOM_RECORDED if record else KIND_ROOM, room, msg)
+
+    def send_to_user(self, uid: str, msg: Message) -> Optional[int]:
+        """
+        ── 指定ユーザーの全接続 (複数端末) の送信キューに msg を追加 ──
+
+        Returns:
+            Optional[int]: キューに追加できた接続数 (バスで他ワーカーへ中継した場合は None)
+        """
+        return self.bus.publish(KIND_USER, uid, msg)
+
+    def send_to(self, connection_id: str, msg: Message) -> bool:
+        """
+        ── 接続 ID を指定して msg を送信キューに追加 ──
+        """
+        connection = self.connections.get(connection_id)
+        return connection is not None and connection.enqueue(msg)
+
+    def broadcast(self, msg: Message) -> Optional[int]:
+        """
+        ── 全クライアントの送信キューに msg を追加 ──
+        ネットワーク送信は各接続の writer タスクが行うため、ここでは待機しません。
+
+        Returns:
+            Optional[int]: キューに追加できた接続数 (バスで他ワーカーへ中継した場合は None)
+        """
+        return self.bus.publish(KIND_ALL, "", msg)
+
+    def _on_timers(self, connection_ids: List[str]) -> None:
+        now = time.monotonic()
+        for connection_id in connection_ids:
+            connection = self.connections.get(connection_id)
+            if connection is None:
+                continue
+            idle = now - connection.last_activity
+            if idle >= self.idle_timeout:
+                LOGGER.info(f"Evicting idle connection {connection.client} id={connection_id} (idle {idle:.0f}s)")
+                self.evicted += 1
+                connection.close(IDLE_CLOSE_CODE, "idle timeout")
+                continue
+            if idle >= self.heartbeat_interval:
+                connection.ping()
+                # 次は pong が届いたかどうかを確認する (届いていなければ再度 ping、期限を過ぎたら切断)
+                delay = min(self.heartbeat_interval, self.idle_timeout - idle)
+            else:
+                delay = self.heartbeat_interval - idle
+            self._timers.schedule(connection_id, delay)
+
+    async def run_heartbeat(self) -> None:
+        """
+        ── ハートビートとアイドル接続の切断 (lifespan のバックグラウンドタスク) ──
+        全接続のタイマーを 1 つのタイマーホイールで刻みごとに処理します。
+        """
+        await self._timers.run(self._on_timers)
+
+    def room_history(self, room: str) -> Optional[SequencedRingBuffer[str]]:
+        """
+        ルームの履歴を返します (なければ作成し、最近使ったものとして扱う。履歴無効なら None)。
+        """
+        if self.history_size <= 0:
+            return None
+        history = self._history.get(room)
+        if history is None:
+            history = self._history[room] = SequencedRingBuffer(
+                self.history_size, self.history_max_bytes, sizeof=utf8_len, epoch=self.bus.epoch or None
+            )
+            while len(self._history) > self.history_max_rooms:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(room)
+        return history
+
+    def _record(self, room: str, msg: Message, seq: int) -> Message:
+        text = msg.data if isinstance(msg, PreparedMessage) else msg
+        history = self.room_history(room)
+        if history is None or not isinstance(text, str) or not text.startswith("{"):
+            return msg
+        # JSON オブジェクトの先頭に連番を差し込む (再エンコードしない)
+        text = f'{{"seq":{seq},{text[1:]}'
+        if history.epoch != self.bus.epoch or seq != history.last_seq + 1:
+            history.reset(self.bus.epoch, seq - 1)
+        history.append(text)
+        return text
+
+    def replay(self, room: str, last_seq: int, epoch: Optional[str] = None) -> Tuple[str, int, List[str], bool]:
+        """
+        ── 再接続したクライアント向けに、ルームの履歴から last_seq より後のメッセージを取り出す ──
+
+        Args:
+            room (str): ルーム名
+            last_seq (int): クライアントが最後に受け取った連番
+            epoch (Optional[str]): クライアントが保持している履歴の epoch (異なる場合は保持分をすべて返す)
+
+        Returns:
+            Tuple[str, int, List[str], bool]: epoch、最新の連番、メッセージ (古い順)、欠落がないかどうか
+        """
+        history = self.room_history(room)
+        if history is None:
+            return "", 0, [], False
+        if epoch is not None and epoch != history.epoch:
+            items, _ = history.since(0)
+            complete = False
+        else:
+            items, complete = history.since(last_seq)
+        return history.epoch, history.last_seq, [text for _, text in items], complete
+
+    def room_size(self, room: str) -> int:
+        return len(self._rooms.get(room, ()))
+
+    async def close_all(self, code: int = 1012, reason: Callable[[], str] = lambda: "") -> None:
+        """
+        ── 全クライアントへクローズフレームを送信し、各接続の終了を待つ ──
+
+        Args:
+            code (int): クローズコード
+            reason (Callable[[], str]): 接続ごとのクローズ理由を返す関数
+        """
+        connections = list(self.connections.values())
+        LOGGER.info(f"Closing {len(connections)} websocket connection(s) with code={code}")
+        for connection in connections:
+            connection.close(code, reason())
+        for connection in connections:
+            await connection.closed.wait()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        接続数、ユーザー数、ルーム数、未送信メッセージ数、送信数、送信フレーム数、破棄数の合計と、
+        アイドル期限切れで切断した接続数、履歴を保持しているルーム数、履歴の合計バイト数を返します。
+        """
+        connections = list(self.connections.values())
+        return {
+            "connections": len(connections),
+            "users": len(self._by_uid),
+            "rooms": len(self._rooms),
+            "pending": sum(connection.pending for connection in connections),
+            "sent": sum(connection.sent for connection in connections),
+            "frames": sum(connection.frames for connection in connections),
+            "dropped": sum(connection.dropped for connection in connections),
+            "evicted": self.evicted,
+            "histories": len(self._history),
+            "history_bytes": sum(history.bytes for history in self._history.values()),
+        }
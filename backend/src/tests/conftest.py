@@ -19,10 +19,22 @@ project_root = os.path.abspath(os.path.join(current_dir, ".."))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from app_state import environment_info_static
+# ───────────────────────────────────────────────────────────────────────────
+# テストはインメモリ SQLite (StaticPool) で実行し、Postgres を必要としない
+# (main / database.connection のインポート前に設定する必要がある)
+# ───────────────────────────────────────────────────────────────────────────
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.pop("DATABASE_REPLICA_URLS", None)
 
-# main.py と environment_info_static をインポート
-from main import create_app
+# 上記の設定後にインポートする (E402)
+from app_state import environment_info_static  # noqa: E402
+from database.connection import engine, seed_database  # noqa: E402
+from database.session import SessionLocal  # noqa: E402
+from main import create_app  # noqa: E402
+from models.environment_info import EnvironmentInfo  # noqa: E402
+from repositories.environment_repository import EnvironmentRepository  # noqa: E402
+from services.environment_service import EnvironmentService  # noqa: E402
+from utils.shutdown import DRAIN  # noqa: E402
 
 # ───────────────────────────────────────────────────────────────────────────
 # テスト用環境情報データ定義
@@ -56,24 +68,34 @@ TEST_ENV_INFOS = [
 ]
 
 
+@pytest.fixture(scope="session")
+def seeded_database():
+    """
+    インメモリ SQLite にスキーマを作成し、TEST_ENV_INFOS を投入します。
+    """
+    seed_database(engine, {EnvironmentInfo: TEST_ENV_INFOS})
+    return engine
+
+
 @pytest.fixture(autouse=True)
-def setup_environment_info():
+def setup_environment_info(seeded_database):
     """
     各テスト前に environment_info_static を初期化し、
-    TEST_ENV_INFOS の内容をセットします。
+    本番と同じリポジトリ／サービス経由で DB の TEST_ENV_INFOS をロードします。
     """
     # 既存データクリア
     environment_info_static.clear()
-    # テストデータ挿入
-    for info in TEST_ENV_INFOS:
-        environment_info_static[info["key_code"]] = {
-            "key_code": info["key_code"],
-            "values": info["values"],
-            "created_by": info["created_by"],
-            "updated_by": info["updated_by"],
-            "created_at": info["created_at"],
-            "updated_at": info["updated_at"],
-        }
+    # DB からキャッシュを再構築
+    with SessionLocal() as session:
+        EnvironmentService(repository=EnvironmentRepository(db=session)).refresh_cache()
+
+
+@pytest.fixture(autouse=True)
+def reset_drain_state():
+    """
+    TestClient の lifespan 終了でドレイン状態になったままにならないよう、各テスト前に解除します。
+    """
+    DRAIN.reset()
 
 
 @pytest.fixture(scope="session")
@@ -0,0 +1,357 @@
+"""
+test_auth.py
+
+認証処理のテスト
+
+このモジュールでは、以下を検証します：
+
+1. 検証済みトークンキャッシュが exp まで結果を保持し、上限超過・失効チェック間隔で破棄すること
+2. HTTP の認証依存関係が同じトークンの 2 回目以降で SDK を呼ばず、失効したトークンは失効チェック間隔の経過後に拒否されること
+3. ローカル検証がローカルの鍵サーバーから公開鍵を取得し、署名とクレームを検証すること
+4. セッションチケットを ID トークンと交換し、HTTP で利用できること (改ざん・期限切れ・スコープ外は拒否)
+5. 初回の認証が並行しても Firebase Admin SDK の初期化が 1 回だけ行われること
+"""
+
+import base64
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+
+import anyio
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from utils import firebase_auth
+from utils.firebase_jwks import ExpiredIdTokenError, FirebaseKeyStore, InvalidIdTokenError, verify_id_token
+from utils.session_ticket import ExpiredTicketError, InvalidTicketError, issue_ticket, verify_ticket
+from utils.token_cache import VerifiedTokenCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_cache_expiry_eviction_and_recheck():
+    """
+    exp を過ぎたエントリ、上限超過の最古エントリ、失効チェック間隔を過ぎたエントリがヒットしないことを検証します。
+    """
+    clock = FakeClock()
+    cache = VerifiedTokenCache(max_entries=2, revocation_check_seconds=60.0, clock=clock)
+    cache.put("token-a", {"uid": "a", "exp": 1_100})
+    cache.put("token-b", {"uid": "b", "exp": 2_000})
+
+    assert cache.get("token-a")["uid"] == "a"
+    cache.get("token-a")["uid"] = "mutated"  # 返り値はコピー
+    assert cache.get("token-a")["uid"] == "a"
+
+    # 上限超過で最も古く使われた token-b を追い出す
+    cache.put("token-c", {"uid": "c", "exp": 2_000})
+    assert cache.get("token-b") is None
+
+    # 失効チェック間隔を過ぎたら再検証させる
+    clock.now += 61
+    assert cache.get("token-c") is None
+    # exp を過ぎたら破棄
+    clock.now = 1_100
+    assert cache.get("token-a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 3
+    assert (stats["evictions"], stats["rechecks"], stats["expired"]) == (1, 1, 1)
+    assert stats["size"] == 0
+
+    cache.put("token-d", {"uid": "d", "exp": 2_000})
+    assert cache.invalidate_uid("d") == 1
+
+
+def test_verify_firebase_token_uses_cache(monkeypatch):
+    """
+    同じトークンの検証は 1 回だけ SDK を呼び、無効なトークンは 401 になることを検証します。
+    """
+    calls = []
+
+    class InvalidIdTokenError(Exception):
+        pass
+
+    class ExpiredIdTokenError(InvalidIdTokenError):
+        pass
+
+    def verify_id_token(token, check_revoked=False):
+        calls.append(token)
+        if token == "bad":
+            raise InvalidIdTokenError("bad token")
+        return {"uid": "u1", "exp": 4_102_444_800}
+
+    # firebase_admin を読み込まないよう、遅延モジュールごと差し替える
+    fake_auth = SimpleNamespace(
+        verify_id_token=verify_id_token,
+        ExpiredIdTokenError=ExpiredIdTokenError,
+        RevokedIdTokenError=ExpiredIdTokenError,
+        InvalidIdTokenError=InvalidIdTokenError,
+        UserDisabledError=ExpiredIdTokenError,
+    )
+    monkeypatch.setattr(firebase_auth, "FIREBASE_APP", object())
+    monkeypatch.setattr(firebase_auth, "auth", fake_auth)
+    monkeypatch.setattr(firebase_auth, "TOKEN_CACHE", VerifiedTokenCache(max_entries=10))
+
+    async def verify(token: str):
+        return await firebase_auth.verify_firebase_token(
+            HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        )
+
+    assert anyio.run(verify, "good")["uid"] == "u1"
+    assert anyio.run(verify, "good")["uid"] == "u1"
+    assert calls == ["good"]
+    assert firebase_auth.TOKEN_CACHE.stats()["hits"] == 1
+
+    with pytest.raises(HTTPException) as exc_info:
+        anyio.run(verify, "bad")
+    assert exc_info.value.status_code == 401
+
+
+def test_revoked_token_is_rejected_after_recheck_interval(monkeypatch):
+    """
+    キャッシュ済みのトークンが失効しても間隔内はキャッシュから受け付け、間隔を過ぎたら失効チェック付きで再検証して 401 になることを検証します。
+    """
+    calls = []
+    revoked = set()
+
+    class InvalidIdTokenError(Exception):
+        pass
+
+    class RevokedIdTokenError(InvalidIdTokenError):
+        pass
+
+    def verify_id_token(token, check_revoked=False):
+        calls.append(check_revoked)
+        if check_revoked and token in revoked:
+            raise RevokedIdTokenError("revoked")
+        return {"uid": "u1", "exp": 4_102_444_800}
+
+    fake_auth = SimpleNamespace(
+        verify_id_token=verify_id_token,
+        ExpiredIdTokenError=type("ExpiredIdTokenError", (InvalidIdTokenError,), {}),
+        RevokedIdTokenError=RevokedIdTokenError,
+        InvalidIdTokenError=InvalidIdTokenError,
+        UserDisabledError=type("UserDisabledError", (Exception,), {}),
+    )
+    clock = FakeClock()
+    monkeypatch.setattr(firebase_auth, "FIREBASE_APP", object())
+    monkeypatch.setattr(firebase_auth, "auth", fake_auth)
+    monkeypatch.setattr(
+        firebase_auth, "TOKEN_CACHE", VerifiedTokenCache(max_entries=10, revocation_check_seconds=60.0, clock=clock)
+    )
+
+    async def verify(token: str):
+        return await firebase_auth.verify_firebase_token(
+            HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        )
+
+    assert anyio.run(verify, "token")["uid"] == "u1"
+    revoked.add("token")
+    clock.now += 30
+    assert anyio.run(verify, "token")["uid"] == "u1"
+    assert calls == [True]
+
+    clock.now += 31
+    with pytest.raises(HTTPException) as exc_info:
+        anyio.run(verify, "token")
+    assert exc_info.value.status_code == 401
+    assert calls == [True, True]
+    assert firebase_auth.TOKEN_CACHE.stats()["rechecks"] == 1
+
+
+def _self_signed_certificate(key: rsa.RSAPrivateKey) -> str:
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return certificate.public_bytes(serialization.Encoding.PEM).decode("ascii")
+
+
+def _sign(key: rsa.RSAPrivateKey, kid: str, claims: dict) -> str:
+    def encode(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    header = encode(json.dumps({"alg": "RS256", "kid": kid, "typ": "JWT"}).encode())
+    payload = encode(json.dumps(claims).encode())
+    signature = key.sign(f"{header}.{payload}".encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f"{header}.{payload}.{encode(signature)}"
+
+
+@pytest.fixture
+def key_server():
+    """
+    Google の x509 証明書エンドポイントの代わりに、証明書 JSON を Cache-Control 付きで返すローカルサーバー。
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    body = json.dumps({"kid-1": _self_signed_certificate(key)}).encode()
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "public, max-age=600, must-revalidate")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield SimpleNamespace(url=f"http://127.0.0.1:{server.server_port}/certs", key=key, requests=requests)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_local_verifier_checks_signature_and_claims(key_server):
+    """
+    公開鍵を 1 回だけ取得して max-age を反映し、署名・aud・exp の不正を拒否することを検証します。
+    """
+    keys = FirebaseKeyStore(key_server.url, refresh_margin=60.0, min_refresh_interval=30.0)
+    now = time.time()
+    claims = {
+        "iss": "https://securetoken.google.com/demo-project",
+        "aud": "demo-project",
+        "sub": "user-1",
+        "iat": int(now) - 10,
+        "auth_time": int(now) - 10,
+        "exp": int(now) + 3600,
+    }
+    token = _sign(key_server.key, "kid-1", claims)
+
+    decoded = verify_id_token(token, "demo-project", keys=keys)
+    assert decoded["uid"] == "user-1"
+    assert verify_id_token(token, "demo-project", keys=keys)["sub"] == "user-1"
+    assert len(key_server.requests) == 1  # 2 回目以降はメモリ上の鍵のみ
+    assert 590 <= keys.expires_at - now <= 610
+    assert 530 <= keys.next_refresh_in() <= 550
+
+    header, payload, signature = token.split(".")
+    tampered = _sign(key_server.key, "kid-1", dict(claims, sub="user-2")).split(".")[1]
+    with pytest.raises(InvalidIdTokenError, match="signature"):
+        verify_id_token(f"{header}.{tampered}.{signature}", "demo-project", keys=keys)
+    with pytest.raises(InvalidIdTokenError, match="audience"):
+        verify_id_token(token, "other-project", keys=keys)
+    with pytest.raises(ExpiredIdTokenError):
+        verify_id_token(token, "demo-project", keys=keys, now=now + 7200)
+    # 未知の kid は最小間隔内なら再取得しない
+    with pytest.raises(InvalidIdTokenError, match="kid"):
+        verify_id_token(_sign(key_server.key, "kid-2", claims), "demo-project", keys=keys)
+    assert len(key_server.requests) == 1
+
+
+def test_session_ticket_signature_expiry_and_scope():
+    """
+    チケットの有効期限が ID トークンの exp を超えず、改ざん・期限切れ・スコープ外が拒否されることを検証します。
+    """
+    key = b"k" * 32
+    ticket, expires_at = issue_ticket("user-1", ["ws"], expires_at=1_300, now=1_000, key=key)
+    assert ticket.startswith("st1.")
+    assert expires_at == 1_300  # TTL (900 秒) より ID トークンの exp が先
+
+    claims = verify_ticket(ticket, "ws", now=1_100, key=key)
+    assert (claims["uid"], claims["scopes"]) == ("user-1", ["ws"])
+
+    with pytest.raises(ExpiredTicketError):
+        verify_ticket(ticket, "ws", now=1_300, key=key)
+    with pytest.raises(InvalidTicketError, match="scope"):
+        verify_ticket(ticket, "api", now=1_100, key=key)
+    with pytest.raises(InvalidTicketError, match="signature"):
+        verify_ticket(ticket, "ws", now=1_100, key=b"x" * 32)
+    # uid を書き換えたペイロードに元の署名を付けても通らない
+    forged_payload = issue_ticket("user-2", ["ws"], now=1_000, key=key)[0].split(".")[1]
+    prefix, _, signature = ticket.split(".")
+    with pytest.raises(InvalidTicketError, match="signature"):
+        verify_ticket(f"{prefix}.{forged_payload}.{signature}", "ws", now=1_100, key=key)
+
+
+def test_session_ticket_exchange_endpoint(client, monkeypatch):
+    """
+    ID トークンで発行したチケットで /users に認証でき、チケットでは再発行できないことを検証します。
+    """
+    verified = []
+
+    async def fake_verify_token(token):
+        verified.append(token)
+        return {"uid": "user-1", "email": "user@example.com", "exp": time.time() + 3600}
+
+    monkeypatch.setattr(firebase_auth, "_verify_token", fake_verify_token)
+
+    response = client.post("/latest/users/session-ticket", headers={"Authorization": "Bearer id-token"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["scopes"] == ["api", "ws"]
+    ticket = body["ticket"]
+
+    user = client.post("/latest/users/", headers={"Authorization": f"Bearer {ticket}"})
+    assert user.status_code == 200 and user.json()["user_id"] == "user-1"
+    assert verified == ["id-token"]  # チケットの検証では ID トークン検証を呼ばない
+
+    renewal = client.post("/latest/users/session-ticket", headers={"Authorization": f"Bearer {ticket}"})
+    assert renewal.status_code == 401
+    denied = client.post(
+        "/latest/users/session-ticket", headers={"Authorization": "Bearer id-token"}, json={"scopes": ["admin"]}
+    )
+    assert denied.status_code == 403
+
+
+def test_firebase_app_is_initialized_once_under_concurrency(monkeypatch, tmp_path):
+    """
+    複数スレッドから同時に初期化しても initialize_app が 1 回だけ呼ばれ、全スレッドが同じアプリを受け取ることを検証します。
+    """
+    service_account = tmp_path / "service_account.json"
+    service_account.write_text("{}")
+    calls = []
+
+    def initialize_app(cred):
+        calls.append(cred)
+        time.sleep(0.05)  # 初期化中に他のスレッドが到着する
+        if len(calls) > 1:
+            raise ValueError("The default Firebase app already exists.")
+        return SimpleNamespace(name="[DEFAULT]")
+
+    monkeypatch.setattr(firebase_auth, "FIREBASE_APP", None)
+    monkeypatch.setattr(firebase_auth, "SERVICE_ACCOUNT_PATH", str(service_account))
+    monkeypatch.setattr(firebase_auth, "credentials", SimpleNamespace(Certificate=lambda path: path))
+    monkeypatch.setattr(firebase_auth, "firebase_admin", SimpleNamespace(initialize_app=initialize_app))
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(firebase_auth.initialize_firebase_app())) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8 and all(app is results[0] for app in results)
@@ -0,0 +1,206 @@
+"""
+test_database.py
+
+データベースセッション層のテスト
+
+このモジュールでは、SQLite (ファイルおよびインメモリ) を用いて以下を検証します：
+
+1. 読み取り専用のリポジトリ呼び出しがレプリカへ振り分けられること
+2. 書き込みと、書き込んだクライアントの直後の読み取りだけがプライマリへ送られること
+   (flush と DML のみを書き込みとして扱い、固定の期限は cookie で次のリクエストへ持ち回る)
+3. インメモリ SQLite 上で /reload がリポジトリ／サービス経由でキャッシュを再構築すること
+4. DB を使うルートが DB 処理の完了時点でコネクションをプールへ返却すること (レスポンス送信を待たない)
+"""
+
+import datetime
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+
+from app_state import environment_info_static
+from database.connection import create_db_engine, create_schema
+from database.routing import ReadAfterWriteTracker, ReplicaSelector, RoutingSession
+from database.session import SessionLocal
+from middlewares.read_after_write_middleware import ReadAfterWriteMiddleware
+from models.environment_info import EnvironmentInfo
+from repositories.environment_repository import EnvironmentRepository
+from routers.html.roots import router as roots_router
+from services.environment_service import EnvironmentService
+
+
+def _environment_info(key_code: str, values: str) -> EnvironmentInfo:
+    return EnvironmentInfo(
+        key_code=key_code,
+        values=values,
+        created_by="test",
+        created_at=datetime.datetime(2025, 4, 20, 0, 0, 0),
+    )
+
+
+@pytest.fixture
+def routed_session_factory(tmp_path):
+    """
+    プライマリとレプリカ (それぞれ別の SQLite ファイル) に振り分けるセッションファクトリを返します。
+    レプリカにのみ 1 件のレコードを登録しておき、どちらから読んだかを判別できるようにします。
+    """
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine in (primary, replica):
+        SQLModel.metadata.create_all(engine)
+    with sessionmaker(bind=replica)() as session:
+        session.add(_environment_info("REPLICA", "from-replica"))
+        session.commit()
+
+    tracker = ReadAfterWriteTracker(window=60.0)
+    factory = sessionmaker(
+        class_=RoutingSession,
+        replica_selector=ReplicaSelector([replica]),
+        write_tracker=tracker,
+        bind=primary,
+    )
+    yield factory, tracker
+    primary.dispose()
+    replica.dispose()
+
+
+def test_reads_are_routed_to_replica(routed_session_factory):
+    """
+    fetch_all / find_by_key がレプリカから読み取られることを検証します。
+    """
+    factory, _ = routed_session_factory
+    with factory() as session:
+        repo = EnvironmentRepository(db=session)
+        assert [info.key_code for info in repo.fetch_all()] == ["REPLICA"]
+        assert repo.find_by_key("REPLICA").values == "from-replica"
+
+
+def test_read_after_write_uses_primary(routed_session_factory):
+    """
+    書き込み後は、同一セッションおよび同じクライアント (スコープ) の window 内の読み取りがプライマリへ送られ、
+    他のクライアントの読み取りはレプリカのままであることを検証します。
+    """
+    factory, tracker = routed_session_factory
+    with tracker.scope() as client:
+        with factory() as session:
+            session.add(_environment_info("PRIMARY", "from-primary"))
+            session.commit()
+            assert [info.key_code for info in EnvironmentRepository(db=session).fetch_all()] == ["PRIMARY"]
+
+        with factory() as session:
+            assert EnvironmentRepository(db=session).find_by_key("PRIMARY").values == "from-primary"
+
+        with tracker.scope():
+            with factory() as session:
+                assert EnvironmentRepository(db=session).find_by_key("PRIMARY") is None
+
+    # 持ち回った期限内の次のリクエストもプライマリ、期限を過ぎればレプリカへ戻る
+    with tracker.scope(client.sticky_until):
+        with factory() as session:
+            assert EnvironmentRepository(db=session).find_by_key("PRIMARY") is not None
+    with tracker.scope(time.time() - 1):
+        with factory() as session:
+            assert EnvironmentRepository(db=session).find_by_key("PRIMARY") is None
+
+
+def test_only_flush_and_dml_mark_writes(routed_session_factory):
+    """
+    テキスト SQL の読み取りと session.connection() はプライマリで実行しても書き込みとみなさず、
+    DML のテキスト SQL は書き込みとして扱うことを検証します。
+    """
+    factory, tracker = routed_session_factory
+    with tracker.scope() as client:
+        with factory() as session:
+            assert session.execute(text("SELECT count(*) FROM environment_info")).scalar() == 0
+            session.connection()
+            assert EnvironmentRepository(db=session).find_by_key("REPLICA").values == "from-replica"
+        assert client.wrote is False
+
+        with factory() as session:
+            session.execute(text("DELETE FROM environment_info"))
+            assert EnvironmentRepository(db=session).find_by_key("REPLICA") is None
+            session.commit()
+        assert client.wrote is True
+
+
+def test_read_after_write_cookie_follows_client():
+    """
+    書き込んだクライアントにだけ期限付きの cookie が付き、次のリクエストで固定され、他のクライアントには影響しないことを検証します。
+    """
+    tracker = ReadAfterWriteTracker(window=60.0)
+    app = FastAPI()
+
+    @app.post("/write")
+    def write():
+        tracker.mark_write()
+        return {}
+
+    @app.get("/sticky")
+    def sticky():
+        return {"sticky": tracker.in_window()}
+
+    wrapped = ReadAfterWriteMiddleware(app, tracker=tracker)
+    writer, other = TestClient(wrapped), TestClient(wrapped)
+    assert writer.get("/sticky").json() == {"sticky": False}
+    assert "db_primary_until" in writer.post("/write").cookies
+    assert writer.get("/sticky").json() == {"sticky": True}
+    assert other.get("/sticky").json() == {"sticky": False}
+
+
+def test_least_connections_prefers_idle_replica(tmp_path):
+    """
+    least_connections 方式ではチェックアウト中の接続が少ないレプリカが選ばれることを検証します。
+    """
+    busy = create_engine(f"sqlite:///{tmp_path / 'busy.db'}")
+    idle = create_engine(f"sqlite:///{tmp_path / 'idle.db'}")
+    selector = ReplicaSelector([busy, idle], strategy="least_connections")
+    with busy.connect():
+        assert selector.choose() is idle
+    busy.dispose()
+    idle.dispose()
+
+
+def test_reload_refreshes_cache_from_database(client):
+    """
+    インメモリ SQLite を使い、/v0_1/reload がリポジトリ／サービス経由でキャッシュを再構築することを検証します。
+    """
+    # キャッシュだけを古い値に書き換え、DB (TEST_ENV_INFOS) から復元されることを確認する
+    environment_info_static["10000002"] = {"values": "0.0.0"}
+
+    response = client.post("/v0_1/reload")
+    assert response.status_code == 200
+    assert environment_info_static["10000002"]["values"] == "0.0.1"
+    assert client.get("/latest/healthcheck").json() == {"version": "0.0.1"}
+
+
+def test_db_route_returns_connection_when_db_work_is_done(client, tmp_path, monkeypatch):
+    """
+    /v0_1/reload がキャッシュ更新中だけコネクションを保持し、更新後 (レスポンス生成前) には返却済みであることを検証します。
+    (インメモリ SQLite の StaticPool はチェックアウト数を持たないため、ファイルの SQLite の QueuePool を使う)
+    """
+    file_engine = create_db_engine(url=f"sqlite:///{tmp_path / 'pool.db'}")
+    create_schema(file_engine)
+    monkeypatch.setitem(SessionLocal.kw, "bind", file_engine)
+
+    checked_out = {}
+    refresh_cache = EnvironmentService.refresh_cache
+
+    def refresh_and_record(self):
+        refresh_cache(self)
+        checked_out["during"] = file_engine.pool.checkedout()
+
+    class RecordingLogger:
+        def info(self, message):
+            checked_out["after"] = file_engine.pool.checkedout()
+
+    monkeypatch.setattr(EnvironmentService, "refresh_cache", refresh_and_record)
+    monkeypatch.setattr(roots_router, "LOGGER", RecordingLogger())
+
+    assert client.post("/v0_1/reload").status_code == 200
+    assert checked_out == {"during": 1, "after": 0}
+    assert file_engine.pool.checkedout() == 0
+    file_engine.dispose()
@@ -0,0 +1,73 @@
+"""
+test_executor.py
+
+ブロッキング処理用エグゼキュータと実行メトリクスのテスト
+
+このモジュールでは、以下を検証します：
+
+1. 同時実行数が上限 (max_threads) を超えず、キュー待ち時間と実行時間が記録されること
+2. /v0_1/stats が有効な場合のみエグゼキュータと検証済みトークンキャッシュのメトリクスを返すこと
+"""
+
+import threading
+import time
+
+import anyio
+import pytest
+
+from commons.settings import settings
+from utils.executor import BlockingExecutor
+
+
+def test_executor_bounds_concurrency_and_records_times():
+    """
+    上限 2 のエグゼキュータに 6 件を同時に投入しても同時実行は 2 件までで、
+    待たされたタスクのキュー待ち時間と各タスクの実行時間、例外終了が記録されることを検証します。
+    """
+    executor = BlockingExecutor("test", max_threads=2)
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def work(fail: bool = False) -> None:
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        if fail:
+            raise RuntimeError("boom")
+
+    async def scenario():
+        async with anyio.create_task_group() as tg:
+            for _ in range(5):
+                tg.start_soon(executor.run, work)
+        with pytest.raises(RuntimeError):
+            await executor.run(work, True)
+
+    anyio.run(scenario)
+    stats = executor.stats()
+    assert peak[0] == 2
+    assert (stats["submitted"], stats["completed"], stats["failed"], stats["in_flight"]) == (6, 6, 1, 0)
+    assert stats["max_threads"] == 2
+    # 5 件目は 2 件ずつの実行を 2 回待つ
+    assert stats["max_wait_seconds"] >= 0.09
+    assert stats["max_run_seconds"] >= 0.05
+    assert stats["total_run_seconds"] >= 6 * 0.05
+
+
+def test_stats_endpoint_reports_executors(client, monkeypatch):
+    """
+    STATS_ENDPOINT_ENABLED が無効なら 404、有効ならリソース種別ごとのメトリクスとトークンキャッシュのメトリクスを返すことを検証します。
+    """
+    assert client.get("/v0_1/stats").status_code == 404
+
+    monkeypatch.setattr(settings, "stats_endpoint_enabled", True)
+    client.post("/v0_1/reload")
+    response = client.get("/v0_1/stats")
+    assert response.status_code == 200
+    stats = response.json()
+    assert set(stats["executors"]) == {"db", "auth", "cpu"}
+    assert stats["executors"]["db"]["completed"] >= 1
+    assert {"hits", "misses", "rechecks", "hit_ratio"} <= set(stats["token_cache"])
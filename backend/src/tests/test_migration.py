@@ -0,0 +1,31 @@
+"""
+test_migration.py
+
+起動時マイグレーションチェックのテスト
+
+一時的な SQLite ファイルを対象に、以下を検証します：
+
+1. 未適用のマイグレーションがある場合のみ `alembic upgrade head` が実行されること
+2. スキーマが最新であれば 2 回目以降はスキップされること
+"""
+
+from sqlalchemy import create_engine, inspect
+
+from database.migration import get_alembic_config, get_current_revisions, get_head_revisions, upgrade_if_needed
+
+
+def test_upgrade_runs_only_when_pending(tmp_path):
+    """
+    初回はマイグレーションが実行され、2 回目は alembic_version が head と一致するためスキップされることを検証します。
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'migration.db'}")
+    config = get_alembic_config()
+
+    assert upgrade_if_needed(engine, config) is True
+    assert "environment_info" in inspect(engine).get_table_names()
+
+    with engine.connect() as connection:
+        assert get_current_revisions(connection) == get_head_revisions(config)
+
+    assert upgrade_if_needed(engine, get_alembic_config()) is False
+    engine.dispose()
@@ -6,9 +6,13 @@ OpenAPI ドキュメント取得テスト
 このモジュールでは、バージョニングされた FastAPI アプリケーションに対して
 /v0_1 および /latest プレフィックスを用いた OpenAPI スキーマの取得と
 必須フィールドの検証を行います。
+キャッシュ済みドキュメントの ETag・CORS ヘッダー・root_path に応じた servers も検証します。
 """
 
+import json
+
 import pytest
+from fastapi.openapi.utils import get_openapi
 from fastapi.testclient import TestClient
 
 
@@ -42,3 +46,113 @@ def test_openapi_json_schema_fields(client: TestClient):
         assert "openapi" in data, f"'openapi' key not found in schema from {url}"
         # 'paths' キーの存在確認
         assert "paths" in data, f"'paths' key not found in schema from {url}"
+
+
+def test_versioned_openapi_matches_fastapi_versioning():
+    """
+    build_versioned_app (単一ディスパッチャー) が生成する各バージョンの OpenAPI スキーマが、
+    fastapi_versioning.VersionedFastAPI のものと一致することを検証します。
+    """
+    from fastapi import APIRouter, FastAPI
+    from fastapi_versioning import VersionedFastAPI, version
+
+    from utils.versioning import build_versioned_app
+
+    def make_app() -> FastAPI:
+        app = FastAPI(title="parity", description="parity check")
+        router = APIRouter(prefix="/items", tags=["items"])
+
+        @router.get("/")
+        @version(0, 1)
+        def list_items():
+            return []
+
+        @router.get("/{item_id}")
+        @version(0, 2)
+        def get_item(item_id: int):
+            return {"item_id": item_id}
+
+        app.include_router(router)
+        return app
+
+    options = dict(version_format="{major}_{minor}", prefix_format="/v{major}_{minor}", enable_latest=True)
+    expected = TestClient(VersionedFastAPI(make_app(), **options))
+    actual = TestClient(build_versioned_app(make_app(), **options))
+
+    for prefix in ("/v0_1", "/v0_2", "/v1_0", "/latest"):
+        url = f"{prefix}/openapi.json"
+        assert actual.get(url).json() == expected.get(url).json(), f"OpenAPI mismatch at {url}"
+    assert actual.get("/openapi.json").json() == expected.get("/openapi.json").json()
+    assert actual.get("/v0_2/items/3").json() == {"item_id": 3}
+    assert actual.get("/v0_1/items/3").status_code == 404
+
+
+def test_openapi_json_is_cached_with_etag(client: TestClient):
+    """
+    openapi.json が圧縮済みのバイト列と強い ETag で返され、
+    If-None-Match が一致する場合は 304 Not Modified になることを検証します。
+    """
+    for url in ("/v0_1/openapi.json", "/latest/openapi.json"):
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        etag = response.headers["etag"]
+        assert etag.startswith('"') and not etag.startswith("W/")
+
+        # 同じドキュメントは同じ ETag で返る (再シリアライズされない)
+        assert client.get(url, headers={"Accept-Encoding": "gzip"}).headers["etag"] == etag
+
+        not_modified = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+
+        identity = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in identity.headers
+        assert identity.headers["etag"] != etag
+        assert identity.json() == response.json()
+
+        # キャッシュしない場合 (FastAPI がリクエストの root_path を servers に載せて生成) と同じ内容
+        prefix = url.removesuffix("/openapi.json")
+        sub_app = client.app.state.version_apps[prefix]
+        expected = get_openapi(
+            title=sub_app.title,
+            version=sub_app.version,
+            openapi_version=sub_app.openapi_version,
+            description=sub_app.description,
+            routes=sub_app.routes,
+            servers=[{"url": prefix}],
+        )
+        assert response.json() == json.loads(json.dumps(expected))
+
+    # 圧縮閾値未満のドキュメント (親アプリのバージョン一覧) は非圧縮のまま ETag を付与する
+    root = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in root.headers
+    assert client.get("/openapi.json", headers={"If-None-Match": root.headers["etag"]}).status_code == 304
+
+
+def test_cached_openapi_json_has_cors_headers(client: TestClient):
+    """
+    キャッシュした openapi.json の 200 と 304 のどちらにも CORS ヘッダーが付くことを検証します。
+    (OpenAPI キャッシュが CORSMiddleware の内側にあること)
+    """
+    origin = {"Origin": "http://example.com"}
+    response = client.get("/v0_1/openapi.json", headers=origin)
+    assert response.status_code == 200
+    assert "access-control-allow-origin" in response.headers
+
+    not_modified = client.get("/v0_1/openapi.json", headers={**origin, "If-None-Match": response.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert "access-control-allow-origin" in not_modified.headers
+
+
+def test_cached_openapi_servers_follow_root_path(client: TestClient):
+    """
+    キャッシュした openapi.json の servers が、リクエストの root_path (プロキシのパス) と
+    バージョンプレフィックスから作られることを検証します。
+    """
+    proxied = TestClient(client.app, root_path="/api")
+    assert proxied.get("/v0_1/openapi.json").json()["servers"] == [{"url": "/api/v0_1"}]
+    # root_path ごとにキャッシュされ、root_path なしのドキュメントには影響しない
+    assert client.get("/v0_1/openapi.json").json()["servers"] == [{"url": "/v0_1"}]
+    assert proxied.get("/openapi.json").json()["servers"] == [{"url": "/api"}]
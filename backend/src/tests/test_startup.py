@@ -0,0 +1,308 @@
+"""
+test_startup.py
+
+起動処理のテスト
+
+このモジュールでは、以下を検証します：
+
+1. 起動プロファイラがフェーズ時間とモジュールのインポート時間を記録すること
+2. 重い依存 (firebase_admin など) が遅延インポートされ、warm_up で事前に読み込めること
+3. lifespan の起動タスクが完了するまで /readiness が 503 を返し、設定で有効にした初期化の失敗は起動失敗になること
+4. /livez, /readyz がミドルウェアスタックを通さずに応答し、設定したプローブのパスがアクセスログから除外されること
+5. ウォームアップが GET ルートとフィクスチャへスタブ付きで合成リクエストを発行すること
+6. シャットダウン時にドレインフックが実行され、以降の新規リクエストが 503 で拒否されること
+7. ルートマニフェストが内容の変化 (追加を含む) でだけ再生成され、--check が最新でない場合に 1 で終了すること
+"""
+
+import json
+import logging
+import os
+import shutil
+import sys
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+
+from commons.settings import settings
+from utils import route_manifest, shutdown
+from utils.custom_log_handler import ProbeAccessLogFilter
+from utils.lazy_import import lazy_import, warm_up
+from utils.readiness import READINESS, ReadinessState, StartupTask, run_startup_tasks
+from utils.shutdown import DRAIN
+from utils.startup_profiler import StartupProfiler
+from utils.warmup import WarmupRequest, warm_up_routes
+
+
+def test_startup_profiler_records_phases_and_imports(tmp_path, monkeypatch):
+    """
+    phase() の所要時間と、フック挿入後に初めてインポートされたモジュールの時間がレポートに載ることを検証します。
+    """
+    package = tmp_path / "profiled_pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("from profiled_pkg import child\n")
+    (package / "child.py").write_text("VALUE = sum(range(1000))\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    profiler = StartupProfiler()
+    profiler.install_import_hook()
+    try:
+        with profiler.phase("import"):
+            import profiled_pkg  # noqa: F401
+    finally:
+        profiler.uninstall_import_hook()
+        sys.modules.pop("profiled_pkg", None)
+        sys.modules.pop("profiled_pkg.child", None)
+
+    report = profiler.write_report(tmp_path / "report.json")
+    assert json.loads((tmp_path / "report.json").read_text()) == report
+    assert report["phases"]["import"] > 0
+
+    modules = {timing["module"]: timing for timing in report["imports"]["modules"]}
+    assert set(modules) == {"profiled_pkg", "profiled_pkg.child"}
+    # 親パッケージの累積時間は子モジュールのインポート時間を含む
+    assert modules["profiled_pkg"]["cumulative_ms"] >= modules["profiled_pkg.child"]["cumulative_ms"]
+    assert report["imports"]["packages"].keys() == {"profiled_pkg"}
+
+
+def test_lazy_import_defers_until_first_use(tmp_path, monkeypatch):
+    """
+    lazy_import したモジュールが属性アクセスまたは warm_up まで読み込まれないことを検証します。
+    """
+    (tmp_path / "lazy_heavy.py").write_text("LOADED = True\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    # 実際の遅延モジュール (firebase_admin など) を "*" で読み込まないよう、登録簿を差し替える
+    registry = {}
+    monkeypatch.setattr("utils.lazy_import.LAZY_MODULES", registry)
+
+    try:
+        heavy = lazy_import("lazy_heavy")
+        assert lazy_import("lazy_heavy") is heavy
+        assert "lazy_heavy" not in sys.modules and not heavy.is_loaded
+
+        assert warm_up(["lazy_missing_module", "*"]) == ["lazy_heavy"]
+        assert set(registry) == {"lazy_heavy", "lazy_missing_module"}
+        assert heavy.is_loaded and heavy.LOADED is True
+    finally:
+        sys.modules.pop("lazy_heavy", None)
+
+
+def test_app_import_does_not_load_optional_dependencies(app):
+    """
+    アプリ生成後も、使われていない firebase_admin / netifaces が読み込まれていないことを検証します。
+    """
+    for name in ("firebase_admin", "netifaces"):
+        assert name not in sys.modules, f"{name} was imported eagerly"
+
+
+def test_readiness_reports_ready_after_lifespan(app):
+    """
+    lifespan 実行中は /readiness が 200 とタスクごとの状態を返し、終了後は 503 になることを検証します。
+    """
+    with TestClient(app) as client:
+        response = client.get("/latest/readiness")
+        assert response.status_code == 200
+        tasks = response.json()["tasks"]
+        assert tasks["database_cache"]["status"] == "ok"
+        assert tasks["database_pool"]["status"] == "ok"
+        # テスト環境にはサービスアカウントがないため SDK 初期化はスキップされる
+        assert tasks["firebase_sdk"]["status"] == "skipped"
+
+    assert TestClient(app).get("/latest/readiness").status_code == 503
+
+
+def test_startup_tasks_run_concurrently_with_timeouts():
+    """
+    起動タスクが並行実行され、任意タスクのタイムアウトは記録のみ、必須タスクの失敗は起動失敗になることを検証します。
+    """
+    state = ReadinessState()
+
+    async def slow():
+        await anyio.sleep(0.2)
+
+    async def hang():
+        await anyio.sleep(10)
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def run(tasks):
+        started_at = anyio.current_time()
+        await run_startup_tasks(tasks, state)
+        return anyio.current_time() - started_at
+
+    elapsed = anyio.run(
+        run,
+        [
+            StartupTask("a", slow, timeout=1.0),
+            StartupTask("b", slow, timeout=1.0),
+            StartupTask("optional", hang, timeout=0.05, required=False),
+        ],
+    )
+    assert elapsed < 0.35
+    snapshot = state.snapshot()
+    assert snapshot["ready"] is True
+    assert snapshot["tasks"]["optional"]["status"] == "timeout"
+
+    with pytest.raises(Exception):
+        anyio.run(run, [StartupTask("broken", broken, timeout=1.0), StartupTask("a", slow, timeout=1.0)])
+    snapshot = state.snapshot()
+    assert snapshot["ready"] is False
+    assert snapshot["tasks"]["broken"]["status"] == "failed"
+
+
+def test_configured_startup_tasks_are_required(monkeypatch):
+    """
+    プールのウォームアップと Firebase SDK の初期化は、有効な場合の失敗で起動を中止し、無効ならスキップされることを検証します。
+    """
+    import main
+
+    tasks = {task.name: task for task in main.build_startup_tasks()}
+    assert tasks["database_pool"].required and tasks["firebase_sdk"].required
+
+    def broken(*args):
+        raise RuntimeError("database unavailable")
+
+    state = ReadinessState()
+    monkeypatch.setattr(settings, "startup_pool_warmup_connections", 1)
+    monkeypatch.setattr(main, "warm_pool", broken)
+    with pytest.raises(Exception):
+        anyio.run(run_startup_tasks, [tasks["database_pool"]], state)
+    assert state.snapshot()["ready"] is False
+
+    monkeypatch.setattr(settings, "startup_pool_warmup_connections", 0)
+    monkeypatch.setattr(settings, "startup_firebase_init", False)
+    anyio.run(run_startup_tasks, [tasks["database_pool"], tasks["firebase_sdk"]], state)
+    snapshot = state.snapshot()
+    assert snapshot["ready"] is True
+    assert {snapshot["tasks"][name]["status"] for name in ("database_pool", "firebase_sdk")} == {"skipped"}
+
+
+def test_probes_bypass_app_stack(app):
+    """
+    /livez, /readyz がメモリ上の状態から応答し、署名ヘッダーなどが付かないことを検証します。
+    """
+    client = TestClient(app)
+    live = client.get("/livez")
+    assert live.status_code == 200 and live.json() == {"status": "alive"}
+    assert "x-signature" not in live.headers
+    assert client.get("/readyz").status_code == 503
+
+    with TestClient(app) as running:
+        assert running.get("/readyz").status_code == 200
+        assert running.head("/readyz").content == b""
+        # クライアント向けの /healthcheck は従来どおりアプリ本体が応答する
+        assert "x-signature" in running.get("/latest/healthcheck").headers
+
+
+def test_probe_access_log_filter(monkeypatch):
+    """
+    ProbeAccessLogFilter がプローブのアクセスログだけを除外することを検証します。
+    """
+    log_filter = ProbeAccessLogFilter()
+
+    def record(path: str) -> logging.LogRecord:
+        args = ("127.0.0.1:5000", "GET", path, "1.1", 200)
+        return logging.LogRecord("uvicorn.access", logging.INFO, __file__, 0, '%s - "%s %s HTTP/%s" %d', args, None)
+
+    assert log_filter.filter(record("/readyz")) is False
+    assert log_filter.filter(record("/livez?verbose=1")) is False
+    assert log_filter.filter(record("/latest/healthcheck")) is True
+
+    # 既定の除外パスは ProbeMiddleware と同じ設定から取る
+    monkeypatch.setattr(settings, "probe_liveness_path", "/healthz/live")
+    monkeypatch.setattr(settings, "probe_readiness_path", "/healthz/ready")
+    log_filter = ProbeAccessLogFilter()
+    assert log_filter.filter(record("/healthz/ready")) is False
+    assert log_filter.filter(record("/readyz")) is True
+
+
+def test_warm_up_routes_uses_side_effect_free_stubs(app):
+    """
+    GET ルートとフィクスチャ (認証付き POST) が発行され、終了後に依存関係のスタブが外れることを検証します。
+    """
+    fixtures = [WarmupRequest(method="POST", path="/latest/users/", json={})]
+    results = anyio.run(warm_up_routes, app, fixtures)
+
+    assert results["GET /v0_1/healthcheck"] == 200
+    assert "GET /latest/healthcheck" not in results  # 同じルートは 1 回だけ
+    assert results["POST /latest/users/"] == 200  # 認証はスタブで通過
+
+    # スタブが外れていれば、認証ヘッダーなしの実リクエストは拒否される
+    assert TestClient(app).post("/latest/users/").status_code == 403
+
+
+def test_shutdown_drains_hooks_and_rejects_new_requests(app, monkeypatch):
+    """
+    lifespan の終了でドレインフックが実行され、ドレイン後の新規リクエストが 503 になることを検証します。
+    """
+    called = []
+
+    async def hook():
+        called.append(READINESS.is_ready)
+
+    monkeypatch.setitem(shutdown._DRAIN_HOOKS, "test", hook)
+    with TestClient(app) as running:
+        assert running.get("/latest/healthcheck").status_code == 200
+    assert called == [False]  # ready を落としてからフックを実行
+    assert DRAIN.drained is True
+
+    response = TestClient(app).get("/latest/healthcheck")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    # プローブはドレイン中も応答する
+    assert TestClient(app).get("/livez").status_code == 200
+
+
+def test_route_manifest_rescans_only_on_content_change(tmp_path, monkeypatch, capsys):
+    """
+    mtime だけの変更では再走査せず、内容の変更・ファイルの追加で再生成し、--check の終了コードが鮮度と一致することを検証します。
+    """
+    # 走査対象ファイルを一時ディレクトリに複製し、鮮度判定をそこで行う (走査自体は実際のパッケージ)
+    for rel_path in (*route_manifest.SCANNER_FILES, "routers/__init__.py", "middlewares/__init__.py"):
+        target = tmp_path / rel_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(route_manifest.BASE_DIR / rel_path, target)
+    router_file = tmp_path / "routers" / "example.py"
+    router_file.write_text("VALUE = 1\n")
+    monkeypatch.setattr(route_manifest, "BASE_DIR", tmp_path)
+
+    scans = []
+    scan_manifest = route_manifest.scan_manifest
+    monkeypatch.setattr(route_manifest, "scan_manifest", lambda: scans.append(1) or scan_manifest())
+    path = tmp_path / "route_manifest.json"
+
+    def check():
+        monkeypatch.setattr(sys, "argv", ["route_manifest", "--check", "--path", str(path)])
+        try:
+            route_manifest.main()
+        except SystemExit as e:
+            return e.code
+        return 0
+
+    assert check() == 1  # マニフェストなし
+    manifest = route_manifest.load_route_manifest(path)
+    assert len(scans) == 1 and "websockets" not in manifest
+    scans.clear()
+    assert route_manifest.load_route_manifest(path) == manifest and scans == []
+
+    # チェックアウトなどで mtime だけが変わった場合は内容で判定し、再走査しない
+    stat = router_file.stat()
+    os.utime(router_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert route_manifest.load_route_manifest(path) == manifest and scans == []
+
+    # --check は最新の場合に走査結果とも照合する
+    assert check() == 0 and len(scans) == 1
+    scans.clear()
+
+    router_file.write_text("VALUE = 2\n")
+    assert check() == 1
+    route_manifest.load_route_manifest(path)
+    assert len(scans) == 1
+
+    (tmp_path / "routers" / "added.py").write_text("VALUE = 3\n")
+    assert check() == 1
+    assert "routers/added.py" in route_manifest.load_route_manifest(path)["files"]
+    assert len(scans) == 2
+    assert check() == 0
+    assert "is up to date" in capsys.readouterr().out
@@ -0,0 +1,553 @@
+"""
+test_websocket.py
+
+WebSocket チャットのテスト
+
+このモジュールでは、以下を検証します：
+
+1. セッションチケットで接続したクライアント間でメッセージが配信されること
+2. 送信が詰まった接続でも broadcast が待たされず、上限超過時に方針どおり破棄・切断されること
+3. ドレイン時に全接続へ 1012 と再接続ヒントを含むクローズフレームが送られること
+4. ルームの購読者だけに配信され、ダイレクトメッセージが宛先ユーザーにだけ届くこと
+5. 複数宛ての配信が 1 回だけ生成したフレームで届き、圧縮をネゴシエートした接続では通常の送信になること
+6. Unix ソケットのハブを介して全ワーカー (送信元を含む) へ同じ順序で配信され、ハブ停止中は自ワーカーにだけ届くこと
+7. msgpack サブプロトコルで待機時間内のメッセージが 1 フレームにまとまり (JSON で表せない値はエラーを返す)、
+   しきい値未満のメッセージは圧縮されないこと
+8. タイマーホイールが期限どおりに発火し、ping に応答しない接続だけがアイドル期限で切断されること
+9. ルームの履歴が件数・バイト数の上限内で保持され、再接続時に last_seq より後のメッセージだけが再送されること
+10. 複数ワーカーでも連番と epoch がハブで 1 回だけ割り当てられ、再起動したワーカーや別ワーカーからも続きを再送できること
+"""
+
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import anyio
+import msgpack
+import pytest
+import uvicorn
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+from websockets.sync.client import connect
+
+from middlewares.ws_transport_middleware import WebSocketTransportMiddleware
+from routers.ws.chat import close_all_for_restart, manager
+from services.chat_bus import KIND_ROOM, KIND_USER, ChatBusHub, UnixSocketBus
+from services.connection_manager import (
+    DISCONNECT,
+    DROP_OLDEST,
+    IDLE_CLOSE_CODE,
+    PING_MESSAGE,
+    ClientConnection,
+    ConnectionManager,
+)
+from utils.ring_buffer import SequencedRingBuffer
+from utils.session_ticket import issue_ticket
+from utils.timer_wheel import TimerWheel
+from utils.ws_codec import SUBPROTOCOL_MSGPACK
+from utils.ws_deflate import ThresholdPerMessageDeflateFactory
+from utils.ws_frames import PreparedMessage, build_frame
+
+
+@pytest.fixture
+def ticket(client):
+    """
+    WebSocket 用のセッションチケット (署名鍵は環境情報の SECRET から導出)。
+    """
+    return issue_ticket("user-1", ["ws"])[0]
+
+
+class StalledWebSocket:
+    """
+    送信が完了しない (受信側が読まない) クライアントを模した WebSocket。
+    """
+
+    client = ("127.0.0.1", 0)
+    scope = {"type": "websocket"}
+
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.release = anyio.Event()
+
+    async def send_text(self, message):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def receive_text(self):
+        await anyio.sleep_forever()
+
+    async def close(self, code, reason=""):
+        self.closed = (code, reason)
+
+
+def test_broadcast_between_clients(app, ticket):
+    """
+    あるクライアントが送ったメッセージが、送信元を含む全クライアントへ届くことを検証します。
+    """
+    with TestClient(app) as running:
+        with running.websocket_connect(f"/ws/chat/1?token={ticket}") as first:
+            with running.websocket_connect(f"/ws/chat/2?token={ticket}") as second:
+                for sender, text in ((first, "hello"), (second, "world")):
+                    sender.send_text(text)
+                    assert first.receive_text() == text
+                    assert second.receive_text() == text
+
+
+def test_slow_consumer_overflow_policies():
+    """
+    drop_oldest は古いメッセージを捨てて新しいものを残し、disconnect は指定コードで切断することを検証します。
+    """
+
+    async def scenario(policy):
+        ws = StalledWebSocket()
+        connection = ClientConnection(ws, "1", "user-1", max_queue=2, overflow_policy=policy, overflow_close_code=4008)
+
+        async def noop(message):
+            pass
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(connection.serve, noop)
+            await anyio.sleep(0.01)
+            # writer は 1 件目の送信で止まったまま、以降はキューに溜まる
+            results = [connection.enqueue("m0")]
+            await anyio.sleep(0.01)
+            results += [connection.enqueue(f"m{i}") for i in range(1, 5)]
+            await anyio.sleep(0.01)
+            if policy == DROP_OLDEST:
+                ws.release.set()
+                await anyio.sleep(0.01)
+                connection.close(1000)
+            await connection.closed.wait()
+        return ws, connection, results
+
+    ws, connection, results = anyio.run(scenario, DROP_OLDEST)
+    assert all(results)
+    assert ws.sent == ["m0", "m3", "m4"]
+    assert connection.dropped == 2
+
+    ws, connection, results = anyio.run(scenario, DISCONNECT)
+    assert results == [True, True, True, False, False]
+    assert ws.closed == (4008, "send queue overflow")
+    assert ws.sent == []
+
+
+def test_close_all_sends_reconnect_hint(app, ticket, monkeypatch):
+    """
+    ドレインフックが全接続へ 1012 と再接続待機時間 (設定範囲内) を含むクローズ理由を送ることを検証します。
+    """
+    monkeypatch.setattr("commons.settings.settings.ws_reconnect_hint_min_ms", 100)
+    monkeypatch.setattr("commons.settings.settings.ws_reconnect_hint_max_ms", 200)
+
+    with TestClient(app) as running:
+        with running.websocket_connect(f"/ws/chat/1?token={ticket}") as first:
+            with running.websocket_connect(f"/ws/chat/2?token={ticket}") as second:
+                running.portal.call(close_all_for_restart)
+                for ws in (first, second):
+                    message = ws.receive()
+                    assert message["type"] == "websocket.close"
+                    assert message["code"] == 1012
+                    assert 100 <= json.loads(message["reason"])["reconnect_after_ms"] <= 200
+    assert manager.connections == {}
+
+
+def test_rooms_and_direct_messages(app, ticket):
+    """
+    publish は購読者だけに、direct は宛先 uid の接続だけに届き、解除後は届かないことを検証します。
+    """
+    other_ticket = issue_ticket("user-2", ["ws"])[0]
+    with TestClient(app) as running:
+        with running.websocket_connect(f"/ws/chat/1?token={ticket}") as first:
+            with running.websocket_connect(f"/ws/chat/2?token={other_ticket}") as second:
+                first.send_json({"type": "subscribe", "room": "r1"})
+                subscribed = first.receive_json()
+                assert subscribed["type"] == "subscribed" and subscribed["room"] == "r1"
+                assert subscribed["seq"] == 0
+                assert manager.stats()["rooms"] == 2  # 既定ルーム + r1
+
+                first.send_json({"type": "publish", "room": "r1", "data": {"text": "hi"}})
+                assert first.receive_json() == {
+                    "type": "message",
+                    "seq": 1,
+                    "room": "r1",
+                    "from": "user-1",
+                    "data": {"text": "hi"},
+                }
+
+                # second は r1 を購読していないので受け取らず、未購読ルームへの publish はエラー
+                second.send_json({"type": "publish", "room": "r1", "data": "x"})
+                assert second.receive_json() == {"type": "error", "detail": "not subscribed", "room": "r1"}
+
+                first.send_json({"type": "direct", "to": "user-2", "data": "psst"})
+                assert second.receive_json() == {"type": "direct", "from": "user-1", "data": "psst"}
+                first.send_json({"type": "direct", "to": "nobody", "data": "?"})
+                assert first.receive_json()["detail"] == "recipient is not connected"
+
+                # 生のテキストは従来どおり既定ルーム (全員) へ
+                second.send_text("raw")
+                assert first.receive_text() == "raw"
+                assert second.receive_text() == "raw"
+
+                first.send_json({"type": "unsubscribe", "room": "r1"})
+                assert first.receive_json() == {"type": "unsubscribed", "room": "r1"}
+                assert manager.stats()["rooms"] == 1
+
+
+def test_build_frame_matches_websockets_serialization():
+    """
+    事前生成したフレームが websockets ライブラリのシリアライズ結果と一致することを検証します (長さ 3 形式)。
+    """
+    for size in (5, 300, 70_000):
+        payload = "あ" * (size // 3) or "x"
+        expected = Frame(Opcode.TEXT, payload.encode()).serialize(mask=False)
+        assert PreparedMessage(payload).frame == expected
+    assert build_frame(b"\x00\x01", text=False)[:2] == b"\x82\x02"
+
+
+def test_broadcast_writes_prepared_frames_over_uvicorn():
+    """
+    実際の uvicorn (websockets 実装) 上で、複数宛ての配信が生成済みフレームの直接書き込みで届くことを検証します。
+    """
+    manager = ConnectionManager()
+    ws_app = FastAPI()
+
+    @ws_app.websocket("/ws")
+    async def endpoint(websocket: WebSocket):
+        connection = await manager.connect(websocket, "user")
+
+        async def on_message(data: str) -> None:
+            manager.broadcast(data)
+
+        try:
+            await connection.serve(on_message)
+        finally:
+            manager.disconnect(connection)
+
+    ws_app.add_middleware(WebSocketTransportMiddleware)
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    config = uvicorn.Config(ws_app, ws="websockets", ws_per_message_deflate=True, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.01)
+        url = f"ws://127.0.0.1:{port}/ws"
+        # 1 つ目と 2 つ目は圧縮なし (生成済みフレーム)、3 つ目は permessage-deflate (通常の送信)
+        with connect(url, compression=None) as first, connect(url, compression=None) as second:
+            with connect(url) as compressed:
+                first.send("hello " * 50)
+                for client in (first, second, compressed):
+                    assert client.recv(timeout=5) == "hello " * 50
+                usable = sorted(connection._frames._usable for connection in manager.connections.values())
+                assert usable == [False, True, True]
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+@pytest.fixture
+def bus_path():
+    """
+    チャット配信ハブのソケットパス (Unix ソケットのパス長制限があるため /tmp 直下の一時ディレクトリ)。
+    """
+    with tempfile.TemporaryDirectory(dir="/tmp") as directory:
+        yield os.path.join(directory, "bus.sock")
+
+
+def test_unix_socket_bus_preserves_order_across_workers(bus_path):
+    """
+    3 ワーカー分のバスが交互に配信しても全ワーカーが同じ順序で受け取り、ハブがない間はローカル配信になることを検証します。
+    """
+    path = bus_path
+    received = {name: [] for name in ("a", "b", "c")}
+    buses = {}
+    for name in received:
+        buses[name] = UnixSocketBus(path, reconnect_min=0.01, reconnect_max=0.05)
+        buses[name].bind(lambda kind, target, data, seq, name=name: received[name].append((kind, target, data)) or 1)
+
+    async def scenario():
+        assert buses["a"].publish(KIND_ROOM, "r", "local") == 1
+        assert received == {"a": [(KIND_ROOM, "r", "local")], "b": [], "c": []}
+        received["a"].clear()
+
+        hub = ChatBusHub(path)
+        async with anyio.create_task_group() as tg:
+            await tg.start(hub.serve)
+            for bus in buses.values():
+                tg.start_soon(bus.run)
+            with anyio.fail_after(5):
+                while len(hub.peers) < 3 or not all(bus.connected for bus in buses.values()):
+                    await anyio.sleep(0.01)
+
+            for i in range(100):
+                for name, bus in buses.items():
+                    assert bus.publish(KIND_ROOM, "r", f"{name}{i}") is None
+            buses["b"].publish(KIND_USER, "u", b"\x00bin")
+            with anyio.fail_after(5):
+                while any(len(messages) < 301 for messages in received.values()):
+                    await anyio.sleep(0.01)
+            tg.cancel_scope.cancel()
+
+    anyio.run(scenario)
+    assert received["a"] == received["b"] == received["c"]
+    assert (KIND_USER, "u", b"\x00bin") in received["a"]
+    for name in buses:
+        own = [data for _, _, data in received["a"] if isinstance(data, str) and data.startswith(name)]
+        assert own == [f"{name}{i}" for i in range(100)]
+
+
+def test_msgpack_subprotocol_batches_messages(app, ticket):
+    """
+    待機時間内に追加されたメッセージが上限件数ごとに msgpack の配列 1 フレームで送られ、
+    ネゴシエートした接続ではマップで購読できることを検証します。
+    """
+
+    class RecordingWebSocket(StalledWebSocket):
+        async def send_bytes(self, data):
+            self.sent.append(msgpack.unpackb(data))
+
+        async def receive(self):
+            await anyio.sleep_forever()
+
+    async def scenario():
+        ws = RecordingWebSocket()
+        connection = ClientConnection(
+            ws, "1", "user-1", 100, subprotocol=SUBPROTOCOL_MSGPACK, batch_window=0.05, batch_max_messages=3
+        )
+
+        async def noop(message):
+            pass
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(connection.serve, noop)
+            connection.enqueue('{"type":"message","data":1}')
+            connection.enqueue("raw")
+            await anyio.sleep(0.01)
+            for message in (PreparedMessage(b"\x00"), "late", "over"):
+                connection.enqueue(message)
+            await anyio.sleep(0.2)
+            connection.close(1000)
+        return ws, connection
+
+    ws, connection = anyio.run(scenario)
+    assert ws.sent == [[{"type": "message", "data": 1}, "raw", b"\x00"], ["late", "over"]]
+    assert (connection.sent, connection.frames) == (5, 2)
+
+    with TestClient(app) as running:
+        with running.websocket_connect(f"/ws/chat/1?token={ticket}", subprotocols=[SUBPROTOCOL_MSGPACK]) as client:
+            assert client.accepted_subprotocol == SUBPROTOCOL_MSGPACK
+            client.send_bytes(msgpack.packb({"type": "subscribe", "room": "r1"}))
+            [subscribed] = msgpack.unpackb(client.receive_bytes())
+            assert subscribed["type"] == "subscribed" and subscribed["room"] == "r1"
+
+            # JSON で表せない値 (bin) はエラーを返し、接続は維持される
+            for message in (
+                {"type": "publish", "room": "r1", "data": b"\x00\x01"},
+                {"type": "direct", "to": "user-2", "data": {"blob": b"x"}},
+                [b"raw"],
+            ):
+                client.send_bytes(msgpack.packb(message))
+                assert msgpack.unpackb(client.receive_bytes()) == [{"type": "error", "detail": "unsupported payload"}]
+            client.send_bytes(msgpack.packb({"type": "publish", "room": "r1", "data": "ok"}))
+            [published] = msgpack.unpackb(client.receive_bytes())
+            assert published["data"] == "ok"
+
+
+def test_deflate_skips_messages_below_threshold():
+    """
+    しきい値未満のメッセージは RSV1 なし (非圧縮) で送られ、圧縮メッセージと混在してもクライアント側で復元できることを検証します。
+    """
+    _, extension = ThresholdPerMessageDeflateFactory(min_size=100).process_request_params([], [])
+    client = PerMessageDeflate(False, False, 15, 15)
+    for data in (b"x" * 500, b"small", b"y" * 500, b"x" * 500):
+        encoded = extension.encode(Frame(Opcode.TEXT, data))
+        assert encoded.rsv1 == (len(data) >= 100)
+        assert client.decode(encoded).data == data
+
+
+def test_timer_wheel_fires_at_deadline():
+    """
+    期限の刻みで発火し、取り消し・再設定・スロット数を超える遅延 (周回待ち) を正しく扱うことを検証します。
+    """
+    now = [0.0]
+    wheel = TimerWheel(tick=1.0, slots=8, clock=lambda: now[0])
+    wheel.schedule("a", 2.0)
+    wheel.schedule("b", 3.5)
+    wheel.schedule("c", 20.0)  # 8 スロットを 2 周以上
+    wheel.schedule("d", 1.0)
+    wheel.cancel("d")
+    wheel.schedule("a", 5.0)  # 置き換え
+
+    fired = {}
+    for second in range(1, 25):
+        now[0] = second + 0.1
+        for key in wheel.advance():
+            fired[key] = second
+    assert fired == {"b": 4, "a": 5, "c": 20}
+    assert len(wheel) == 0
+
+
+def test_heartbeat_evicts_unresponsive_connections():
+    """
+    ping に pong で応答する接続は維持され、応答しない接続はアイドル期限で 1001 により切断されることを検証します。
+    """
+
+    class PeerWebSocket(StalledWebSocket):
+        def __init__(self, responsive):
+            super().__init__()
+            self.responsive = responsive
+            self.pinged = anyio.Event()
+
+        async def accept(self, subprotocol=None):
+            pass
+
+        async def send_text(self, message):
+            self.sent.append(message)
+            if message == PING_MESSAGE and self.responsive:
+                self.pinged.set()
+
+        async def receive_text(self):
+            await self.pinged.wait()
+            self.pinged = anyio.Event()
+            return '{"type":"pong"}'
+
+    async def scenario():
+        manager = ConnectionManager(heartbeat_interval=0.05, idle_timeout=0.15, timer_tick=0.01, timer_slots=64)
+        alive, dead = PeerWebSocket(responsive=True), PeerWebSocket(responsive=False)
+
+        async def noop(message):
+            pass
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(manager.run_heartbeat)
+            for ws in (alive, dead):
+                connection = await manager.connect(ws, "user")
+                tg.start_soon(connection.serve, noop)
+            await anyio.sleep(0.4)
+            stats = manager.stats()
+            tg.cancel_scope.cancel()
+        return alive, dead, stats
+
+    alive, dead, stats = anyio.run(scenario)
+    assert dead.closed == (IDLE_CLOSE_CODE, "idle timeout")
+    assert PING_MESSAGE in dead.sent
+    assert alive.closed is None
+    assert alive.sent.count(PING_MESSAGE) >= 3
+    assert stats["evicted"] == 1
+
+
+def test_ring_buffer_bounds_and_since():
+    """
+    件数・バイト数の上限を超えた古い要素が破棄され、since が欠落の有無を正しく返すことを検証します。
+    """
+    # サイズは文字数ではなく UTF-8 のバイト数で数える ("ああ" は 6 バイト)
+    buffer = SequencedRingBuffer(capacity=3, max_bytes=20)
+    assert [buffer.append(text) for text in ("ああ", "bb", "いい", "dd")] == [1, 2, 3, 4]
+    assert (buffer.first_seq, buffer.last_seq, buffer.bytes) == (2, 4, 10)
+    assert buffer.since(2) == ([(3, "いい"), (4, "dd")], True)
+    assert buffer.since(1) == ([(2, "bb"), (3, "いい"), (4, "dd")], True)
+    assert buffer.since(0) == ([(2, "bb"), (3, "いい"), (4, "dd")], False)  # 1 は破棄済み
+    assert buffer.since(4) == ([], True)
+    assert buffer.since(9)[1] is False  # 別のバッファの連番
+
+    buffer.append("う" * 5)  # 15 バイト: 件数の上限で bb、バイト数の上限で いい も破棄
+    assert (buffer.first_seq, buffer.last_seq, buffer.bytes) == (4, 5, 17)
+
+
+def test_resume_replays_missed_room_messages(app, ticket):
+    """
+    切断中に publish されたメッセージが、last_seq と epoch を付けた再接続で 1 つの history メッセージとして届くことを検証します。
+    """
+    other_ticket = issue_ticket("user-2", ["ws"])[0]
+    with TestClient(app) as running:
+        with running.websocket_connect(f"/ws/chat/2?token={other_ticket}") as publisher:
+            publisher.send_json({"type": "subscribe", "room": "r1"})
+            assert publisher.receive_json()["type"] == "subscribed"
+            with running.websocket_connect(f"/ws/chat/1?token={ticket}") as first:
+                first.send_json({"type": "subscribe", "room": "r1"})
+                subscribed = first.receive_json()
+                publisher.send_json({"type": "publish", "room": "r1", "data": 1})
+                assert first.receive_json()["seq"] == subscribed["seq"] + 1
+                assert publisher.receive_json()["data"] == 1
+
+            # first の切断中に 2 件 (切断通知 "Client #1 left chat" は読み飛ばす)
+            for data in (2, 3):
+                publisher.send_json({"type": "publish", "room": "r1", "data": data})
+                text = publisher.receive_text()
+                if not text.startswith("{"):
+                    text = publisher.receive_text()
+                assert json.loads(text)["data"] == data
+
+            with running.websocket_connect(f"/ws/chat/1?token={ticket}") as first:
+                last_seq = subscribed["seq"] + 1
+                first.send_json({"type": "subscribe", "room": "r1", "last_seq": last_seq, "epoch": subscribed["epoch"]})
+                assert first.receive_json()["seq"] == last_seq + 2
+                history = first.receive_json()
+                assert history["type"] == "history" and history["complete"] is True
+                assert history["seq"] == last_seq + 2
+                assert [(m["seq"], m["data"]) for m in history["messages"]] == [(last_seq + 1, 2), (last_seq + 2, 3)]
+
+                # epoch が異なる (別ワーカー・再起動後) 場合は保持しているすべてを欠落ありとして返す
+                first.send_json({"type": "subscribe", "room": "r1", "last_seq": last_seq, "epoch": "other"})
+                first.receive_json()
+                history = first.receive_json()
+                assert history["complete"] is False and history["epoch"] == subscribed["epoch"]
+                assert [m["data"] for m in history["messages"]][-3:] == [1, 2, 3]
+
+
+def test_room_sequence_is_shared_across_workers(bus_path):
+    """
+    ハブが割り当てた連番で全ワーカーが同じように記録し、再起動したワーカーでも連番が続いて、
+    別ワーカーで受け取った last_seq と epoch で欠落なく再送できることを検証します。
+    """
+
+    def worker():
+        return ConnectionManager(bus=UnixSocketBus(bus_path, reconnect_min=0.01, reconnect_max=0.05), history_size=10)
+
+    async def wait_until(predicate):
+        with anyio.fail_after(5):
+            while not predicate():
+                await anyio.sleep(0.01)
+
+    def last_seq(manager):
+        return manager.room_history("r").last_seq
+
+    async def scenario():
+        hub = ChatBusHub(bus_path)
+        a, b, c = worker(), worker(), worker()
+        async with anyio.create_task_group() as tg:
+            await tg.start(hub.serve)
+            tg.start_soon(a.bus.run)
+            async with anyio.create_task_group() as restarted:
+                restarted.start_soon(b.bus.run)
+                await wait_until(lambda: a.bus.epoch and b.bus.epoch)
+                a.publish("r", '{"n":1}', record=True)
+                b.publish("r", '{"n":2}', record=True)
+                await wait_until(lambda: last_seq(a) == last_seq(b) == 2)
+                restarted.cancel_scope.cancel()
+
+            # b の停止中の 1 件は、後から起動した c には届かない
+            a.publish("r", '{"n":3}', record=True)
+            tg.start_soon(c.bus.run)
+            await wait_until(lambda: c.bus.epoch)
+            c.publish("r", '{"n":4}', record=True)
+            a.publish("r", '{"n":5}', record=True)
+            await wait_until(lambda: last_seq(a) == last_seq(c) == 5)
+            tg.cancel_scope.cancel()
+        return hub, a, c
+
+    hub, a, c = anyio.run(scenario)
+    epoch = hub.sequencer.epoch
+    assert a.bus.epoch == c.bus.epoch == epoch
+    assert a.replay("r", 0, epoch) == (epoch, 5, [f'{{"seq":{n},"n":{n}}}' for n in range(1, 6)], True)
+    # c は途中から受信したため 4 以降のみ保持するが、a で受け取った last_seq=3 からは欠落なく再送できる
+    assert c.replay("r", 3, epoch) == (epoch, 5, ['{"seq":4,"n":4}', '{"seq":5,"n":5}'], True)
+    assert c.replay("r", 2, epoch)[3] is False
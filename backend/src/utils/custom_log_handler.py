@@ -2,12 +2,15 @@
 # -*- coding: utf-8 -*-
 
 import gzip
+import logging
 import os
 import shutil
 from datetime import datetime, timedelta
 from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+
+from commons.settings import settings
 
 
 class CustomTimedRotatingFileHandler(TimedRotatingFileHandler):
@@ -83,3 +86,27 @@ class CustomTimedRotatingFileHandler(TimedRotatingFileHandler):
             print(f"[Compressed] {file_path.name} -> {compressed.name}")
         except Exception as e:
             print(f"[CompressFail] {file_path.name}: {e}")
+
+
+class ProbeAccessLogFilter(logging.Filter):
+    """
+    uvicorn のアクセスログからヘルスチェックプローブを除外するフィルタ。
+
+    uvicorn.access のレコード引数は (client_addr, method, full_path, http_version, status_code)。
+
+    Args:
+        paths (Optional[Iterable[str]]): 除外するパス (クエリ文字列は無視)
+            (省略時は ProbeMiddleware と同じ PROBE_LIVENESS_PATH / PROBE_READINESS_PATH)
+    """
+
+    def __init__(self, paths: Optional[Iterable[str]] = None):
+        super().__init__()
+        if paths is None:
+            paths = (settings.probe_liveness_path, settings.probe_readiness_path)
+        self.paths = frozenset(paths)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args
+        if isinstance(args, tuple) and len(args) >= 3 and isinstance(args[2], str):
+            return args[2].partition("?")[0] not in self.paths
+        return True
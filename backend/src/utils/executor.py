@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブロッキング処理用エグゼキュータモジュール
+
+同期 DB アクセスや Firebase SDK 呼び出し、CPU を使うハッシュ計算など、
+イベントループを塞ぐ処理をリソース種別ごとのスレッドプールで実行します。
+
+・リソース種別 (db / auth / cpu) ごとに anyio.CapacityLimiter で同時実行数を制限
+・キュー待ち時間と実行時間をメトリクスとして記録
+・ルーター／サービスから使うヘルパー (run_db, run_auth, run_cpu) を提供
+
+Usage:
+    infos = await run_db(repository.fetch_all)
+    decoded = await run_auth(auth.verify_id_token, token)
+"""
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from commons.settings import settings
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.executor")
+
+T = TypeVar("T")
+
+
+@dataclass
+class ExecutorStats:
+    """
+    エグゼキュータごとの実行メトリクス。
+
+    Attributes:
+        submitted (int): 投入されたタスク数
+        completed (int): 完了したタスク数 (例外終了を含む)
+        failed (int): 例外で終了したタスク数
+        in_flight (int): 実行中またはキュー待ちのタスク数
+        total_wait_seconds (float): キュー待ち時間の合計
+        max_wait_seconds (float): キュー待ち時間の最大値
+        total_run_seconds (float): 実行時間の合計
+        max_run_seconds (float): 実行時間の最大値
+    """
+
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    in_flight: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    total_run_seconds: float = 0.0
+    max_run_seconds: float = 0.0
+
+
+class BlockingExecutor:
+    """
+    同時実行数を制限したスレッド実行レイヤ。
+
+    Args:
+        name (str): リソース種別名 (ログ・メトリクス用)
+        max_threads (int): 同時に実行できるスレッド数
+    """
+
+    def __init__(self, name: str, max_threads: int):
+        self.name = name
+        self.max_threads = max_threads
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+        self._stats = ExecutorStats()
+        self._lock = threading.Lock()
+
+    @property
+    def limiter(self) -> anyio.CapacityLimiter:
+        """
+        CapacityLimiter を遅延生成して返します。
+        """
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.max_threads)
+        return self._limiter
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        同期関数をこのエグゼキュータのスレッドで実行し、結果を返します。
+
+        Args:
+            func (Callable[..., T]): 実行する同期関数
+            *args: 位置引数
+            **kwargs: キーワード引数
+
+        Returns:
+            T: func の戻り値
+        """
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self._stats.submitted += 1
+            self._stats.in_flight += 1
+
+        def _call() -> T:
+            started_at = time.perf_counter()
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self._record(started_at - submitted_at, time.perf_counter() - started_at, failed)
+
+        try:
+            return await anyio.to_thread.run_sync(_call, limiter=self.limiter)
+        finally:
+            with self._lock:
+                self._stats.in_flight -= 1
+
+    def _record(self, wait: float, run: float, failed: bool) -> None:
+        """
+        1 タスク分のメトリクスを記録します (ワーカースレッドから呼ばれます)。
+        """
+        with self._lock:
+            stats = self._stats
+            stats.completed += 1
+            stats.failed += int(failed)
+            stats.total_wait_seconds += wait
+            stats.max_wait_seconds = max(stats.max_wait_seconds, wait)
+            stats.total_run_seconds += run
+            stats.max_run_seconds = max(stats.max_run_seconds, run)
+        LOGGER.debug(f"[Executor:{self.name}] wait={wait * 1000:.2f}ms run={run * 1000:.2f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        現在のメトリクスのスナップショットを返します。
+
+        Returns:
+            Dict[str, Any]: メトリクス (上限スレッド数を含む)
+        """
+        with self._lock:
+            snapshot = asdict(self._stats)
+        snapshot["max_threads"] = self.max_threads
+        return snapshot
+
+
+# リソース種別ごとのエグゼキュータ
+DB_EXECUTOR = BlockingExecutor("db", settings.executor_db_threads)
+AUTH_EXECUTOR = BlockingExecutor("auth", settings.executor_auth_threads)
+CPU_EXECUTOR = BlockingExecutor("cpu", settings.executor_cpu_threads)
+
+EXECUTORS: Dict[str, BlockingExecutor] = {
+    executor.name: executor for executor in (DB_EXECUTOR, AUTH_EXECUTOR, CPU_EXECUTOR)
+}
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    同期 DB 処理 (セッションクエリなど) を DB 用スレッドプールで実行します。
+    """
+    return await DB_EXECUTOR.run(func, *args, **kwargs)
+
+
+async def run_auth(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    認証 SDK 呼び出し (トークン検証など) を認証用スレッドプールで実行します。
+    """
+    return await AUTH_EXECUTOR.run(func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    CPU を使う処理 (大きなボディのハッシュ計算など) を CPU 用スレッドプールで実行します。
+    """
+    return await CPU_EXECUTOR.run(func, *args, **kwargs)
+
+
+def get_executor_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    全エグゼキュータのメトリクスを返します。
+
+    Returns:
+        Dict[str, Dict[str, Any]]: エグゼキュータ名 → メトリクス
+    """
+    return {name: executor.stats() for name, executor in EXECUTORS.items()}
@@ -1,27 +1,58 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
 import logging
 import os
+import threading
 from typing import Any, Dict
 
-import firebase_admin
 from fastapi import HTTPException, Security, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from firebase_admin import auth, credentials
-from firebase_admin import exceptions as firebase_exceptions
+
+from commons.settings import settings
+from utils import firebase_jwks
+from utils.executor import run_auth
+from utils.lazy_import import lazy_import
+from utils.session_ticket import (
+    SCOPE_API,
+    SCOPE_WS,
+    ExpiredTicketError,
+    InvalidTicketError,
+    is_session_ticket,
+    verify_ticket,
+)
+from utils.token_cache import TOKEN_CACHE
 
 # Uvicorn 用ロガー取得
 LOGGER = logging.getLogger("uvicorn.auth")
 
+# Firebase Admin SDK は初回の認証時 (SDK 初期化時、認証用スレッド内) にインポートする
+firebase_admin = lazy_import("firebase_admin")
+auth = lazy_import("firebase_admin.auth")
+credentials = lazy_import("firebase_admin.credentials")
+
 # セキュリティスキーマ (Bearer Token)
 security = HTTPBearer()
 
 # Firebase Admin SDK 初期化 (singleton)
 FIREBASE_APP = None
+# 初期化は認証用スレッドプールから並行に呼ばれ得るため、確認と初期化をまとめて排他する
+# (二重に initialize_app すると "default app already exists" で失敗する)
+_FIREBASE_APP_LOCK = threading.Lock()
+
+# サービスアカウントファイルのパス
+SERVICE_ACCOUNT_PATH = "./utils/firebase_service_account.json"
 
 
-def _initialize_firebase_app():
+def is_firebase_configured() -> bool:
+    """
+    Firebase サービスアカウントファイルが配置されているかどうか。
+    """
+    return os.path.isfile(SERVICE_ACCOUNT_PATH)
+
+
+def initialize_firebase_app():
     """
     Firebase Admin SDK を初期化します。
     SERVICE_ACCOUNT_PATH 環境変数またはデフォルトパスから認証情報を読み込む。
@@ -30,61 +61,214 @@ def _initialize_firebase_app():
     if FIREBASE_APP is not None:
         return FIREBASE_APP
 
-    sa_path = "./utils/firebase_service_account.json"
-    if not os.path.isfile(sa_path):
-        LOGGER.error(f"Firebase service account file not found: {sa_path}")
-        raise RuntimeError("Firebase service account file is missing.")
+    with _FIREBASE_APP_LOCK:
+        # ロック待ちの間に別スレッドが初期化を終えていればそれを使う
+        if FIREBASE_APP is not None:
+            return FIREBASE_APP
+
+        sa_path = SERVICE_ACCOUNT_PATH
+        if not os.path.isfile(sa_path):
+            LOGGER.error(f"Firebase service account file not found: {sa_path}")
+            raise RuntimeError("Firebase service account file is missing.")
+
+        try:
+            cred = credentials.Certificate(sa_path)
+            FIREBASE_APP = firebase_admin.initialize_app(cred)
+            LOGGER.info("Firebase Admin SDK initialized successfully.")
+            return FIREBASE_APP
+        except Exception as e:
+            LOGGER.error(f"Failed to initialize Firebase Admin SDK: {e}", exc_info=True)
+            raise RuntimeError("Unable to initialize Firebase Admin SDK.") from e
+
+
+class TokenVerificationError(Exception):
+    """
+    トークン検証の失敗 (HTTP／WebSocket それぞれの応答へ変換して使う)。
+
+    Attributes:
+        status_code (int): 対応する HTTP ステータス (401: トークン不正, 500: 内部エラー)
+        detail (str): エラー内容
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def get_project_id() -> str:
+    """
+    ローカル検証で使う Firebase プロジェクト ID を返します。
+    FIREBASE_PROJECT_ID が未設定ならサービスアカウントファイルの project_id を使います。
+    """
+    if settings.firebase_project_id:
+        return settings.firebase_project_id
+    if not is_firebase_configured():
+        raise RuntimeError("FIREBASE_PROJECT_ID is not set and service account file is missing.")
+    with open(SERVICE_ACCOUNT_PATH, encoding="utf-8") as f:
+        return json.load(f)["project_id"]
+
+
+def _verify_locally(token: str, check_revoked: bool) -> Dict[str, Any]:
+    """
+    メモリ上の公開鍵で ID トークンを検証します (認証用スレッドで実行)。
+    失効チェックを行う場合のみ、Admin SDK でユーザーの無効化・トークン失効時刻を確認します。
+    """
+    decoded = firebase_jwks.verify_id_token(token, get_project_id(), clock_skew=settings.firebase_clock_skew_seconds)
+    if check_revoked:
+        initialize_firebase_app()
+        user = auth.get_user(decoded["uid"])
+        if user.disabled:
+            raise TokenVerificationError(401, "Disabled Firebase user.")
+        # tokens_valid_after_timestamp はミリ秒
+        if decoded["auth_time"] * 1000 < (user.tokens_valid_after_timestamp or 0):
+            raise TokenVerificationError(401, "Revoked Firebase ID token.")
+    return decoded
+
 
+async def _verify_with_local_keys(token: str) -> Dict[str, Any]:
     try:
-        cred = credentials.Certificate(sa_path)
-        FIREBASE_APP = firebase_admin.initialize_app(cred)
-        LOGGER.info("Firebase Admin SDK initialized successfully.")
-        return FIREBASE_APP
+        return await run_auth(_verify_locally, token, TOKEN_CACHE.check_revoked)
+    except TokenVerificationError:
+        raise
+    except firebase_jwks.ExpiredIdTokenError:
+        raise TokenVerificationError(401, "Expired Firebase ID token.")
+    except firebase_jwks.InvalidIdTokenError as e:
+        LOGGER.debug(f"Invalid Firebase ID token: {e}")
+        raise TokenVerificationError(401, "Invalid Firebase ID token.")
     except Exception as e:
-        LOGGER.error(f"Failed to initialize Firebase Admin SDK: {e}", exc_info=True)
-        raise RuntimeError("Unable to initialize Firebase Admin SDK.") from e
+        LOGGER.error(f"Error verifying Firebase token: {e}", exc_info=True)
+        raise TokenVerificationError(500, "Internal authentication error.")
 
 
-async def verify_firebase_token(auth_credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict[str, Any]:
+async def _verify_with_sdk(token: str) -> Dict[str, Any]:
+    # Firebase SDK の初期化を試みる (初回のみ認証用スレッドプールで実行)
+    try:
+        if FIREBASE_APP is None:
+            await run_auth(initialize_firebase_app)
+    except Exception as e:
+        raise TokenVerificationError(500, str(e))
+
+    # Expired / Revoked は InvalidIdTokenError のサブクラスのため先に判定する
+    try:
+        return await run_auth(auth.verify_id_token, token, check_revoked=TOKEN_CACHE.check_revoked)
+    except auth.ExpiredIdTokenError:
+        raise TokenVerificationError(401, "Expired Firebase ID token.")
+    except auth.RevokedIdTokenError:
+        raise TokenVerificationError(401, "Revoked Firebase ID token.")
+    except auth.InvalidIdTokenError:
+        raise TokenVerificationError(401, "Invalid Firebase ID token.")
+    except auth.UserDisabledError:
+        raise TokenVerificationError(401, "Disabled Firebase user.")
+    except Exception as e:
+        LOGGER.error(f"Error verifying Firebase token: {e}", exc_info=True)
+        raise TokenVerificationError(500, "Internal authentication error.")
+
+
+async def _verify_token(token: str) -> Dict[str, Any]:
     """
-    HTTP(Bearer)トークンを検証し、Firebase ユーザー情報を返却します。
+    ID トークンを検証し、デコード済みクレームを返します (HTTP／WebSocket 共通)。
+    検証済みトークンキャッシュにヒットした場合は検証を行わず、ミスした場合のみ認証用スレッドプールで検証します。
+    (FIREBASE_VERIFIER=local ならメモリ上の公開鍵、それ以外は Admin SDK で検証)
 
     Args:
-        auth_credentials (HTTPAuthorizationCredentials): Authorization ヘッダーからの認証情報
+        token (str): Firebase ID トークン
 
     Returns:
         Dict[str, Any]: Firebase 認証済みユーザーデータ (uid, email など)
 
     Raises:
-        HTTPException: トークンが無効、期限切れ、または SDK 初期化失敗時
+        TokenVerificationError: トークンが無効、期限切れ、失効済み、または SDK 初期化失敗時
+    """
+    cached = TOKEN_CACHE.get(token)
+    if cached is not None:
+        return cached
+
+    if settings.firebase_verifier == "local":
+        decoded = await _verify_with_local_keys(token)
+    else:
+        decoded = await _verify_with_sdk(token)
+
+    TOKEN_CACHE.put(token, decoded)
+    LOGGER.debug(f"Token verified for uid={decoded.get('uid')}")
+    return decoded
+
+
+def _verify_session_ticket(token: str, scope: str) -> Dict[str, Any]:
+    """
+    セッションチケットを検証します (HMAC のみ、RSA 検証や SDK 呼び出しは行わない)。
+
+    Raises:
+        TokenVerificationError: チケットが不正、期限切れ、またはスコープ外の場合
     """
-    # Firebase SDK の初期化を試みる
     try:
-        _initialize_firebase_app()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return verify_ticket(token, scope)
+    except ExpiredTicketError:
+        raise TokenVerificationError(401, "Expired session ticket.")
+    except InvalidTicketError as e:
+        LOGGER.debug(f"Invalid session ticket: {e}")
+        raise TokenVerificationError(401, "Invalid session ticket.")
 
+
+def _bearer_token(auth_credentials: HTTPAuthorizationCredentials) -> str:
     token = auth_credentials.credentials
     if not token:
         LOGGER.warning("Authorization header missing or empty.")
         raise HTTPException(status_code=401, detail="Authorization header missing or empty.")
+    return token
+
+
+def _to_http_exception(e: TokenVerificationError) -> HTTPException:
+    if e.status_code == 401:
+        LOGGER.warning(e.detail)
+    return HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+async def verify_firebase_token(auth_credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict[str, Any]:
+    """
+    HTTP(Bearer)トークンを検証し、Firebase ユーザー情報を返却します。
+    Firebase ID トークンのほか、スコープ "api" を持つセッションチケットも受け付けます。
 
+    Args:
+        auth_credentials (HTTPAuthorizationCredentials): Authorization ヘッダーからの認証情報
+
+    Returns:
+        Dict[str, Any]: Firebase 認証済みユーザーデータ (uid, email など)
+
+    Raises:
+        HTTPException: トークンが無効、期限切れ、または SDK 初期化失敗時
+    """
+    token = _bearer_token(auth_credentials)
     try:
-        decoded = auth.verify_id_token(token)
-        LOGGER.debug(f"Token verified for uid={decoded.get('uid')}")
-        return decoded
-    except firebase_exceptions.InvalidIdTokenError:
-        LOGGER.warning("Invalid Firebase ID token.")
-        raise HTTPException(status_code=401, detail="Invalid Firebase ID token.")
-    except firebase_exceptions.ExpiredIdTokenError:
-        LOGGER.warning("Expired Firebase ID token.")
-        raise HTTPException(status_code=401, detail="Expired Firebase ID token.")
-    except firebase_exceptions.RevokedIdTokenError:
-        LOGGER.warning("Revoked Firebase ID token.")
-        raise HTTPException(status_code=401, detail="Revoked Firebase ID token.")
-    except Exception as e:
-        LOGGER.error(f"Error verifying Firebase token: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal authentication error.")
+        if is_session_ticket(token):
+            return _verify_session_ticket(token, SCOPE_API)
+        return await _verify_token(token)
+    except TokenVerificationError as e:
+        raise _to_http_exception(e)
+
+
+async def verify_firebase_id_token(
+    auth_credentials: HTTPAuthorizationCredentials = Security(security),
+) -> Dict[str, Any]:
+    """
+    Firebase ID トークンのみを受け付ける検証 (セッションチケットの発行など、チケットでは代替できない操作用)。
+
+    Args:
+        auth_credentials (HTTPAuthorizationCredentials): Authorization ヘッダーからの認証情報
+
+    Returns:
+        Dict[str, Any]: Firebase 認証済みユーザーデータ (uid, email, exp など)
+
+    Raises:
+        HTTPException: セッションチケットが渡された場合、またはトークンが無効な場合
+    """
+    token = _bearer_token(auth_credentials)
+    if is_session_ticket(token):
+        raise HTTPException(status_code=401, detail="Firebase ID token is required.")
+    try:
+        return await _verify_token(token)
+    except TokenVerificationError as e:
+        raise _to_http_exception(e)
 
 
 async def verify_firebase_token_ws(ws: WebSocket, token_param: str = "token") -> Dict[str, Any]:
@@ -92,6 +276,8 @@ async def verify_firebase_token_ws(ws: WebSocket, token_param: str = "token") ->
     WebSocket 接続用のトークン検証。
     - クエリパラメータ(token)または Sec-WebSocket-Protocol からトークンを取得し検証します。
 
+    Firebase ID トークンのほか、スコープ "ws" を持つセッションチケットも受け付けます。
+
     Args:
         ws (WebSocket): WS コネクションオブジェクト
         token_param (str): トークン取得用のキー名
@@ -102,14 +288,6 @@ async def verify_firebase_token_ws(ws: WebSocket, token_param: str = "token") ->
     Raises:
         WebSocketDisconnect: トークンが存在しないか検証失敗時に切断します
     """
-    # SDK 初期化
-    try:
-        _initialize_firebase_app()
-    except Exception as e:
-        LOGGER.error(f"WebSocket SDK init error: {e}", exc_info=True)
-        await ws.close(code=1011)
-        raise WebSocketDisconnect(code=1011)
-
     # クエリパラメータからトークン取得
     token = ws.query_params.get(token_param)
     # Sec-WebSocket-Protocol ヘッダから取得
@@ -124,20 +302,13 @@ async def verify_firebase_token_ws(ws: WebSocket, token_param: str = "token") ->
         await ws.close(code=4401)
         raise WebSocketDisconnect(code=4401)
 
-    # トークン検証
+    # トークン検証 (不正なトークンは 4401、内部エラーは 1011 で切断)
     try:
-        decoded = auth.verify_id_token(token)
-        LOGGER.debug(f"WebSocket token verified for uid={decoded.get('uid')}")
-        return decoded
-    except firebase_exceptions.InvalidIdTokenError:
-        LOGGER.warning("WebSocket: Invalid ID token.")
-        await ws.close(code=4401)
-        raise WebSocketDisconnect(code=4401)
-    except firebase_exceptions.ExpiredIdTokenError:
-        LOGGER.warning("WebSocket: Expired ID token.")
-        await ws.close(code=4401)
-        raise WebSocketDisconnect(code=4401)
-    except Exception as e:
-        LOGGER.error(f"WebSocket: Error verifying token: {e}", exc_info=True)
-        await ws.close(code=1011)
-        raise WebSocketDisconnect(code=1011)
+        if is_session_ticket(token):
+            return _verify_session_ticket(token, SCOPE_WS)
+        return await _verify_token(token)
+    except TokenVerificationError as e:
+        code = 4401 if e.status_code == 401 else 1011
+        LOGGER.warning(f"WebSocket: {e.detail}")
+        await ws.close(code=code)
+        raise WebSocketDisconnect(code=code)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Firebase ID トークンのローカル検証モジュール
+
+Firebase Admin SDK の verify_id_token は公開鍵 (Google の x509 証明書) を必要になった時点で取得するため、
+証明書のローテーション直後は取得を待つ間リクエストが止まります。
+このモジュールは公開鍵をメモリに保持し、Cache-Control の max-age に従って期限前にバックグラウンドで更新し、
+RS256 署名とクレームを cryptography で検証します (定常状態では I/O なし、署名検証 1 回のみ)。
+
+・FirebaseKeyStore: kid → 公開鍵 の保持、同期／非同期の取得、期限前のバックグラウンド更新
+・verify_id_token: ヘッダー (alg, kid)、署名、クレーム (aud, iss, sub, exp, iat, auth_time) の検証
+・FIREBASE_CERTS_URL を差し替えれば、テスト用のローカル鍵サーバーでも動作する
+
+Usage:
+    background.start_soon(FIREBASE_KEYS.run_refresher)    # lifespan で起動
+    claims = verify_id_token(token, project_id="my-project")  # 認証用スレッドで実行
+"""
+
+import base64
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import anyio
+import httpx
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from commons.settings import settings
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.auth.jwks")
+
+# Cache-Control が無い場合の公開鍵の有効期間 (秒)
+DEFAULT_MAX_AGE_SECONDS = 3600
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class InvalidIdTokenError(ValueError):
+    """
+    ID トークンの形式・署名・クレームが不正な場合に送出します。
+    """
+
+
+class ExpiredIdTokenError(InvalidIdTokenError):
+    """
+    ID トークンの有効期限 (exp) が切れている場合に送出します。
+    """
+
+
+class CertificateFetchError(Exception):
+    """
+    公開鍵 (x509 証明書) の取得・解析に失敗した場合に送出します。
+    """
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def parse_max_age(cache_control: Optional[str]) -> int:
+    """
+    Cache-Control ヘッダーから max-age (秒) を取り出します。
+
+    Args:
+        cache_control (Optional[str]): Cache-Control ヘッダーの値
+
+    Returns:
+        int: max-age (無い場合は DEFAULT_MAX_AGE_SECONDS)
+    """
+    match = _MAX_AGE_PATTERN.search(cache_control or "")
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE_SECONDS
+
+
+class FirebaseKeyStore:
+    """
+    Firebase の公開鍵 (kid → RSA 公開鍵) を保持するストア。
+
+    Args:
+        url (str): x509 証明書 (JSON: {kid: PEM}) の取得先
+        refresh_margin (float): max-age の期限のこの秒数前にバックグラウンド更新する
+        min_refresh_interval (float): 未知の kid による取得や失敗後の再試行の最小間隔 (秒)
+        clock (Callable[[], float]): 現在時刻 (UNIX 秒) を返す関数
+    """
+
+    def __init__(
+        self,
+        url: str,
+        refresh_margin: float = 300.0,
+        min_refresh_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self._clock = clock
+        self._keys: Dict[str, rsa.RSAPublicKey] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def expires_at(self) -> float:
+        """
+        保持している公開鍵の有効期限 (UNIX 秒)。
+        """
+        return self._expires_at
+
+    def _apply(self, response: httpx.Response) -> None:
+        """
+        証明書のレスポンスを解析して公開鍵を差し替えます (解析に失敗した場合は現在の鍵を維持)。
+        """
+        try:
+            response.raise_for_status()
+            certificates = response.json()
+            keys = {
+                kid: x509.load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+                for kid, pem in certificates.items()
+            }
+        except Exception as e:
+            raise CertificateFetchError(f"failed to load Firebase certificates: {e}") from e
+        if not keys or not all(isinstance(key, rsa.RSAPublicKey) for key in keys.values()):
+            raise CertificateFetchError("Firebase certificates must contain RSA public keys")
+
+        now = self._clock()
+        with self._lock:
+            self._keys = keys
+            self._expires_at = now + parse_max_age(response.headers.get("cache-control"))
+        LOGGER.info(f"[JWKS] 公開鍵を更新しました: kids={sorted(keys)} expires_in={self._expires_at - now:.0f}s")
+
+    def refresh(self) -> None:
+        """
+        公開鍵を同期的に取得します (認証用スレッドから呼ばれます)。
+        """
+        self._fetched_at = self._clock()
+        with httpx.Client(timeout=10.0) as client:
+            self._apply(client.get(self.url))
+
+    async def refresh_async(self) -> None:
+        """
+        公開鍵を非同期に取得します (バックグラウンド更新用)。
+        """
+        self._fetched_at = self._clock()
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            self._apply(await client.get(self.url))
+
+    def next_refresh_in(self) -> float:
+        """
+        次のバックグラウンド更新までの秒数を返します。
+        """
+        return max(self._expires_at - self.refresh_margin - self._clock(), self.min_refresh_interval)
+
+    async def run_refresher(self) -> None:
+        """
+        期限の refresh_margin 秒前に公開鍵を更新し続けます (キャンセルされるまで実行)。
+        失敗した場合は現在の鍵を使い続け、min_refresh_interval 秒後に再試行します。
+        """
+        while True:
+            if self._keys:
+                await anyio.sleep(self.next_refresh_in())
+            try:
+                await self.refresh_async()
+            except Exception as e:
+                LOGGER.warning(f"[JWKS] 公開鍵の更新に失敗しました: {e}")
+                if not self._keys:
+                    await anyio.sleep(self.min_refresh_interval)
+
+    def get_key(self, kid: str) -> rsa.RSAPublicKey:
+        """
+        kid に対応する公開鍵を返します。
+        未知の kid や期限切れの場合のみ同期取得します (ローテーション直後でも最小間隔を空ける)。
+
+        Args:
+            kid (str): トークンヘッダーの kid
+
+        Returns:
+            rsa.RSAPublicKey: 公開鍵
+
+        Raises:
+            InvalidIdTokenError: kid に対応する公開鍵が無い場合
+        """
+        now = self._clock()
+        key = self._keys.get(kid)
+        with self._lock:
+            # 同時に届いた複数のリクエストで重複して取得しない
+            fetch = (key is None or now >= self._expires_at) and now - self._fetched_at >= self.min_refresh_interval
+            if fetch:
+                self._fetched_at = now
+        if fetch:
+            try:
+                self.refresh()
+            except CertificateFetchError as e:
+                LOGGER.warning(f"[JWKS] {e}")
+            key = self._keys.get(kid)
+        if key is None:
+            raise InvalidIdTokenError(f"no public key for kid={kid!r}")
+        return key
+
+
+# プロセス全体で共有する公開鍵ストア
+FIREBASE_KEYS = FirebaseKeyStore(
+    settings.firebase_certs_url,
+    refresh_margin=settings.firebase_certs_refresh_margin_seconds,
+    min_refresh_interval=settings.firebase_certs_min_refresh_seconds,
+)
+
+
+def verify_id_token(
+    token: str,
+    project_id: str,
+    keys: FirebaseKeyStore = FIREBASE_KEYS,
+    clock_skew: int = 0,
+    now: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Firebase ID トークンの署名とクレームを検証し、デコード済みクレームを返します。
+    (Admin SDK と同様に uid = sub を付与します)
+
+    Args:
+        token (str): ID トークン
+        project_id (str): Firebase プロジェクト ID (aud / iss の検証に使用)
+        keys (FirebaseKeyStore): 公開鍵ストア
+        clock_skew (int): 時刻の許容誤差 (秒)
+        now (Optional[float]): 現在時刻 (テスト用)
+
+    Returns:
+        Dict[str, Any]: デコード済みクレーム
+
+    Raises:
+        ExpiredIdTokenError: exp を過ぎている場合
+        InvalidIdTokenError: 形式・署名・その他のクレームが不正な場合
+    """
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        claims = json.loads(_b64decode(payload_segment))
+        signature = _b64decode(signature_segment)
+    except ValueError as e:
+        raise InvalidIdTokenError(f"malformed ID token: {e}") from e
+
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise InvalidIdTokenError("malformed ID token: header and payload must be JSON objects")
+    if header.get("alg") != "RS256":
+        raise InvalidIdTokenError(f"unexpected algorithm: {header.get('alg')!r}")
+    kid = header.get("kid")
+    if not kid:
+        raise InvalidIdTokenError("ID token has no kid header")
+
+    signing_input = f"{header_segment}.{payload_segment}".encode("ascii")
+    try:
+        keys.get_key(kid).verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+    except InvalidSignature:
+        raise InvalidIdTokenError("invalid ID token signature")
+
+    now = time.time() if now is None else now
+    issuer = f"https://securetoken.google.com/{project_id}"
+    subject = claims.get("sub")
+    if claims.get("aud") != project_id:
+        raise InvalidIdTokenError(f"unexpected audience: {claims.get('aud')!r}")
+    if claims.get("iss") != issuer:
+        raise InvalidIdTokenError(f"unexpected issuer: {claims.get('iss')!r}")
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise InvalidIdTokenError("ID token has an invalid subject")
+    for name in ("exp", "iat", "auth_time"):
+        if not isinstance(claims.get(name), (int, float)):
+            raise InvalidIdTokenError(f"ID token has no valid {name} claim")
+    if claims["iat"] > now + clock_skew or claims["auth_time"] > now + clock_skew:
+        raise InvalidIdTokenError("ID token is issued in the future")
+    if claims["exp"] <= now - clock_skew:
+        raise ExpiredIdTokenError("ID token has expired")
+
+    claims["uid"] = subject
+    return claims
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+遅延インポート モジュール
+
+firebase_admin / requests / netifaces など、使わない構成では不要な重い依存を
+モジュール読み込み時ではなく最初の属性アクセス時にインポートします。
+
+・lazy_import(name) はモジュールの代理オブジェクトを返し、属性アクセス時に実際にインポート
+・except 句 (例: except requests.exceptions.HTTPError) も例外発生時にのみ評価されるため遅延される
+・LAZY_IMPORT_WARMUP に列挙したモジュールは起動時 (lifespan) に warm_up() で事前に読み込む
+
+Usage:
+    requests = lazy_import("requests")
+    resp = requests.get(url)           # ここで初めて requests をインポート
+"""
+
+import importlib
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Any, Dict, Iterable, List, Optional
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.lazy_import")
+
+
+class LazyModule:
+    """
+    初回の属性アクセスでインポートを行うモジュール代理。
+
+    Args:
+        name (str): インポートするモジュール名 (例: "firebase_admin.auth")
+    """
+
+    __slots__ = ("_name", "_module", "_lock")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        実際のモジュールがインポート済みかどうか。
+        """
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        """
+        モジュールをインポートして返します (インポート済みならそのまま返します)。
+        """
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    started_at = time.perf_counter()
+                    self._module = importlib.import_module(self._name)
+                    elapsed = (time.perf_counter() - started_at) * 1000
+                    LOGGER.info(f"[LazyImport] {self._name} をインポートしました ({elapsed:.1f}ms)")
+                module = self._module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+# 登録済みの遅延モジュール (モジュール名 → 代理)
+LAZY_MODULES: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    モジュールの遅延インポート代理を返します。同じ名前には同じ代理を返します。
+
+    Args:
+        name (str): モジュール名
+
+    Returns:
+        LazyModule: モジュール代理
+    """
+    module = LAZY_MODULES.get(name)
+    if module is None:
+        module = LAZY_MODULES.setdefault(name, LazyModule(name))
+    return module
+
+
+def warm_up(names: Iterable[str]) -> List[str]:
+    """
+    指定したモジュールを事前にインポートします ("*" は登録済みの全遅延モジュール)。
+    インポートに失敗したモジュールは警告を出してスキップします。
+
+    Args:
+        names (Iterable[str]): モジュール名
+
+    Returns:
+        List[str]: インポートできたモジュール名
+    """
+    names = list(names)
+    if "*" in names:
+        names = [name for name in names if name != "*"] + [name for name in LAZY_MODULES if name not in names]
+
+    loaded: List[str] = []
+    for name in names:
+        try:
+            lazy_import(name).load()
+        except ImportError as e:
+            LOGGER.warning(f"[LazyImport] ウォームアップに失敗しました: {name}: {e}")
+            continue
+        loaded.append(name)
+    return loaded
@@ -4,7 +4,7 @@
 import importlib
 import logging
 import os
-from typing import List
+from typing import List, Optional
 
 from fastapi import FastAPI
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -15,37 +15,36 @@ from utils.protocol import handle_exception  # 共通例外処理
 LOGGER = logging.getLogger("uvicorn.middleware_manager")
 
 
-def include_all_middlewares(
-    app: FastAPI,
+# 登録をスキップするミドルウェア名 (既定値)
+DEFAULT_SKIP_MIDDLEWARES: List[str] = [
+    "BaseHTTPMiddleware",
+    "CorrelationIdMiddleware",
+    "PyInstrumentProfilerMiddleware",
+    # main.create_app で明示的に登録するため、自動登録では二重登録しない
+    "HeaderMiddleware",
+]
+
+
+def discover_middleware_classes(
     middlewares_pkg: str = "middlewares",
-    skip_middlewares: List[str] = None,
-) -> None:
+    skip_middlewares: Optional[List[str]] = None,
+) -> List[str]:
     """
-    指定パッケージ内のすべての BaseHTTPMiddleware サブクラスを
-    FastAPI アプリに動的に登録します。
+    指定パッケージ内の BaseHTTPMiddleware サブクラスを検出し、
+    登録順に並べた "モジュール名:クラス名" のリストを返します。
+
+    順序はモジュール名・クラス名の昇順で決定的になり、
+    ルートマニフェスト (utils.route_manifest) にそのまま保存されます。
 
     Args:
-        app (FastAPI): FastAPI アプリケーションインスタンス
         middlewares_pkg (str): ミドルウェアを格納するパッケージ名
-        skip_middlewares (List[str]): 登録をスキップするミドルウェア名リスト
+        skip_middlewares (Optional[List[str]]): 登録をスキップするミドルウェア名リスト
 
-    Raises:
-        HTTPException/ValueError: app が None の場合やインポートエラー
+    Returns:
+        List[str]: "モジュール名:クラス名" のリスト
     """
-    # app の検証
-    if app is None:
-        handle_exception(
-            message="FastAPI アプリケーションが None です",
-            exception=ValueError("app must not be None"),
-        )
-
-    # スキップリストのデフォルト設定
     if skip_middlewares is None:
-        skip_middlewares = [
-            "BaseHTTPMiddleware",
-            "CorrelationIdMiddleware",
-            "PyInstrumentProfilerMiddleware",
-        ]
+        skip_middlewares = DEFAULT_SKIP_MIDDLEWARES
 
     try:
         pkg = importlib.import_module(middlewares_pkg)
@@ -56,8 +55,9 @@ def include_all_middlewares(
         )
     base_path = pkg.__path__[0]
 
+    class_paths: List[str] = []
     # ファイル走査
-    for filename in os.listdir(base_path):
+    for filename in sorted(os.listdir(base_path)):
         if not filename.endswith(".py") or filename == "__init__.py":
             continue
         module_name = f"{middlewares_pkg}.{filename[:-3]}"
@@ -67,21 +67,73 @@ def include_all_middlewares(
             LOGGER.error(f"モジュール {module_name} のインポートエラー: {e}")
             continue
 
-        # モジュール内のクラスを走査
-        for attr_name in dir(module):
+        # モジュール内で定義されたクラスを走査
+        for attr_name in sorted(dir(module)):
             cls = getattr(module, attr_name)
-            # クラスかつ BaseHTTPMiddleware のサブクラス
-            if (
-                isinstance(cls, type)
-                and issubclass(cls, BaseHTTPMiddleware)
-                # 抽象クラス自体は登録しない
-                and cls is not BaseHTTPMiddleware
-                # スキップ対象は登録しない
-                and cls.__name__ not in skip_middlewares
-            ):
-                # ミドルウェア登録
-                try:
-                    app.add_middleware(cls)
-                    LOGGER.info(f"ミドルウェア {cls.__name__} を登録しました。")
-                except Exception as e:
-                    LOGGER.error(f"{cls.__name__} の登録に失敗: {e}")
+            # クラスかつ BaseHTTPMiddleware のサブクラス (抽象クラス自体は登録しない)
+            if not isinstance(cls, type) or not issubclass(cls, BaseHTTPMiddleware) or cls is BaseHTTPMiddleware:
+                continue
+            # 他モジュールからインポートされたクラスは定義元で検出する
+            if cls.__module__ != module_name:
+                continue
+            # スキップ対象は登録しない
+            if cls.__name__ in skip_middlewares:
+                continue
+            class_paths.append(f"{module_name}:{cls.__name__}")
+
+    return class_paths
+
+
+def register_middlewares(app: FastAPI, class_paths: List[str]) -> None:
+    """
+    "モジュール名:クラス名" のリストを先頭から順に add_middleware します。
+
+    Args:
+        app (FastAPI): FastAPI アプリケーションインスタンス
+        class_paths (List[str]): 登録するミドルウェアクラス
+    """
+    for class_path in class_paths:
+        module_name, _, class_name = class_path.partition(":")
+        try:
+            cls = getattr(importlib.import_module(module_name), class_name)
+        except Exception as e:
+            LOGGER.error(f"ミドルウェア {class_path} のインポートエラー: {e}")
+            continue
+
+        # ミドルウェア登録
+        try:
+            app.add_middleware(cls)
+            LOGGER.info(f"ミドルウェア {cls.__name__} を登録しました。")
+        except Exception as e:
+            LOGGER.error(f"{cls.__name__} の登録に失敗: {e}")
+
+
+def include_all_middlewares(
+    app: FastAPI,
+    middlewares_pkg: str = "middlewares",
+    skip_middlewares: List[str] = None,
+    class_paths: Optional[List[str]] = None,
+) -> None:
+    """
+    指定パッケージ内のすべての BaseHTTPMiddleware サブクラスを
+    FastAPI アプリに動的に登録します。
+
+    Args:
+        app (FastAPI): FastAPI アプリケーションインスタンス
+        middlewares_pkg (str): ミドルウェアを格納するパッケージ名
+        skip_middlewares (List[str]): 登録をスキップするミドルウェア名リスト
+        class_paths (Optional[List[str]]): ルートマニフェストのクラス一覧 (指定時はスキャンしない)
+
+    Raises:
+        HTTPException/ValueError: app が None の場合やインポートエラー
+    """
+    # app の検証
+    if app is None:
+        handle_exception(
+            message="FastAPI アプリケーションが None です",
+            exception=ValueError("app must not be None"),
+        )
+
+    if class_paths is None:
+        class_paths = discover_middleware_classes(middlewares_pkg, skip_middlewares)
+    register_middlewares(app, class_paths)
@@ -8,6 +8,7 @@
 - 静的キャッシュから環境情報取得
 - 例外ハンドリング
 """
+
 import logging
 from typing import Any, Dict, List, Optional
 
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動タスク／レディネス管理モジュール
+
+lifespan の初期化処理 (環境情報キャッシュ、DB コネクションプール、Firebase SDK、遅延インポートなど) を
+anyio のタスクグループで並行実行し、タスクごとのタイムアウトと結果をレディネス状態として保持します。
+
+・必須タスク (required=True) が失敗・タイムアウトした場合は起動失敗として例外を送出
+・任意タスクの失敗は記録のみ行い、レディネスを妨げない
+・すべての必須タスクが完了した時点で ready=True (シャットダウン開始時に False へ戻す)
+
+Usage:
+    await run_startup_tasks([StartupTask("database_cache", init_db, timeout=30.0)])
+    await run_startup_stages([init_tasks, warmup_tasks])  # ステージごとに順に実行
+    READINESS.is_ready  # /readiness エンドポイントなどで参照
+"""
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import anyio
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.readiness")
+
+# タスクの状態
+PENDING = "pending"
+RUNNING = "running"
+OK = "ok"
+SKIPPED = "skipped"
+FAILED = "failed"
+TIMEOUT = "timeout"
+
+
+class StartupTaskSkipped(Exception):
+    """
+    設定や環境の都合で起動タスクを実行しない場合に送出します (失敗として扱わない)。
+    """
+
+
+@dataclass
+class StartupTask:
+    """
+    起動時に実行する初期化タスク。
+
+    Attributes:
+        name (str): タスク名 (レディネス情報のキー)
+        func (Callable[[], Awaitable[Any]]): 実行する非同期関数
+        timeout (float): タイムアウト秒数
+        required (bool): 失敗時に起動を中止するかどうか
+    """
+
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    timeout: float
+    required: bool = True
+
+
+@dataclass
+class TaskStatus:
+    """
+    起動タスクの実行結果。
+
+    Attributes:
+        status (str): pending / running / ok / skipped / failed / timeout
+        required (bool): 必須タスクかどうか
+        duration_ms (Optional[float]): 所要時間
+        detail (Optional[str]): スキップ理由やエラー内容
+    """
+
+    status: str = PENDING
+    required: bool = True
+    duration_ms: Optional[float] = None
+    detail: Optional[str] = None
+
+
+class ReadinessState:
+    """
+    プロセス内のレディネス状態。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = False
+        self._tasks: Dict[str, TaskStatus] = {}
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def set_ready(self, ready: bool) -> None:
+        """
+        レディネスを切り替えます。
+        """
+        with self._lock:
+            changed = self._ready != ready
+            self._ready = ready
+        if changed:
+            LOGGER.info(f"[Readiness] ready={ready}")
+
+    def reset(self, tasks: List[StartupTask]) -> None:
+        """
+        起動タスクの一覧で状態を初期化します (ready は False になります)。
+        """
+        with self._lock:
+            self._ready = False
+            self._tasks = {task.name: TaskStatus(required=task.required) for task in tasks}
+
+    def update(self, name: str, **fields: Any) -> None:
+        """
+        タスクの状態を更新します。
+        """
+        with self._lock:
+            status = self._tasks.setdefault(name, TaskStatus())
+            for key, value in fields.items():
+                setattr(status, key, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        レディネス状態のスナップショットを返します。
+
+        Returns:
+            Dict[str, Any]: {"ready": bool, "tasks": {name: TaskStatus の dict}}
+        """
+        with self._lock:
+            return {"ready": self._ready, "tasks": {name: asdict(status) for name, status in self._tasks.items()}}
+
+
+# プロセス全体で共有するレディネス状態
+READINESS = ReadinessState()
+
+
+async def _run_task(task: StartupTask, state: ReadinessState) -> None:
+    """
+    起動タスクを 1 つ実行し、結果を state に記録します。
+    必須タスクの失敗は例外として送出し、タスクグループ全体を中止させます。
+    """
+    state.update(task.name, status=RUNNING)
+    started_at = time.perf_counter()
+
+    def _elapsed() -> float:
+        return round((time.perf_counter() - started_at) * 1000, 3)
+
+    try:
+        with anyio.fail_after(task.timeout):
+            await task.func()
+    except StartupTaskSkipped as e:
+        state.update(task.name, status=SKIPPED, duration_ms=_elapsed(), detail=str(e))
+        LOGGER.info(f"[Startup] {task.name}: スキップ ({e})")
+        return
+    except TimeoutError:
+        state.update(task.name, status=TIMEOUT, duration_ms=_elapsed(), detail=f"timeout after {task.timeout}s")
+        LOGGER.error(f"[Startup] {task.name}: {task.timeout} 秒でタイムアウトしました")
+        if task.required:
+            raise
+        return
+    except Exception as e:
+        state.update(task.name, status=FAILED, duration_ms=_elapsed(), detail=str(e))
+        LOGGER.error(f"[Startup] {task.name}: 失敗しました: {e}", exc_info=True)
+        if task.required:
+            raise
+        return
+
+    state.update(task.name, status=OK, duration_ms=_elapsed())
+    LOGGER.info(f"[Startup] {task.name}: 完了 ({_elapsed():.1f}ms)")
+
+
+async def run_startup_stages(stages: List[List[StartupTask]], state: ReadinessState = READINESS) -> None:
+    """
+    起動タスクをステージ順に実行し (ステージ内は並行実行)、すべての必須タスクが成功したら ready にします。
+
+    Args:
+        stages (List[List[StartupTask]]): ステージごとの起動タスク (前のステージの完了後に次を開始)
+        state (ReadinessState): 結果を記録するレディネス状態
+
+    Raises:
+        Exception: 必須タスクが失敗またはタイムアウトした場合 (タスクグループの例外)
+    """
+    state.reset([task for tasks in stages for task in tasks])
+    for tasks in stages:
+        async with anyio.create_task_group() as tg:
+            for task in tasks:
+                tg.start_soon(_run_task, task, state, name=f"startup:{task.name}")
+    state.set_ready(True)
+
+
+async def run_startup_tasks(tasks: List[StartupTask], state: ReadinessState = READINESS) -> None:
+    """
+    起動タスクを並行実行し、すべての必須タスクが成功したら ready にします。
+
+    Args:
+        tasks (List[StartupTask]): 起動タスク
+        state (ReadinessState): 結果を記録するレディネス状態
+    """
+    await run_startup_stages([tasks], state)
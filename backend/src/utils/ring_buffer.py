@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+連番付きリングバッファ モジュール
+
+固定長の配列に直近のメッセージを連番 (seq) 付きで保持し、指定した連番より後のものを取り出します。
+チャットの再接続時に、切断中に配信されたメッセージ (last_seq 以降) だけを再送するために使います。
+
+・メモリは件数 (capacity) とバイト数 (max_bytes) の両方で上限を設ける (古いものから破棄)
+・追加・取り出し位置の計算は O(1)、取り出しは該当件数に比例
+・epoch は連番の系列の識別子。バッファが作り直されると連番が 1 から振り直されるため、
+  クライアントが保持している last_seq が同じ系列のものかどうかを epoch で判定する
+    - 連番を外部 (チャットバスのハブなど) で割り当てる場合は、その epoch を渡し、
+      系列が変わったり連番が飛んだりしたら reset で保持分を破棄して続きの連番から記録する
+
+Usage:
+    buffer = SequencedRingBuffer(capacity=100, max_bytes=256 * 1024)
+    seq = buffer.append(text)
+    items, complete = buffer.since(last_seq)   # complete=False なら欠落あり (古いものは破棄済み)
+"""
+
+import secrets
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+
+def utf8_len(item: Union[str, bytes]) -> int:
+    """
+    送信時のバイト数 (str は UTF-8 でエンコードした長さ) を返します。
+    """
+    if isinstance(item, str) and not item.isascii():
+        return len(item.encode("utf-8"))
+    return len(item)
+
+
+class SequencedRingBuffer(Generic[T]):
+    """
+    連番付きの固定長リングバッファ。
+
+    Args:
+        capacity (int): 保持する最大件数
+        max_bytes (int): 保持する合計サイズの上限 (0 で無制限、1 件で上限を超える場合はその 1 件のみ保持)
+        sizeof (Callable[[T], int]): 要素のサイズを返す関数 (既定は utf8_len: str は文字数ではなく UTF-8 のバイト数)
+        epoch (Optional[str]): 連番の系列の識別子 (省略時はバッファごとに生成)
+    """
+
+    def __init__(
+        self, capacity: int, max_bytes: int = 0, sizeof: Callable[[T], int] = utf8_len, epoch: Optional[str] = None
+    ):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.epoch = epoch or secrets.token_urlsafe(6)
+        self.bytes = 0
+        # 保持している最も古い連番と、最後に割り当てた連番 (空なら first_seq == last_seq + 1)
+        self.first_seq = 1
+        self.last_seq = 0
+        self._items: List[Optional[T]] = [None] * capacity
+        self._sizes: List[int] = [0] * capacity
+
+    def __len__(self) -> int:
+        return self.last_seq - self.first_seq + 1
+
+    def _evict(self) -> None:
+        index = self.first_seq % self.capacity
+        self.bytes -= self._sizes[index]
+        self._items[index] = None
+        self._sizes[index] = 0
+        self.first_seq += 1
+
+    def reset(self, epoch: str, last_seq: int) -> None:
+        """
+        保持しているすべての要素を破棄し、epoch と最後の連番を設定します (次の append は last_seq + 1)。
+        """
+        self._items = [None] * self.capacity
+        self._sizes = [0] * self.capacity
+        self.bytes = 0
+        self.epoch = epoch
+        self.first_seq = last_seq + 1
+        self.last_seq = last_seq
+
+    def append(self, item: T) -> int:
+        """
+        要素を追加し、割り当てた連番を返します (上限を超えた分は古いものから破棄)。
+        """
+        if len(self) == self.capacity:
+            self._evict()
+        seq = self.last_seq + 1
+        index = seq % self.capacity
+        size = self.sizeof(item)
+        self._items[index] = item
+        self._sizes[index] = size
+        self.bytes += size
+        self.last_seq = seq
+        while self.max_bytes and self.bytes > self.max_bytes and len(self) > 1:
+            self._evict()
+        return seq
+
+    def since(self, seq: int) -> Tuple[List[Tuple[int, T]], bool]:
+        """
+        連番 seq より後の要素を古い順に返します。
+
+        Args:
+            seq (int): クライアントが最後に受け取った連番 (0 なら保持しているすべて)
+
+        Returns:
+            Tuple[List[Tuple[int, T]], bool]: (連番, 要素) のリストと、欠落がないかどうか
+                (seq の直後の要素が破棄済み、または seq がこのバッファの範囲外なら False)
+        """
+        complete = self.first_seq - 1 <= seq <= self.last_seq
+        start = max(seq + 1, self.first_seq) if seq <= self.last_seq else self.first_seq
+        return [(n, self._items[n % self.capacity]) for n in range(start, self.last_seq + 1)], complete
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ルートマニフェスト モジュール
+
+起動のたびに routers / middlewares パッケージを走査する代わりに、
+走査結果 (ルーターモジュールとミドルウェアクラスの登録順) を
+JSON マニフェストに保存し、起動時はそれを読み込んで登録します。
+(WebSocket ルートは登録時にルーターモジュールから取り出すため記録しない)
+
+・マニフェストには走査対象ファイル (と走査ロジック) の mtime / サイズ / SHA-256 を記録
+・起動時は mtime とサイズが一致すればそのまま採用し、
+  一致しないファイルのみハッシュを再計算して内容の変化を判定
+・内容が変わっていればスキャンし直してマニフェストを再生成 (書き込み不可でも起動は継続)
+
+Usage:
+    python -m utils.route_manifest           # マニフェストを再生成
+    python -m utils.route_manifest --check   # 最新でなければ終了コード 1 (CI 用)
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.middlewares_manager import discover_middleware_classes
+from utils.routers_manager import discover_router_modules
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.route_manifest")
+
+# backend/src ディレクトリ
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# マニフェストファイルの既定パス
+MANIFEST_PATH = BASE_DIR / "route_manifest.json"
+
+# マニフェスト形式のバージョン (形式を変えたら上げる)
+MANIFEST_VERSION = 2
+
+# 走査対象パッケージ
+ROUTERS_PKG = "routers"
+MIDDLEWARES_PKG = "middlewares"
+
+# 走査ロジック自体 (除外・スキップ設定) の変更でもマニフェストを無効化する
+SCANNER_FILES = ("utils/routers_manager.py", "utils/middlewares_manager.py")
+
+
+def _tracked_files() -> List[Path]:
+    """
+    マニフェストの鮮度判定に使う .py ファイル一覧を返します (インポートは行いません)。
+    """
+    files: List[Path] = [BASE_DIR / rel_path for rel_path in SCANNER_FILES]
+    for package in (ROUTERS_PKG, MIDDLEWARES_PKG):
+        for dirpath, dirnames, filenames in os.walk(BASE_DIR / package):
+            dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+            files.extend(Path(dirpath) / name for name in sorted(filenames) if name.endswith(".py"))
+    return files
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _fingerprint(path: Path) -> Dict[str, Any]:
+    stat = path.stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": _sha256(path)}
+
+
+def scan_manifest() -> Dict[str, Any]:
+    """
+    routers / middlewares パッケージを走査してマニフェストを生成します。
+
+    Returns:
+        Dict[str, Any]: マニフェスト
+    """
+    files = _tracked_files()
+    return {
+        "version": MANIFEST_VERSION,
+        "routers": discover_router_modules(ROUTERS_PKG),
+        # 先頭から順に add_middleware する (後に登録したものほど外側)
+        "middlewares": discover_middleware_classes(MIDDLEWARES_PKG),
+        "files": {path.relative_to(BASE_DIR).as_posix(): _fingerprint(path) for path in files},
+    }
+
+
+def is_manifest_fresh(manifest: Dict[str, Any]) -> bool:
+    """
+    マニフェストが現在のソースツリーと一致しているかを判定します。
+
+    mtime とサイズが一致するファイルはハッシュ計算を省略します。
+
+    Args:
+        manifest (Dict[str, Any]): 読み込んだマニフェスト
+
+    Returns:
+        bool: 一致していれば True
+    """
+    if manifest.get("version") != MANIFEST_VERSION:
+        return False
+
+    recorded: Dict[str, Dict[str, Any]] = manifest.get("files", {})
+    current = {path.relative_to(BASE_DIR).as_posix(): path for path in _tracked_files()}
+    if set(recorded) != set(current):
+        return False
+
+    for rel_path, path in current.items():
+        entry = recorded[rel_path]
+        stat = path.stat()
+        if stat.st_mtime_ns == entry.get("mtime_ns") and stat.st_size == entry.get("size"):
+            continue
+        # チェックアウト直後などで mtime だけが変わった場合は内容で判定
+        if stat.st_size != entry.get("size") or _sha256(path) != entry.get("sha256"):
+            LOGGER.info(f"[RouteManifest] 変更を検出: {rel_path}")
+            return False
+    return True
+
+
+def read_manifest(path: Path = MANIFEST_PATH) -> Optional[Dict[str, Any]]:
+    """
+    マニフェストを読み込みます。存在しない・壊れている場合は None を返します。
+    """
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        LOGGER.warning(f"[RouteManifest] 読み込みに失敗しました: {e}")
+        return None
+
+
+def write_manifest(manifest: Dict[str, Any], path: Path = MANIFEST_PATH) -> bool:
+    """
+    マニフェストをアトミックに書き込みます (複数ワーカーの同時書き込みに対応)。
+
+    Returns:
+        bool: 書き込めた場合は True
+    """
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp_name, path)
+        return True
+    except OSError as e:
+        LOGGER.warning(f"[RouteManifest] 書き込みに失敗しました (スキャン結果はメモリ上で使用します): {e}")
+        return False
+
+
+def load_route_manifest(path: Path = MANIFEST_PATH) -> Dict[str, Any]:
+    """
+    起動時に使うマニフェストを返します。
+    最新であればそのまま使い、古い・存在しない場合はスキャンして再生成します。
+
+    Args:
+        path (Path): マニフェストファイルのパス
+
+    Returns:
+        Dict[str, Any]: マニフェスト
+    """
+    manifest = read_manifest(path)
+    if manifest is not None and is_manifest_fresh(manifest):
+        LOGGER.info("[RouteManifest] マニフェストを使用します (パッケージ走査を省略)")
+        return manifest
+
+    LOGGER.info("[RouteManifest] マニフェストが古いため再生成します")
+    manifest = scan_manifest()
+    write_manifest(manifest, path)
+    return manifest
+
+
+def main() -> None:
+    """
+    マニフェスト再生成コマンド。
+    """
+    parser = argparse.ArgumentParser(description="ルートマニフェストを再生成します。")
+    parser.add_argument("--check", action="store_true", help="最新でなければ終了コード 1 で終了")
+    parser.add_argument("--path", type=Path, default=MANIFEST_PATH, help="マニフェストファイルのパス")
+    args = parser.parse_args()
+
+    if args.check:
+        manifest = read_manifest(args.path)
+        fresh = manifest is not None and is_manifest_fresh(manifest)
+        if fresh:
+            scanned = scan_manifest()
+            fresh = all(manifest.get(key) == scanned[key] for key in ("routers", "middlewares"))
+        if not fresh:
+            print(f"{args.path} is stale. Run: python -m utils.route_manifest")
+            sys.exit(1)
+        print(f"{args.path} is up to date.")
+        return
+
+    manifest = scan_manifest()
+    if not write_manifest(manifest, args.path):
+        sys.exit(1)
+    print(f"Wrote {args.path}: {len(manifest['routers'])} routers, {len(manifest['middlewares'])} middlewares")
+
+
+if __name__ == "__main__":
+    main()
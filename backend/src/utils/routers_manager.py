@@ -10,13 +10,15 @@
  2. 除外パッケージ・ディレクトリのフィルタリング
  3. モジュール単位で `router` 属性を検出
  4. HTTP ルート (`APIRoute`) と WebSocket ルート (`WebSocketRoute`) の分離登録
+ 5. ルートマニフェストのモジュール一覧からの登録 (スキャン省略)
 """
+
 import importlib
 import logging
 import pkgutil
-from typing import List, Set
+from typing import List, Optional, Set
 
-from fastapi import FastAPI
+from fastapi import APIRouter, FastAPI
 from fastapi.routing import APIRoute
 from starlette.routing import WebSocketRoute
 
@@ -39,22 +41,24 @@ EXCLUDED_DIRS: Set[str] = {
 }
 
 
-def include_all_routers(app: FastAPI, root_pkg: str = "routers") -> List[WebSocketRoute]:
+def discover_router_modules(root_pkg: str = "routers") -> List[str]:
     """
-    指定パッケージ配下を再帰的にスキャンし、
-    `router` 属性を持つ各モジュールから HTTP と WebSocket のルートを登録します。
+    指定パッケージ配下を再帰的にスキャンし、`router` 属性 (APIRouter) を持つモジュール名を返します。
+    結果はルートマニフェスト (utils.route_manifest) の生成にも使われます。
 
     Args:
-        app (FastAPI): FastAPI アプリケーションインスタンス
         root_pkg (str): ルートパッケージ名（例: 'routers'）
+
+    Returns:
+        List[str]: ルーターを持つモジュール名のリスト (スキャン順)
     """
     try:
         pkg = importlib.import_module(root_pkg)
     except ModuleNotFoundError:
         LOGGER.error(f"ルートパッケージ '{root_pkg}' が見つかりません。")
-        return
+        return []
 
-    ws_routes = []
+    module_names: List[str] = []
     # 再帰的にサブモジュールを検索
     for finder, module_name, is_pkg in pkgutil.walk_packages(pkg.__path__, prefix=f"{root_pkg}."):
         # 除外ディレクトリがパスに含まれる場合はスキップ
@@ -68,8 +72,36 @@ def include_all_routers(app: FastAPI, root_pkg: str = "routers") -> List[WebSock
             LOGGER.error(f"モジュール {module_name} のインポートエラー: {e}", exc_info=True)
             continue
 
+        # パッケージの `router` 属性がサブモジュール自体を指す場合 (再登録時など) は対象外
+        if isinstance(getattr(module, "router", None), APIRouter):
+            module_names.append(module_name)
+
+    return module_names
+
+
+def include_router_modules(app: FastAPI, module_names: List[str]) -> List[WebSocketRoute]:
+    """
+    指定モジュールの `router` から HTTP ルートを登録し、WebSocket ルートを返します。
+    パッケージの走査は行わず、与えられた順序どおりにインポートします。
+
+    Args:
+        app (FastAPI): FastAPI アプリケーションインスタンス
+        module_names (List[str]): ルーターを持つモジュール名のリスト
+
+    Returns:
+        List[WebSocketRoute]: バージョニング後に追加する WebSocket ルート
+    """
+    ws_routes = []
+    for module_name in module_names:
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            LOGGER.error(f"モジュール {module_name} のインポートエラー: {e}", exc_info=True)
+            continue
+
         router = getattr(module, "router", None)
-        if not router:
+        if not isinstance(router, APIRouter):
+            LOGGER.error(f"モジュール {module_name} に router がありません。")
             continue
 
         http_routes = []
@@ -84,12 +116,34 @@ def include_all_routers(app: FastAPI, root_pkg: str = "routers") -> List[WebSock
             else:
                 http_routes.append(route)
 
-        # HTTP ルートのみを登録用に設定
-        router.routes = http_routes
+        # HTTP ルートのみを登録用ルーターに設定
+        # (元の router.routes は書き換えないため、create_app を複数回呼んでも WebSocket ルートを失わない)
+        http_router = APIRouter()
+        http_router.routes.extend(http_routes)
         try:
-            app.include_router(router)
+            app.include_router(http_router)
             LOGGER.info(f"HTTP ルーター登録: {module_name}.router")
         except Exception as e:
             LOGGER.error(f"HTTP ルーター登録失敗: {module_name}.router - {e}")
 
     return ws_routes
+
+
+def include_all_routers(
+    app: FastAPI, root_pkg: str = "routers", module_names: Optional[List[str]] = None
+) -> List[WebSocketRoute]:
+    """
+    指定パッケージ配下を再帰的にスキャンし、
+    `router` 属性を持つ各モジュールから HTTP と WebSocket のルートを登録します。
+
+    Args:
+        app (FastAPI): FastAPI アプリケーションインスタンス
+        root_pkg (str): ルートパッケージ名（例: 'routers'）
+        module_names (Optional[List[str]]): ルートマニフェストのモジュール一覧 (指定時はスキャンしない)
+
+    Returns:
+        List[WebSocketRoute]: バージョニング後に追加する WebSocket ルート
+    """
+    if module_names is None:
+        module_names = discover_router_modules(root_pkg)
+    return include_router_modules(app, module_names)
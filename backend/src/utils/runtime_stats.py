@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+実行時メトリクス モジュール
+
+プロセス内で記録しているメトリクス (エグゼキュータのキュー待ち・実行時間、検証済みトークンキャッシュの
+ヒット率など) を 1 つにまとめます。
+/stats エンドポイント (STATS_ENDPOINT_ENABLED) とシャットダウン時のログで同じ内容を出力します。
+
+・メトリクスはプロセスごと (launcher で複数ワーカーを起動した場合は応答したワーカーの値、pid で区別)
+"""
+
+import os
+from typing import Any, Dict
+
+from utils.executor import get_executor_stats
+from utils.token_cache import TOKEN_CACHE
+
+
+def collect_runtime_stats() -> Dict[str, Any]:
+    """
+    現在のプロセスのメトリクスを返します。
+
+    Returns:
+        Dict[str, Any]: {"pid": プロセス ID, "executors": エグゼキュータ名 → メトリクス, "token_cache": メトリクス}
+    """
+    return {"pid": os.getpid(), "executors": get_executor_stats(), "token_cache": TOKEN_CACHE.stats()}
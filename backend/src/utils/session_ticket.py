@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+セッションチケット モジュール
+
+Firebase ID トークンを 1 度だけ検証して発行する、短命の HMAC 署名付きチケットを扱います。
+WebSocket の再接続や API 呼び出しのたびに RSA 検証や SDK 呼び出しを行わず、
+HMAC-SHA256 の検証 (マイクロ秒単位) だけで uid と権限 (スコープ) を確認できます。
+
+形式:
+    st1.<base64url(JSON: {"uid", "exp", "scp"})>.<base64url(HMAC-SHA256)>
+
+・署名鍵は SESSION_TICKET_SECRET、未設定なら環境情報の SECRET から導出 (全ワーカー・全レプリカで共通)
+・有効期限は発行時の ID トークンの exp を超えない
+・スコープ "api" は HTTP、"ws" は WebSocket での利用を許可する
+
+Usage:
+    ticket, expires_at = issue_ticket(uid, ["api", "ws"], expires_at=claims["exp"])
+    claims = verify_ticket(ticket, scope=SCOPE_WS)
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app_state import environment_info_static
+from commons.environment_master_key import EnvironmentMasterKey
+from commons.settings import settings
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.auth.ticket")
+
+TICKET_PREFIX = "st1."
+
+# スコープ
+SCOPE_API = "api"
+SCOPE_WS = "ws"
+
+
+class InvalidTicketError(ValueError):
+    """
+    チケットの形式・署名・スコープが不正な場合に送出します。
+    """
+
+
+class ExpiredTicketError(InvalidTicketError):
+    """
+    チケットの有効期限が切れている場合に送出します。
+    """
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+@lru_cache(maxsize=4)
+def _derive_key(secret: str) -> bytes:
+    # 環境情報の SECRET はレスポンス署名にも使うため、用途別の鍵を導出する
+    return hmac.new(secret.encode("utf-8"), b"session-ticket:v1", hashlib.sha256).digest()
+
+
+def get_signing_key() -> bytes:
+    """
+    チケットの署名鍵を返します。
+
+    Returns:
+        bytes: 署名鍵
+
+    Raises:
+        InvalidTicketError: 署名鍵の元になるシークレットが設定されていない場合
+    """
+    secret = settings.session_ticket_secret
+    if not secret:
+        entry = environment_info_static.get(EnvironmentMasterKey.SECRET.value) or {}
+        secret = entry.get("values")
+    if not secret:
+        raise InvalidTicketError("session ticket secret is not configured")
+    return _derive_key(secret)
+
+
+def default_scopes() -> List[str]:
+    """
+    チケットに付与できるスコープ (SESSION_TICKET_SCOPES) を返します。
+    """
+    return [scope.strip() for scope in settings.session_ticket_scopes.split(",") if scope.strip()]
+
+
+def is_session_ticket(token: str) -> bool:
+    """
+    トークンがセッションチケットかどうか (Firebase ID トークンとはプレフィックスで区別する)。
+    """
+    return token.startswith(TICKET_PREFIX)
+
+
+def _sign(key: bytes, signing_input: str) -> str:
+    return _b64encode(hmac.new(key, signing_input.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_ticket(
+    uid: str,
+    scopes: List[str],
+    expires_at: Optional[float] = None,
+    now: Optional[float] = None,
+    key: Optional[bytes] = None,
+) -> Tuple[str, int]:
+    """
+    セッションチケットを発行します。
+
+    Args:
+        uid (str): Firebase ユーザー ID
+        scopes (List[str]): 付与するスコープ
+        expires_at (Optional[float]): 上限とする有効期限 (ID トークンの exp)
+        now (Optional[float]): 現在時刻 (テスト用)
+        key (Optional[bytes]): 署名鍵 (省略時は get_signing_key)
+
+    Returns:
+        Tuple[str, int]: チケットと有効期限 (UNIX 秒)
+    """
+    now = time.time() if now is None else now
+    exp = int(now + settings.session_ticket_ttl_seconds)
+    if expires_at is not None:
+        exp = min(exp, int(expires_at))
+    payload = json.dumps({"uid": uid, "exp": exp, "scp": scopes}, separators=(",", ":")).encode("utf-8")
+    signing_input = f"{TICKET_PREFIX}{_b64encode(payload)}"
+    return f"{signing_input}.{_sign(key or get_signing_key(), signing_input)}", exp
+
+
+def verify_ticket(
+    ticket: str,
+    scope: str,
+    now: Optional[float] = None,
+    key: Optional[bytes] = None,
+) -> Dict[str, Any]:
+    """
+    セッションチケットの署名・有効期限・スコープを検証し、クレームを返します。
+
+    Args:
+        ticket (str): セッションチケット
+        scope (str): 利用に必要なスコープ
+        now (Optional[float]): 現在時刻 (テスト用)
+        key (Optional[bytes]): 署名鍵 (省略時は get_signing_key)
+
+    Returns:
+        Dict[str, Any]: {"uid", "exp", "scopes", "session_ticket": True}
+
+    Raises:
+        ExpiredTicketError: 有効期限切れの場合
+        InvalidTicketError: 形式・署名・スコープが不正な場合
+    """
+    signing_input, _, signature = ticket.rpartition(".")
+    if not is_session_ticket(signing_input) or not signature:
+        raise InvalidTicketError("malformed session ticket")
+    expected = _sign(key or get_signing_key(), signing_input)
+    if not hmac.compare_digest(signature.encode("utf-8"), expected.encode("ascii")):
+        raise InvalidTicketError("invalid session ticket signature")
+    try:
+        payload = json.loads(_b64decode(signing_input.removeprefix(TICKET_PREFIX)))
+        uid, exp, scopes = payload["uid"], payload["exp"], payload["scp"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidTicketError(f"malformed session ticket payload: {e}") from e
+    if not isinstance(exp, int) or not isinstance(scopes, list):
+        raise InvalidTicketError("malformed session ticket payload")
+
+    if exp <= (time.time() if now is None else now):
+        raise ExpiredTicketError("session ticket has expired")
+    if scope not in scopes:
+        raise InvalidTicketError(f"session ticket does not grant scope {scope!r}")
+    return {"uid": uid, "exp": exp, "scopes": scopes, "session_ticket": True}
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+グレースフルシャットダウン モジュール
+
+デプロイ時 (ローリング再起動) にエラーや再接続の集中を起こさないよう、停止を 2 段階で行います。
+
+1. ドレイン (drain)
+   ・レディネスを not ready にし、新規の HTTP リクエスト／WebSocket 接続を 503 / 1012 で拒否
+   ・登録されたドレインフック (WebSocket のクローズフレーム送信など) を並行実行
+   ・処理中の HTTP リクエストが 0 になるまで期限付きで待機
+2. クリーンアップ (cleanup)
+   ・登録されたクリーンアップフック (ログハンドラのフラッシュ、エンジンの dispose など) を登録順に実行
+
+uvicorn はシャットダウン時に既存の WebSocket を即座に 1012 で切断するため、ドレインは
+launcher.py のワーカーサーバーが接続のシャットダウンより前に呼び出します。
+lifespan のシャットダウンでも drain() を呼びますが、実行済みであれば何もしません。
+
+Usage:
+    on_drain("websockets", manager.close_all)
+    on_cleanup("dispose_engines", dispose_engines)
+    await drain(timeout=20.0)
+    await cleanup()
+"""
+
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import anyio
+
+from utils.readiness import READINESS
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.shutdown")
+
+ShutdownHook = Callable[[], Awaitable[None]]
+
+
+class DrainState:
+    """
+    プロセス内のドレイン状態と処理中リクエスト数。
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.drained = False
+        self.in_flight = 0
+
+    def reset(self) -> None:
+        """
+        ドレイン状態を解除します (lifespan の起動時に呼ばれます)。
+        """
+        self.draining = False
+        self.drained = False
+
+    async def wait_idle(self, timeout: float, interval: float = 0.05) -> bool:
+        """
+        処理中のリクエストが 0 になるまで待ちます。
+
+        Args:
+            timeout (float): 最大待機秒数
+
+        Returns:
+            bool: 期限内に 0 になれば True
+        """
+        with anyio.move_on_after(timeout):
+            while self.in_flight > 0:
+                await anyio.sleep(interval)
+        return self.in_flight == 0
+
+
+# プロセス全体で共有するドレイン状態
+DRAIN = DrainState()
+
+# ドレインフック (並行実行) とクリーンアップフック (登録順に実行)
+_DRAIN_HOOKS: Dict[str, ShutdownHook] = {}
+_CLEANUP_HOOKS: Dict[str, ShutdownHook] = {}
+
+
+def on_drain(name: str, hook: ShutdownHook) -> None:
+    """
+    ドレイン時に実行するフックを登録します (同名は上書き)。
+    """
+    _DRAIN_HOOKS[name] = hook
+
+
+def on_cleanup(name: str, hook: ShutdownHook) -> None:
+    """
+    ドレイン完了後に実行するクリーンアップフックを登録します (同名は上書き)。
+    """
+    _CLEANUP_HOOKS[name] = hook
+
+
+async def _run_hook(name: str, hook: ShutdownHook, timeout: float) -> None:
+    try:
+        with anyio.fail_after(timeout):
+            await hook()
+    except TimeoutError:
+        LOGGER.error(f"[Shutdown] {name}: {timeout} 秒でタイムアウトしました")
+    except Exception as e:
+        LOGGER.error(f"[Shutdown] {name}: 失敗しました: {e}", exc_info=True)
+
+
+async def drain(timeout: float) -> None:
+    """
+    新規リクエストの受け付けを止め、ドレインフックの実行と処理中リクエストの完了を待ちます。
+    2 回目以降の呼び出しは何もしません。
+
+    Args:
+        timeout (float): ドレイン全体の期限 (秒)
+    """
+    if DRAIN.draining:
+        return
+    DRAIN.draining = True
+    READINESS.set_ready(False)
+    started_at = time.monotonic()
+    LOGGER.info(f"[Shutdown] ドレイン開始: in_flight={DRAIN.in_flight} hooks={list(_DRAIN_HOOKS)}")
+
+    async with anyio.create_task_group() as tg:
+        for name, hook in _DRAIN_HOOKS.items():
+            tg.start_soon(_run_hook, name, hook, timeout)
+
+    remaining = max(timeout - (time.monotonic() - started_at), 0.0)
+    if not await DRAIN.wait_idle(remaining):
+        LOGGER.warning(f"[Shutdown] 期限内に完了しなかったリクエストがあります: in_flight={DRAIN.in_flight}")
+    DRAIN.drained = True
+    LOGGER.info(f"[Shutdown] ドレイン完了 ({(time.monotonic() - started_at) * 1000:.1f}ms)")
+
+
+async def cleanup(timeout: float = 10.0) -> None:
+    """
+    クリーンアップフックを登録順に実行します (失敗しても残りのフックは実行します)。
+
+    Args:
+        timeout (float): フックごとの期限 (秒)
+    """
+    for name, hook in list(_CLEANUP_HOOKS.items()):
+        await _run_hook(name, hook, timeout)
+        LOGGER.info(f"[Shutdown] {name}: 完了")
+
+
+def flush_log_handlers() -> int:
+    """
+    ルートおよび全ロガーのハンドラをフラッシュします。
+
+    Returns:
+        int: フラッシュしたハンドラ数
+    """
+    loggers: List[logging.Logger] = [logging.getLogger()]
+    loggers += [item for item in logging.Logger.manager.loggerDict.values() if isinstance(item, logging.Logger)]
+    handlers = {id(handler): handler for item in loggers for handler in item.handlers}
+    for handler in handlers.values():
+        try:
+            handler.flush()
+        except Exception:  # フラッシュ失敗で停止処理を止めない
+            pass
+    return len(handlers)
+
+
+def registered_hooks() -> Tuple[List[str], List[str]]:
+    """
+    登録済みのドレインフック名とクリーンアップフック名を返します。
+    """
+    return list(_DRAIN_HOOKS), list(_CLEANUP_HOOKS)
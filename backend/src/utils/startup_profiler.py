@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動プロファイラ モジュール
+
+create_app のフェーズごとの所要時間と、モジュールごとのインポート時間を計測し、
+JSON レポートとして出力します (コールドスタートの劣化を CI で追跡するため)。
+
+・フェーズ計測: main.create_app の各 [INIT] フェーズを STARTUP_PROFILER.phase() で囲んで記録
+・インポート計測: sys.meta_path にフックを挿入し、各モジュールの exec_module 時間を記録
+  (cumulative: 配下のインポートを含む時間 / self: 配下のインポートを除いた時間)
+・STARTUP_PROFILE_OUTPUT を設定すると create_app 完了時にフェーズ計測のレポートを書き出す
+
+Usage:
+    python -m utils.startup_profiler --output startup_profile.json
+    python -m utils.startup_profiler --top 20 --max-total-ms 3000   # 閾値超過で終了コード 1
+"""
+
+import argparse
+import importlib.abc
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from importlib.machinery import ModuleSpec
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.startup_profiler")
+
+# レポート形式のバージョン (形式を変えたら上げる)
+REPORT_VERSION = 1
+
+
+@dataclass
+class ImportTiming:
+    """
+    モジュール 1 つ分のインポート時間。
+
+    Attributes:
+        module (str): モジュール名
+        cumulative_ms (float): 配下のインポートを含む実行時間
+        self_ms (float): 配下のインポートを除いた実行時間
+    """
+
+    module: str
+    cumulative_ms: float
+    self_ms: float
+
+
+@dataclass
+class _ImportFrame:
+    started_at: float
+    children_seconds: float = field(default=0.0)
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """
+    元のローダーの exec_module を計測付きで呼び出すラッパー。
+    """
+
+    def __init__(self, loader: importlib.abc.Loader, profiler: "StartupProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec: ModuleSpec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._profiler._enter_import()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit_import(module.__name__)
+
+    def __getattr__(self, name: str) -> Any:
+        # get_resource_reader / is_package などは元のローダーへ委譲
+        return getattr(self._loader, name)
+
+
+class _ImportTimingFinder(importlib.abc.MetaPathFinder):
+    """
+    後続のファインダーで spec を解決し、ローダーだけを計測用ラッパーに差し替えるファインダー。
+    """
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self._profiler = profiler
+
+    def find_spec(self, fullname: str, path=None, target=None) -> Optional[ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, self._profiler)
+            return spec
+        return None
+
+
+class StartupProfiler:
+    """
+    起動フェーズとインポート時間の計測器。
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.imports: List[ImportTiming] = []
+        self._import_stack: List[_ImportFrame] = []
+        self._finder: Optional[_ImportTimingFinder] = None
+        self._created_at = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        with ブロックの所要時間をフェーズ name として記録します (同名は加算)。
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started_at) * 1000
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            LOGGER.debug(f"[StartupProfiler] {name}: {elapsed:.2f}ms")
+
+    def install_import_hook(self) -> None:
+        """
+        インポート時間の計測を開始します (以降に初めてインポートされるモジュールが対象)。
+        """
+        if self._finder is None:
+            self._finder = _ImportTimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall_import_hook(self) -> None:
+        """
+        インポート時間の計測を終了します。
+        """
+        if self._finder is not None and self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+
+    def _enter_import(self) -> None:
+        self._import_stack.append(_ImportFrame(started_at=time.perf_counter()))
+
+    def _exit_import(self, module_name: str) -> None:
+        frame = self._import_stack.pop()
+        cumulative = time.perf_counter() - frame.started_at
+        if self._import_stack:
+            self._import_stack[-1].children_seconds += cumulative
+        self.imports.append(
+            ImportTiming(
+                module=module_name,
+                cumulative_ms=cumulative * 1000,
+                self_ms=(cumulative - frame.children_seconds) * 1000,
+            )
+        )
+
+    def report(self, top: Optional[int] = None) -> Dict[str, Any]:
+        """
+        計測結果をレポート (dict) にまとめます。
+
+        Args:
+            top (Optional[int]): インポート時間の上位何件を載せるか (None なら全件)
+
+        Returns:
+            Dict[str, Any]: レポート
+        """
+        imports = sorted(self.imports, key=lambda timing: timing.cumulative_ms, reverse=True)
+        # トップレベルパッケージ単位の自己時間合計 (firebase_admin, requests などのコスト把握用)
+        packages: Dict[str, float] = {}
+        for timing in self.imports:
+            package = timing.module.partition(".")[0]
+            packages[package] = packages.get(package, 0.0) + timing.self_ms
+
+        return {
+            "version": REPORT_VERSION,
+            "python": sys.version.split()[0],
+            "pid": os.getpid(),
+            "total_ms": round((time.perf_counter() - self._created_at) * 1000, 3),
+            "phases": {name: round(ms, 3) for name, ms in self.phases.items()},
+            "imports": {
+                "count": len(imports),
+                "total_self_ms": round(sum(timing.self_ms for timing in imports), 3),
+                "packages": {
+                    name: round(ms, 3) for name, ms in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)
+                },
+                "modules": [
+                    {
+                        key: round(value, 3) if isinstance(value, float) else value
+                        for key, value in asdict(timing).items()
+                    }
+                    for timing in (imports if top is None else imports[:top])
+                ],
+            },
+        }
+
+    def write_report(self, path: Path, top: Optional[int] = None) -> Dict[str, Any]:
+        """
+        レポートを JSON ファイルに書き出します。
+
+        Returns:
+            Dict[str, Any]: 書き出したレポート
+        """
+        report = self.report(top)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        LOGGER.info(f"[StartupProfiler] レポートを書き出しました: {path}")
+        return report
+
+
+# プロセス全体で共有する計測器 (main.create_app が使用)
+STARTUP_PROFILER = StartupProfiler()
+
+
+def main() -> None:
+    """
+    起動プロファイル計測コマンド。
+
+    インポートフックを挿入してから main をインポートし (create_app が実行される)、
+    フェーズ時間とインポート時間のレポートを出力します。
+    """
+    parser = argparse.ArgumentParser(description="create_app の起動時間を計測します。")
+    parser.add_argument("--output", type=Path, help="レポートの出力先 (省略時は標準出力)")
+    parser.add_argument("--top", type=int, default=50, help="レポートに載せるインポート時間の上位件数")
+    parser.add_argument("--max-total-ms", type=float, help="合計時間がこれを超えたら終了コード 1 (CI 用)")
+    args = parser.parse_args()
+
+    # python -m で実行された場合も main.py と同じ計測器を使う
+    profiler = importlib.import_module("utils.startup_profiler").STARTUP_PROFILER
+    profiler.install_import_hook()
+    try:
+        with profiler.phase("import_main"):
+            importlib.import_module("main")
+    finally:
+        profiler.uninstall_import_hook()
+
+    if args.output:
+        report = profiler.write_report(args.output, args.top)
+    else:
+        report = profiler.report(args.top)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.max_total_ms is not None and report["total_ms"] > args.max_total_ms:
+        print(f"Startup took {report['total_ms']:.1f}ms (> {args.max_total_ms:.1f}ms)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
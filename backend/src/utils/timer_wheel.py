@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+タイマーホイール モジュール
+
+大量のタイマー (接続ごとのハートビート・アイドル期限など) を、タイマーごとのタスクや
+asyncio のタイマーを使わずに 1 つのタスクでまとめて管理するハッシュ化タイマーホイールです。
+
+・登録・再登録・取り消しは O(1) (キーごとに 1 つのタイマー、再登録は置き換え)
+・刻み (tick) ごとに 1 スロットだけを処理し、期限切れのキーをまとめて返す
+・slots × tick が最長の遅延より長ければ、各スロットには期限切れのキーしか入らない
+  (周回待ちのキーを走査しないため、1 刻みあたりのコストは期限切れの件数のみ)
+・期限の精度は tick 単位 (最大 1 tick 遅れて発火する)
+
+Usage:
+    wheel = TimerWheel(tick=1.0, slots=512)
+    wheel.schedule(connection_id, 20.0)
+    await wheel.run(on_expire)   # on_expire(expired_keys) を刻みごとに呼ぶ
+"""
+
+import logging
+import math
+import time
+from typing import Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+
+import anyio
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.timer_wheel")
+
+K = TypeVar("K", bound=Hashable)
+
+
+class TimerWheel(Generic[K]):
+    """
+    ハッシュ化タイマーホイール。
+
+    Args:
+        tick (float): 1 刻みの秒数
+        slots (int): スロット数
+        clock (Callable[[], float]): 時刻関数 (テスト用、既定は time.monotonic)
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, clock: Callable[[], float] = time.monotonic):
+        if tick <= 0 or slots <= 0:
+            raise ValueError("tick and slots must be positive")
+        self.tick = tick
+        self.clock = clock
+        self._slots: List[Dict[K, int]] = [{} for _ in range(slots)]
+        # キー → 期限の刻み番号
+        self._deadlines: Dict[K, int] = {}
+        self._origin = clock()
+        self._current = 0
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._deadlines
+
+    def _slot(self, tick_no: int) -> Dict[K, int]:
+        return self._slots[tick_no % len(self._slots)]
+
+    def schedule(self, key: K, delay: float) -> None:
+        """
+        key のタイマーを delay 秒後に設定します (設定済みなら置き換え)。
+        """
+        self.cancel(key)
+        deadline = self._current + max(1, math.ceil(delay / self.tick))
+        self._slot(deadline)[key] = deadline
+        self._deadlines[key] = deadline
+
+    def cancel(self, key: K) -> bool:
+        """
+        key のタイマーを取り消します。
+
+        Returns:
+            bool: 設定されていた場合は True
+        """
+        deadline = self._deadlines.pop(key, None)
+        if deadline is None:
+            return False
+        del self._slot(deadline)[key]
+        return True
+
+    def advance(self, now: Optional[float] = None) -> List[K]:
+        """
+        現在時刻までホイールを進め、期限切れのキーを返します (返したキーのタイマーは解除済み)。
+        """
+        now = self.clock() if now is None else now
+        target = int((now - self._origin) / self.tick)
+        expired: List[K] = []
+        while self._current < target:
+            self._current += 1
+            slot = self._slot(self._current)
+            if not slot:
+                continue
+            for key, deadline in list(slot.items()):
+                # 周回待ち (slots × tick より長い遅延) のキーは次の周回まで残す
+                if deadline <= self._current:
+                    del slot[key]
+                    del self._deadlines[key]
+                    expired.append(key)
+        return expired
+
+    async def run(self, on_expire: Callable[[List[K]], None]) -> None:
+        """
+        刻みごとにホイールを進め、期限切れのキーを on_expire に渡します (キャンセルされるまで実行)。
+
+        Args:
+            on_expire (Callable[[List[K]], None]): 期限切れのキーを受け取る関数 (中で schedule して再設定できる)
+        """
+        while True:
+            await anyio.sleep(self.tick)
+            expired = self.advance()
+            if expired:
+                try:
+                    on_expire(expired)
+                except Exception:
+                    LOGGER.error("Timer wheel callback failed", exc_info=True)
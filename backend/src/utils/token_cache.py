@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+検証済みトークンキャッシュ モジュール
+
+同じ ID トークンが短時間に何度も送られてくるため、Firebase ID トークンの検証結果 (デコード済みクレーム) を
+トークンのダイジェストをキーにした LRU キャッシュに保持し、RSA 署名検証の重複を避けます。
+
+・キーはトークンの SHA-256 ダイジェスト (トークン本体はメモリに保持しない)
+・エントリはトークンの exp まで有効 (期限切れのエントリはヒットさせずに破棄)
+・revocation_check_seconds > 0 の場合、この間隔を過ぎたエントリは失効チェック付きで再検証させる
+・件数の上限を超えたら最も古く使われたエントリから追い出す
+・ヒット／ミスなどのメトリクスを stats() で取得可能
+
+キャッシュはイベントループからのみ操作する前提です (スレッドセーフではありません)。
+
+Usage:
+    claims = TOKEN_CACHE.get(token)
+    if claims is None:
+        claims = await run_auth(auth.verify_id_token, token, check_revoked=TOKEN_CACHE.check_revoked)
+        TOKEN_CACHE.put(token, claims)
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+from commons.settings import settings
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.token_cache")
+
+
+@dataclass
+class TokenCacheStats:
+    """
+    トークンキャッシュのメトリクス。
+
+    Attributes:
+        hits (int): キャッシュから返した回数
+        misses (int): 検証が必要だった回数 (期限切れ・再検証を含む)
+        expired (int): exp を過ぎて破棄したエントリ数
+        rechecks (int): 失効チェックの間隔を過ぎて再検証させた回数
+        evictions (int): 上限超過で追い出したエントリ数
+        invalidations (int): invalidate_uid で破棄したエントリ数
+    """
+
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    rechecks: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+@dataclass
+class _Entry:
+    claims: Dict[str, Any]
+    expires_at: float
+    verified_at: float
+
+
+def token_digest(token: str) -> str:
+    """
+    キャッシュキーとして使うトークンのダイジェストを返します。
+    """
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    検証済みクレームの LRU キャッシュ。
+
+    Args:
+        max_entries (int): 保持する最大件数 (0 でキャッシュ無効)
+        revocation_check_seconds (float): 失効チェック付きで再検証するまでの秒数 (0 で失効チェックしない)
+        clock (Callable[[], float]): 現在時刻 (UNIX 秒) を返す関数
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        revocation_check_seconds: float = 0.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.revocation_check_seconds = revocation_check_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._stats = TokenCacheStats()
+
+    @property
+    def check_revoked(self) -> bool:
+        """
+        検証時に失効チェック (check_revoked=True) を行うかどうか。
+        """
+        return self.revocation_check_seconds > 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュ済みのクレームを返します。
+
+        Args:
+            token (str): ID トークン
+
+        Returns:
+            Optional[Dict[str, Any]]: クレームのコピー (未登録・期限切れ・再検証が必要な場合は None)
+        """
+        if self.max_entries <= 0:
+            return None
+        key = token_digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats.misses += 1
+            return None
+
+        now = self._clock()
+        if now >= entry.expires_at:
+            del self._entries[key]
+            self._stats.expired += 1
+            self._stats.misses += 1
+            return None
+        if self.check_revoked and now - entry.verified_at >= self.revocation_check_seconds:
+            del self._entries[key]
+            self._stats.rechecks += 1
+            self._stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return dict(entry.claims)
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """
+        検証済みのクレームを登録します (exp を持たないクレームは登録しません)。
+
+        Args:
+            token (str): ID トークン
+            claims (Dict[str, Any]): verify_id_token のデコード結果
+        """
+        if self.max_entries <= 0 or "exp" not in claims:
+            return
+        key = token_digest(token)
+        self._entries[key] = _Entry(claims=dict(claims), expires_at=float(claims["exp"]), verified_at=self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def invalidate_uid(self, uid: str) -> int:
+        """
+        指定ユーザーのエントリをすべて破棄します (トークンの失効やアカウント無効化の直後に呼び出す)。
+
+        Args:
+            uid (str): Firebase ユーザー ID
+
+        Returns:
+            int: 破棄したエントリ数
+        """
+        keys = [key for key, entry in self._entries.items() if entry.claims.get("uid") == uid]
+        for key in keys:
+            del self._entries[key]
+        self._stats.invalidations += len(keys)
+        if keys:
+            LOGGER.info(f"[TokenCache] uid={uid} のエントリを {len(keys)} 件破棄しました")
+        return len(keys)
+
+    def clear(self) -> None:
+        """
+        すべてのエントリとメトリクスを破棄します。
+        """
+        self._entries.clear()
+        self._stats = TokenCacheStats()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        現在のメトリクスのスナップショットを返します。
+
+        Returns:
+            Dict[str, Any]: メトリクス (件数、上限、ヒット率を含む)
+        """
+        snapshot = asdict(self._stats)
+        lookups = self._stats.hits + self._stats.misses
+        snapshot["size"] = len(self._entries)
+        snapshot["max_entries"] = self.max_entries
+        snapshot["hit_ratio"] = round(self._stats.hits / lookups, 4) if lookups else 0.0
+        return snapshot
+
+
+# プロセス全体で共有するトークンキャッシュ
+TOKEN_CACHE = VerifiedTokenCache(settings.token_cache_max_entries, settings.token_cache_revocation_check_seconds)
@@ -6,11 +6,15 @@ import time
 from collections.abc import Callable
 
 from fastapi import HTTPException
-from requests.exceptions import HTTPError
+
+from utils.lazy_import import lazy_import
 
 # uvicornのロガーを取得
 LOGGER = logging.getLogger("uvicorn")
 
+# retry_request の例外判定でのみ使うため遅延インポート (except 句は例外発生時にのみ評価される)
+requests = lazy_import("requests")
+
 
 def check_value(value: str | None) -> str:
     """
@@ -55,7 +59,7 @@ def retry_request(
     for attempt in range(max_retries):
         try:
             return func()  # 関数を実行
-        except HTTPError as e:
+        except requests.exceptions.HTTPError as e:
             status_code = e.response.status_code if hasattr(e, "response") else None
             if status_code == 503:
                 LOGGER.error(
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API バージョニング モジュール
+
+fastapi_versioning.VersionedFastAPI と同じ構成 (/v{major}_{minor}, /latest) を、
+バージョンごとの Mount ではなく単一のディスパッチルートで提供します。
+
+・ミドルウェアスタックは親アプリの 1 つだけ (各バージョンのサブアプリは
+  ServerErrorMiddleware / ExceptionMiddleware を含むスタックを構築しない)
+・バージョンプレフィックスはパス先頭セグメントの dict 参照で解決
+・各バージョンの OpenAPI ドキュメントは VersionedFastAPI と同一
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi import FastAPI
+from fastapi.openapi.utils import get_openapi
+from fastapi.routing import APIRoute
+from fastapi_versioning.versioning import version_to_route
+from starlette._utils import get_route_path
+from starlette.datastructures import URLPath
+from starlette.routing import BaseRoute, Match, NoMatchFound, Router
+from starlette.types import Receive, Scope, Send
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.versioning")
+
+
+class VersionDispatcher(BaseRoute):
+    """
+    パス先頭のバージョンプレフィックス (例: /v0_1, /latest) を dict で引き、
+    対応するバージョンのルーターへ直接ディスパッチするルート。
+
+    Args:
+        version_apps (Dict[str, FastAPI]): プレフィックス → バージョン別サブアプリ
+    """
+
+    def __init__(self, version_apps: Dict[str, FastAPI]):
+        self.version_apps = version_apps
+        # サブアプリのミドルウェアスタックを通さず、ルーターを直接呼ぶ
+        self._routers: Dict[str, Router] = {prefix: app.router for prefix, app in version_apps.items()}
+
+    @property
+    def routes(self) -> List[BaseRoute]:
+        return [route for router in self._routers.values() for route in router.routes]
+
+    def matches(self, scope: Scope) -> Tuple[Match, Scope]:
+        if scope["type"] not in ("http", "websocket"):
+            return Match.NONE, {}
+
+        root_path = scope.get("root_path", "")
+        route_path = get_route_path(scope)
+
+        # Mount と同様、"/v0_1" 単体ではなく "/v0_1/..." のみを対象とする
+        end = route_path.find("/", 1)
+        if end == -1:
+            return Match.NONE, {}
+        prefix = route_path[:end]
+        router = self._routers.get(prefix)
+        if router is None:
+            return Match.NONE, {}
+
+        child_scope = {
+            "app_root_path": scope.get("app_root_path", root_path),
+            "root_path": root_path + prefix,
+            "endpoint": router,
+        }
+        return Match.FULL, child_scope
+
+    def url_path_for(self, name: str, /, **path_params: Any) -> URLPath:
+        for prefix, router in self._routers.items():
+            try:
+                url = router.url_path_for(name, **path_params)
+            except NoMatchFound:
+                continue
+            return URLPath(path=prefix + str(url), protocol=url.protocol)
+        raise NoMatchFound(name, path_params)
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await scope["endpoint"](scope, receive, send)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(prefixes={list(self._routers)!r})"
+
+
+def prefixed_openapi(app: FastAPI, prefix: str) -> Callable[[str], Dict[str, Any]]:
+    """
+    リクエストの root_path とバージョンプレフィックスを servers に載せた OpenAPI スキーマを返す関数を生成します。
+
+    FastAPI の /openapi.json はリクエストの root_path (プロキシのパス + バージョンプレフィックス) を servers に
+    追加してからスキーマを生成します。リクエスト外で生成する場合 (OpenAPI キャッシュ) も同じ内容にするために使います
+    (servers がないと Swagger UI の "Try it out" がプレフィックスなしのパスを呼び出してしまう)。
+    アプリの servers と生成済みスキーマ (openapi_schema) は書き換えません。
+
+    Args:
+        app (FastAPI): バージョン別サブアプリ (親アプリのバージョン一覧なら prefix は空文字)
+        prefix (str): バージョンプレフィックス (例: /v0_1, /latest)
+    """
+
+    def openapi(root_path: str = "") -> Dict[str, Any]:
+        servers = list(app.servers)
+        url = root_path.rstrip("/") + prefix
+        if url and app.root_path_in_servers and url not in {server.get("url") for server in servers}:
+            servers.insert(0, {"url": url})
+        return get_openapi(
+            title=app.title,
+            version=app.version,
+            openapi_version=app.openapi_version,
+            summary=app.summary,
+            description=app.description,
+            terms_of_service=app.terms_of_service,
+            contact=app.contact,
+            license_info=app.license_info,
+            routes=app.routes,
+            webhooks=app.webhooks.routes,
+            tags=app.openapi_tags,
+            servers=servers or None,
+            separate_input_output_schemas=app.separate_input_output_schemas,
+        )
+
+    return openapi
+
+
+def build_versioned_app(
+    app: FastAPI,
+    version_format: str = "{major}.{minor}",
+    prefix_format: str = "/v{major}_{minor}",
+    default_version: Tuple[int, int] = (1, 0),
+    enable_latest: bool = False,
+    **kwargs: Any,
+) -> FastAPI:
+    """
+    VersionedFastAPI 互換のバージョニング済みアプリを生成します。
+
+    ルートのバージョン割り当て (累積方式) とサブアプリの生成内容は VersionedFastAPI と同じで、
+    親アプリへの登録だけを VersionDispatcher 1 つにまとめます。
+
+    Args:
+        app (FastAPI): ルーターを登録済みの元アプリ
+        version_format (str): OpenAPI に表示するバージョン文字列の書式
+        prefix_format (str): URL プレフィックスの書式
+        default_version (Tuple[int, int]): @version 未指定ルートのバージョン
+        enable_latest (bool): /latest で最新バージョンを公開するか
+        **kwargs: 親 FastAPI へ渡す引数 (middleware, lifespan など)
+
+    Returns:
+        FastAPI: 親アプリ
+    """
+    parent_app = FastAPI(title=app.title, **kwargs)
+
+    version_route_mapping: Dict[Tuple[int, int], List[APIRoute]] = defaultdict(list)
+    for version, route in (version_to_route(route, default_version) for route in app.routes):
+        version_route_mapping[version].append(route)
+
+    version_apps: Dict[str, FastAPI] = {}
+    semvers: Dict[str, str] = {}
+    unique_routes: Dict[str, APIRoute] = {}
+    versions = sorted(version_route_mapping.keys())
+    semver = ""
+    for major, minor in versions:
+        prefix = prefix_format.format(major=major, minor=minor)
+        semver = version_format.format(major=major, minor=minor)
+        versioned_app = FastAPI(title=app.title, description=app.description, version=semver)
+        # 下位バージョンのルートを引き継ぎ、同一パス・メソッドは新しいバージョンで上書き
+        for route in version_route_mapping[(major, minor)]:
+            for method in route.methods:
+                unique_routes[route.path + "|" + method] = route
+        versioned_app.router.routes.extend(unique_routes.values())
+        version_apps[prefix] = versioned_app
+        semvers[prefix] = semver
+
+    if enable_latest and versions:
+        latest_app = FastAPI(title=app.title, description=app.description, version=semver)
+        latest_app.router.routes.extend(unique_routes.values())
+        version_apps["/latest"] = latest_app
+
+    parent_app.router.routes.append(VersionDispatcher(version_apps))
+    # OpenAPI キャッシュなど、バージョン別サブアプリを参照する処理のために保持
+    parent_app.state.version_apps = version_apps
+    LOGGER.info(f"[Versioning] バージョンディスパッチャー登録: {list(version_apps)}")
+
+    # VersionedFastAPI と同じく、親アプリの OpenAPI にバージョン一覧を載せる
+    # (実際のリクエストは先に登録した VersionDispatcher が処理する)
+    for prefix, semver in semvers.items():
+
+        @parent_app.get(f"{prefix}/openapi.json", name=semver, tags=["Versions"])
+        @parent_app.get(f"{prefix}/docs", name=semver, tags=["Documentations"])
+        def noop() -> None:
+            pass
+
+    return parent_app
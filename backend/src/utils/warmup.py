@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ルートウォームアップ モジュール
+
+起動直後の各エンドポイントの初回コスト (Pydantic のバリデータ／シリアライザ構築、
+依存関係の解決、ミドルウェアスタックの構築、初回 SQL のコンパイルなど) を、
+レディネスを ready にする前にプロセス内の合成リクエストで先に支払います。
+
+・登録済みの GET ルート (パスパラメータなし) へ ASGI で直接リクエスト (ネットワークを使わない)
+・WARMUP_FIXTURES_PATH の JSON で POST など任意のリクエストを追加可能
+・認証は固定ユーザーを返すスタブ、DB セッションは commit を flush に置き換えて最後にロールバックするスタブに
+  差し替えるため、ウォームアップによる副作用は残らない
+
+フィクスチャファイルの形式:
+    [{"method": "POST", "path": "/latest/users/", "json": {}}]
+"""
+
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from sqlalchemy.orm import Session
+
+from database.session import SessionLocal, get_session
+from utils.executor import run_db
+from utils.firebase_auth import verify_firebase_id_token, verify_firebase_token
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.warmup")
+
+# 認証スタブが返すユーザー情報
+WARMUP_USER: Dict[str, Any] = {"uid": "warmup", "email": None, "warmup": True}
+
+
+@dataclass
+class WarmupRequest:
+    """
+    ウォームアップで発行するリクエスト。
+
+    Attributes:
+        method (str): HTTP メソッド
+        path (str): パス (バージョンプレフィックスを含む)
+        json (Optional[Any]): JSON ボディ
+        headers (Dict[str, str]): 追加ヘッダー
+    """
+
+    method: str
+    path: str
+    json: Optional[Any] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def collect_get_requests(app: FastAPI) -> List[WarmupRequest]:
+    """
+    バージョン別サブアプリに登録された GET ルートのうち、パスパラメータを持たないものを列挙します。
+    同じルートが複数バージョンに含まれる場合は最初のプレフィックスで 1 回だけ発行します。
+
+    Args:
+        app (FastAPI): build_versioned_app で生成した親アプリ
+
+    Returns:
+        List[WarmupRequest]: GET リクエスト
+    """
+    requests: List[WarmupRequest] = []
+    seen: set = set()
+    for prefix, sub_app in getattr(app.state, "version_apps", {}).items():
+        for route in sub_app.routes:
+            if not isinstance(route, APIRoute) or "GET" not in route.methods or route.param_convertors:
+                continue
+            if id(route) in seen:
+                continue
+            seen.add(id(route))
+            requests.append(WarmupRequest(method="GET", path=f"{prefix}{route.path}"))
+    return requests
+
+
+def load_fixtures(path: Path) -> List[WarmupRequest]:
+    """
+    フィクスチャファイル (JSON 配列) からリクエストを読み込みます。
+
+    Args:
+        path (Path): フィクスチャファイルのパス
+
+    Returns:
+        List[WarmupRequest]: リクエスト
+    """
+    entries = json.loads(path.read_text(encoding="utf-8"))
+    return [
+        WarmupRequest(
+            method=entry.get("method", "POST").upper(),
+            path=entry["path"],
+            json=entry.get("json"),
+            headers=entry.get("headers", {}),
+        )
+        for entry in entries
+    ]
+
+
+def _rollback_only_session() -> Session:
+    """
+    commit を flush に置き換えたセッションを生成します (ウォームアップ終了時にロールバックされる)。
+    """
+    session = SessionLocal()
+    session.commit = session.flush
+    return session
+
+
+async def _stub_verify_firebase_token() -> Dict[str, Any]:
+    return dict(WARMUP_USER)
+
+
+async def _stub_get_session() -> AsyncGenerator[Session, None]:
+    session = _rollback_only_session()
+    try:
+        yield session
+    finally:
+        if session.in_transaction():
+            await run_db(session.rollback)
+            await run_db(session.close)
+        else:
+            session.close()
+
+
+def _dependency_providers(app: FastAPI) -> List[Any]:
+    """
+    ルートが参照する dependency_overrides の提供元 (ルーター登録元のアプリ) を列挙します。
+    """
+    providers: Dict[int, Any] = {}
+    for sub_app in getattr(app.state, "version_apps", {}).values():
+        for route in sub_app.routes:
+            provider = getattr(route, "dependency_overrides_provider", None)
+            if provider is not None:
+                providers[id(provider)] = provider
+    return list(providers.values())
+
+
+async def warm_up_routes(app: FastAPI, fixtures: Optional[List[WarmupRequest]] = None) -> Dict[str, int]:
+    """
+    ルートへ合成リクエストを発行し、パスごとのステータスコードを返します。
+    (lifespan の起動中、まだ外部リクエストを受け付けていない間に実行する前提です)
+
+    Args:
+        app (FastAPI): 親アプリ (ミドルウェアスタックを含めてウォームアップする)
+        fixtures (Optional[List[WarmupRequest]]): 追加のリクエスト
+
+    Returns:
+        Dict[str, int]: "METHOD path" → ステータスコード
+    """
+    requests = collect_get_requests(app) + list(fixtures or [])
+    stubs = {
+        verify_firebase_token: _stub_verify_firebase_token,
+        verify_firebase_id_token: _stub_verify_firebase_token,
+        get_session: _stub_get_session,
+    }
+    providers = _dependency_providers(app)
+    saved = [dict(provider.dependency_overrides) for provider in providers]
+
+    results: Dict[str, int] = {}
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 0))
+    try:
+        for provider in providers:
+            provider.dependency_overrides.update(stubs)
+        async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+            for request in requests:
+                started_at = time.perf_counter()
+                try:
+                    response = await client.request(
+                        request.method, request.path, json=request.json, headers=request.headers
+                    )
+                except Exception as e:
+                    LOGGER.warning(f"[Warmup] {request.method} {request.path} で例外が発生しました: {e}")
+                    results[f"{request.method} {request.path}"] = 500
+                    continue
+                elapsed = (time.perf_counter() - started_at) * 1000
+                results[f"{request.method} {request.path}"] = response.status_code
+                LOGGER.debug(f"[Warmup] {request.method} {request.path} -> {response.status_code} ({elapsed:.1f}ms)")
+    finally:
+        for provider, overrides in zip(providers, saved):
+            provider.dependency_overrides.clear()
+            provider.dependency_overrides.update(overrides)
+
+    LOGGER.info(f"[Warmup] {len(results)} 件のルートをウォームアップしました")
+    return results
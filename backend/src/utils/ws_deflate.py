@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket permessage-deflate 調整モジュール
+
+uvicorn の websockets 実装は permessage-deflate を有効にすると全メッセージを圧縮するため、
+数十バイトのメッセージでも圧縮の CPU コストがかかり、圧縮後のサイズもほとんど変わりません。
+しきい値未満のメッセージを非圧縮 (RSV1 なし) で送る拡張と、それを使う uvicorn のプロトコルクラスを提供します。
+
+・圧縮の有無はメッセージごとに選べる (RFC 7692)。非圧縮のメッセージは圧縮コンテキストを更新しないため、
+  コンテキスト引き継ぎ (context takeover) を使う接続でも安全にスキップできる
+・しきい値未満のメッセージは生成済みフレームの直接書き込み (utils.ws_frames) も引き続き使える
+・圧縮レベル・memLevel は WS_DEFLATE_LEVEL / WS_DEFLATE_MEM_LEVEL で調整する
+
+Usage:
+    config = uvicorn.Config(app, ws=websocket_protocol(), ws_per_message_deflate=True)
+"""
+
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+from websockets.extensions.base import Extension
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import CTRL_OPCODES, OP_CONT, Frame
+
+from commons.settings import settings
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """
+    min_size バイト未満のメッセージを圧縮しない permessage-deflate。
+
+    Args:
+        min_size (int): 圧縮するメッセージの最小サイズ (バイト)
+        (ほかの引数は PerMessageDeflate と同じ)
+    """
+
+    def __init__(self, *args: Any, min_size: int = 0, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def encode(self, frame: Frame) -> Frame:
+        # 分割されていない小さなデータフレームはそのまま送る (分割されたメッセージは従来どおり圧縮)
+        if frame.fin and frame.opcode is not OP_CONT and frame.opcode not in CTRL_OPCODES:
+            if len(frame.data) < self.min_size:
+                return frame
+        return super().encode(frame)
+
+
+class ThresholdPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    """
+    ThresholdPerMessageDeflate をネゴシエートするサーバー側の拡張ファクトリ。
+
+    Args:
+        min_size (int): 圧縮するメッセージの最小サイズ (バイト)
+        (ほかの引数は ServerPerMessageDeflateFactory と同じ)
+    """
+
+    def __init__(self, *args: Any, min_size: int = 0, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def process_request_params(
+        self, params: Sequence[Tuple[str, Optional[str]]], accepted_extensions: Sequence[Extension]
+    ) -> Tuple[List[Tuple[str, Optional[str]]], PerMessageDeflate]:
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            self.compress_settings,
+            min_size=self.min_size,
+        )
+
+
+def deflate_factory() -> ThresholdPerMessageDeflateFactory:
+    """
+    設定 (WS_DEFLATE_*) に従った拡張ファクトリを返します。
+    """
+    return ThresholdPerMessageDeflateFactory(
+        compress_settings={"level": settings.ws_deflate_level, "memLevel": settings.ws_deflate_mem_level},
+        min_size=settings.ws_deflate_min_bytes,
+    )
+
+
+@lru_cache(maxsize=1)
+def websocket_protocol() -> Union[type, str]:
+    """
+    uvicorn.Config の ws に渡すプロトコルを返します。
+
+    Returns:
+        Union[type, str]: しきい値付き permessage-deflate を使う websockets 実装のクラス
+            (uvicorn の websockets 実装を読み込めない場合は "auto")
+    """
+    try:
+        from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+    except ImportError:
+        return "auto"
+
+    class TunedWebSocketProtocol(WebSocketProtocol):
+        def __init__(self, *args: Any, **kwargs: Any):
+            super().__init__(*args, **kwargs)
+            if self.config.ws_per_message_deflate:
+                self.available_extensions = [deflate_factory()]
+
+    return TunedWebSocketProtocol
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket フレーム事前生成モジュール
+
+ルームへの配信などで同じメッセージを多数の接続へ送る場合に、UTF-8 エンコードと
+WebSocket フレーム (ヘッダー + ペイロード) の組み立てを 1 回だけ行い、同じバイト列を各接続へ書き込みます。
+
+・PreparedMessage: ペイロードを 1 回だけエンコードし、フレームは初回の利用時に 1 回だけ生成
+・RawFrameWriter: uvicorn の websockets 実装 (legacy プロトコル) の接続であれば、生成済みフレームを
+  トランスポートへ直接書き込む (接続は WebSocketTransportMiddleware が scope に記録した send から特定)
+    - ハートビートのプロトコルレベル ping もここから送る (pong は websockets が自動で処理)
+    - 拡張 (permessage-deflate など) がネゴシエートされた接続は接続ごとの圧縮が必要なため対象外
+      (しきい値付き permessage-deflate (utils.ws_deflate) の場合は、しきい値未満のメッセージのみ対象)
+    - 対象外の接続・サーバー実装 (wsproto、TestClient など) では ASGI の send_text / send_bytes を使う
+
+Usage:
+    prepared = PreparedMessage(text)
+    writer = RawFrameWriter.detect(ws)
+    if writer is not None and await writer.ready() and writer.accepts(len(prepared.payload)):
+        await writer.write(prepared.frame)
+    else:
+        await ws.send_text(prepared.data)
+"""
+
+import logging
+import struct
+from typing import Any, Callable, Optional, Union
+
+from fastapi import WebSocket
+
+from utils.ws_codec import pack_message
+
+# Uvicorn 用ロガー取得
+LOGGER = logging.getLogger("uvicorn.routers.ws")
+
+# WebSocketTransportMiddleware がサーバーの send を記録する scope のキー
+RAW_SEND_SCOPE_KEY = "app.websocket.raw_send"
+
+# オペコード (FIN ビット付き)
+_FIN_TEXT = 0x81
+_FIN_BINARY = 0x82
+
+
+def build_frame(payload: bytes, text: bool = True) -> bytes:
+    """
+    サーバーから送る (マスクなしの) 単一フレームを組み立てます。
+
+    Args:
+        payload (bytes): ペイロード
+        text (bool): テキストフレームなら True、バイナリフレームなら False
+
+    Returns:
+        bytes: フレーム (ヘッダー + ペイロード)
+    """
+    first = _FIN_TEXT if text else _FIN_BINARY
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", first, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", first, 126, length)
+    else:
+        header = struct.pack("!BBQ", first, 127, length)
+    return header + payload
+
+
+class PreparedMessage:
+    """
+    多数の接続へ送るためにエンコード済みのメッセージ。
+
+    Args:
+        data (Union[str, bytes]): テキスト (テキストフレーム) またはバイナリ (バイナリフレーム)
+    """
+
+    __slots__ = ("data", "is_text", "payload", "_frame", "_packed")
+
+    def __init__(self, data: Union[str, bytes]):
+        self.data = data
+        self.is_text = isinstance(data, str)
+        self.payload = data.encode("utf-8") if self.is_text else bytes(data)
+        self._frame: Optional[bytes] = None
+        self._packed: Optional[bytes] = None
+
+    @property
+    def frame(self) -> bytes:
+        """
+        WebSocket フレーム (初回のみ生成)。
+        """
+        if self._frame is None:
+            self._frame = build_frame(self.payload, self.is_text)
+        return self._frame
+
+    @property
+    def packed(self) -> bytes:
+        """
+        msgpack サブプロトコル用のエンコード結果 (初回のみ生成)。
+        """
+        if self._packed is None:
+            self._packed = pack_message(self.data)
+        return self._packed
+
+
+def _protocol_class() -> Optional[type]:
+    try:
+        from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+    except ImportError:  # websockets 未インストール (wsproto のみなど)
+        return None
+    return WebSocketProtocol
+
+
+class RawFrameWriter:
+    """
+    uvicorn の websockets 実装の接続へ、生成済みフレームを直接書き込むライター。
+
+    Args:
+        protocol (Any): uvicorn.protocols.websockets.websockets_impl.WebSocketProtocol
+    """
+
+    def __init__(self, protocol: Any):
+        self.protocol = protocol
+        self._usable: Optional[bool] = None
+        # 生成済みフレームを使えるペイロードサイズの上限 (None なら無制限)
+        self._max_size: Optional[int] = None
+
+    @classmethod
+    def detect(cls, ws: WebSocket) -> Optional["RawFrameWriter"]:
+        """
+        WebSocket の送信先が uvicorn の websockets 実装であればライターを返します。
+        (WebSocketTransportMiddleware が登録されていない場合などは None)
+        """
+        protocol_class = _protocol_class()
+        protocol = getattr(ws.scope.get(RAW_SEND_SCOPE_KEY), "__self__", None)
+        if protocol_class is None or not isinstance(protocol, protocol_class):
+            return None
+        return cls(protocol)
+
+    async def ready(self) -> bool:
+        """
+        ハンドシェイク完了を待ち、この接続で生成済みフレームを使えるかどうかを返します。
+        """
+        if self._usable is None:
+            # websockets 実装の接続なので websockets はインストール済み
+            from utils.ws_deflate import ThresholdPerMessageDeflate
+
+            await self.protocol.handshake_completed_event.wait()
+            extensions = self.protocol.extensions
+            if extensions and all(isinstance(extension, ThresholdPerMessageDeflate) for extension in extensions):
+                # しきい値未満のメッセージは非圧縮で送られるため、生成済みフレームをそのまま使える
+                self._max_size = min(extension.min_size for extension in extensions)
+            self._usable = not extensions or bool(self._max_size)
+            if not self._usable:
+                LOGGER.debug(f"Raw frames disabled (extensions={extensions})")
+        return self._usable
+
+    def accepts(self, size: int) -> bool:
+        """
+        ペイロードが size バイトのメッセージに生成済みフレームを使えるかどうか (ready() の後に呼ぶ)。
+        """
+        return bool(self._usable) and (self._max_size is None or size < self._max_size)
+
+    async def ping(self, on_pong: Callable[[], None]) -> None:
+        """
+        プロトコルレベルの ping を送り、pong を受け取ったら on_pong を呼びます (pong は待ちません)。
+
+        Raises:
+            ConnectionClosed: 接続が既に閉じている場合
+        """
+
+        def done(waiter: Any) -> None:
+            # 切断時は waiter に例外が設定されるため、取り出して警告を出さないようにする
+            if not waiter.cancelled() and waiter.exception() is None:
+                on_pong()
+
+        waiter = await self.protocol.ping()
+        waiter.add_done_callback(done)
+
+    async def write(self, frame: bytes) -> None:
+        """
+        フレームをトランスポートへ書き込み、フロー制御 (送信バッファの排出) を待ちます。
+
+        Raises:
+            ConnectionClosed: 接続が既に閉じている場合
+        """
+        await self.protocol.ensure_open()
+        self.protocol.transport.write(frame)
+        await self.protocol.drain()